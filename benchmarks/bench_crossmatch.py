@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+bench_crossmatch
+
+Cross-matches random ephemerides against a random night of frames.
+
+Usage:
+  bench_crossmatch.py [--objects=N] [--frames=M] [--rows=R]
+  bench_crossmatch.py -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -n --objects=N      Number of objects [default: 5000]
+  -m --frames=M       Number of frames in the night [default: 3000]
+  -r --rows=R         Ephemeris rows per object, an hour apart [default: 3]
+"""
+
+import time
+
+import docopt
+import numpy as np
+
+from void import crossmatch, reducer, time_utils
+
+NIGHT = np.datetime64('2018-08-18T20:00', 'ns')
+
+
+def random_night(n_objects, n_frames, n_rows, seed=0):
+    rng = np.random.RandomState(seed)
+    frames = np.zeros(n_frames, dtype=reducer.HEADER_DTYPE)
+    seconds = np.sort(rng.randint(0, 8 * 3600, n_frames))
+    frames['date_obs'] = NIGHT + seconds.astype('m8[s]')
+    frames['exposure'] = 60
+    # A band of sky around the ecliptic, frames revisit fields
+    frames['ra_center'] = rng.uniform(300, 340, n_frames)
+    frames['dec_center'] = rng.uniform(-15, 5, n_frames)
+    frames['x_deg_size'] = frames['y_deg_size'] = 0.73
+    frames['pos_angle'] = rng.uniform(0, 360, n_frames)
+
+    start = time_utils.datetime64_to_mjd(NIGHT)
+    ephemerides = {}
+    for i in range(n_objects):
+        rows = np.zeros(n_rows, dtype=crossmatch.EPHEMERIS_DTYPE)
+        rows['mjd'] = start + np.arange(n_rows) / 24
+        rows['ra'] = rng.uniform(300, 340) + np.arange(n_rows) * 0.05
+        rows['dec'] = rng.uniform(-15, 5) + np.arange(n_rows) * 0.02
+        rows['motion'] = 3.0
+        rows['pa'] = 70.0
+        ephemerides[f'P{i:06d}'] = rows
+    return ephemerides, frames
+
+
+def main():
+    arguments = docopt.docopt(__doc__, help=True)
+    ephemerides, frames = random_night(
+        int(arguments['--objects']),
+        int(arguments['--frames']),
+        int(arguments['--rows']),
+    )
+    start = time.perf_counter()
+    matches = crossmatch.crossmatch(ephemerides, frames)
+    elapsed = time.perf_counter() - start
+    print(
+        f'{len(ephemerides)} objects x {len(frames)} frames: '
+        f'{elapsed:.2f} s, {len(matches)} matches'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+bench_math
+
+Compares footprint computation of `math_utils.calculate_poly`, one image
+at a time, with `math_utils.calculate_polys` on whole arrays.
+
+Usage:
+  bench_math.py [--sizes=SIZES] [--scalar-max=N] [--repeat=R]
+  bench_math.py -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -s --sizes=SIZES    Comma separated numbers of images
+                      [default: 1000,10000,100000,1000000]
+  -m --scalar-max=N   Skip the scalar version above N images, it takes
+                      minutes at a million [default: 100000]
+  -r --repeat=R       Best of R runs [default: 3]
+"""
+
+import timeit
+
+import docopt
+import numpy as np
+
+from void import math_utils
+
+
+def random_images(n, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = np.column_stack(
+        (rng.uniform(0, 360, n), rng.uniform(-90, 90, n))
+    )
+    images_x = rng.uniform(0.1, 2, n)
+    images_y = rng.uniform(0.1, 2, n)
+    pos_angles = rng.uniform(0, 360, n)
+    return centers, images_x, images_y, pos_angles
+
+
+def scalar(centers, images_x, images_y, pos_angles):
+    return [
+        math_utils.calculate_poly(*image)
+        for image in zip(centers, images_x, images_y, pos_angles)
+    ]
+
+
+def best_of(func, args, repeat):
+    return min(timeit.repeat(lambda: func(*args), number=1, repeat=repeat))
+
+
+def main():
+    arguments = docopt.docopt(__doc__, help=True)
+    sizes = [int(float(size)) for size in arguments['--sizes'].split(',')]
+    scalar_max = int(float(arguments['--scalar-max']))
+    repeat = int(arguments['--repeat'])
+    print(
+        f'{"images":>10} {"scalar [s]":>12} {"vector [s]":>12} '
+        f'{"speedup":>9}'
+    )
+    for n in sizes:
+        images = random_images(n)
+        vector_time = best_of(math_utils.calculate_polys, images, repeat)
+        if n <= scalar_max:
+            scalar_time = best_of(scalar, images, repeat)
+            speedup = f'{scalar_time / vector_time:9.1f}'
+            scalar_time = f'{scalar_time:12.4f}'
+        else:
+            scalar_time, speedup = f'{"-":>12}', f'{"-":>9}'
+        print(f'{n:>10} {scalar_time} {vector_time:12.4f} {speedup}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+bench_pipeline
+
+Times the stages of the pipeline on a synthetic archive, see synthetic.py:
+finding unflagged frames with `Sniffer.find_fits`, reading their headers
+with `reducer.read_header_data`, footprints with `math_utils.calculate_poly`
+and inserting them into a SQLite database, see `void.db`, one row or one
+batch at a time, each into an empty database.
+
+Writes files per second, bytes read and latency percentiles of each stage,
+and the peak RSS of the run, as JSON, and compares them with a baseline.
+Exits with status 1 when a stage is slower, or the run uses more memory,
+than the baseline by more than the threshold fraction. Bytes read are
+counted on Linux only.
+
+Usage:
+  bench_pipeline.py [--frames=N] [--nights=N] [--size=PIXELS] \
+[--archive=DIR] [--output=PATH] [--baseline=PATH] [--threshold=T] \
+[--save-baseline]
+  bench_pipeline.py -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -n --frames=N       Number of frames [default: 1000]
+  -d --nights=N       Number of nights [default: 10]
+  -s --size=PIXELS    Width and height of frames [default: 256]
+  -a --archive=DIR    Archive directory, generated if missing, a temporary
+                      one by default
+  -o --output=PATH    Write results to this JSON file
+  -b --baseline=PATH  Baseline results [default: benchmarks/baseline.json]
+  -t --threshold=T    Allowed regression, as a fraction [default: 0.3]
+  -S --save-baseline  Store the results as the new baseline
+"""
+
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import docopt
+import numpy as np
+
+import synthetic
+from void import db, ingest, math_utils, reducer, sniffer
+
+PROC_IO = '/proc/self/io'
+# Stage results compared with the baseline, higher is better
+HIGHER_BETTER = ('per_s',)
+
+
+def bytes_read():
+    """ Bytes read by this process so far, None where unknown. """
+    try:
+        with open(PROC_IO) as f:
+            counters = dict(line.split(': ') for line in f)
+    except OSError:
+        return None
+    return int(counters['rchar'])
+
+
+def peak_rss_mib():
+    """ Peak RSS of this process over its lifetime, not of a stage. """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    if sys.platform == 'darwin':
+        return peak / 2**20
+    return peak / 2**10
+
+
+class Stage:
+    """ Timings of one pipeline stage, `tick` after each item or batch. """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.latencies = []
+        self.start = self.last = None
+        self.read_start = None
+        self.result = None
+
+    def __enter__(self):
+        self.read_start = bytes_read()
+        self.start = self.last = time.perf_counter()
+        return self
+
+    def tick(self, items=1):
+        now = time.perf_counter()
+        self.items += items
+        self.latencies.append(now - self.last)
+        self.last = now
+
+    def __exit__(self, *_):
+        seconds = time.perf_counter() - self.start
+        read_end = bytes_read()
+        latencies = np.array(self.latencies or [seconds]) * 1e3
+        self.result = {
+            'items': self.items,
+            'seconds': seconds,
+            'per_s': self.items / seconds,
+            'bytes_read': (
+                None if read_end is None else read_end - self.read_start
+            ),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'max_ms': float(latencies.max()),
+        }
+
+
+def run_stages(archive_dir, db_dir):
+    """
+    Run the pipeline over `archive_dir`, returning stage results. Ingest
+    stages write new databases in `db_dir`.
+    """
+    stages = []
+    walker = sniffer.Sniffer(
+        search_dir=archive_dir,
+        flag_name=synthetic.FLAG_NAME,
+        update_flag=False,
+        ordered=True,
+    )
+    fnames = []
+    with Stage('find_fits') as stage:
+        for fname in walker.find_fits():
+            fnames.append(fname)
+            stage.tick()
+    stages.append(stage)
+
+    records = []
+    with Stage('read_header_data') as stage:
+        for fname in fnames:
+            record = reducer.read_header_data(fname)
+            record['path'] = os.path.abspath(fname)
+            records.append(record)
+            stage.tick()
+    stages.append(stage)
+
+    with Stage('calculate_poly') as stage:
+        for record in records:
+            math_utils.calculate_poly(
+                (record['ra_center'], record['dec_center']),
+                record['x_deg_size'],
+                record['y_deg_size'],
+                record['pos_angle'],
+            )
+            stage.tick()
+    stages.append(stage)
+
+    with db.connect(os.path.join(db_dir, 'ingest.sqlite')) as database:
+        database.create_schema()
+        with Stage('ingest') as stage:
+            for record in records:
+                database.upsert_observations(db.observation_rows([record]))
+                stage.tick()
+            database.commit()
+        stages.append(stage)
+    # Batched, as by void_ingest, the latency is per batch
+    batched_fname = os.path.join(db_dir, 'ingest_batched.sqlite')
+    with db.connect(batched_fname) as database:
+        database.create_schema()
+        with Stage('ingest_batched') as stage:
+            for batch in ingest.batches(records, ingest.BATCH_SIZE):
+                database.upsert_observations(db.observation_rows(batch))
+                database.commit()
+                stage.tick(len(batch))
+        stages.append(stage)
+    return {stage.name: stage.result for stage in stages}
+
+
+def compare(results, baseline, threshold):
+    """ Regressions of `results` from `baseline`, as messages. """
+    if results['config'] != baseline.get('config'):
+        return [f'baseline config differs: {baseline.get("config")}']
+    regressions = []
+    peak, base_peak = results['peak_rss_mib'], baseline.get('peak_rss_mib')
+    if base_peak is not None and peak > base_peak * (1 + threshold):
+        regressions.append(
+            f'peak_rss_mib: {peak:.1f}, baseline {base_peak:.1f}'
+        )
+    for name, result in results['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue
+        for key in HIGHER_BETTER:
+            if result[key] < base[key] * (1 - threshold):
+                regressions.append(
+                    f'{name} {key}: {result[key]:.1f}, '
+                    f'baseline {base[key]:.1f}'
+                )
+    return regressions
+
+
+def print_results(results):
+    print(
+        f'{"stage":>17} {"items":>7} {"per s":>10} {"read [B]":>10} '
+        f'{"p50 [ms]":>9} {"p95 [ms]":>9}'
+    )
+    for name, result in results['stages'].items():
+        read = result['bytes_read']
+        read = '-' if read is None else str(read)
+        print(
+            f'{name:>17} {result["items"]:>7} {result["per_s"]:>10.1f} '
+            f'{read:>10} {result["p50_ms"]:>9.3f} {result["p95_ms"]:>9.3f}'
+        )
+    print(f'peak RSS: {results["peak_rss_mib"]:.1f} MiB')
+
+
+def main():
+    arguments = docopt.docopt(__doc__, help=True)
+    config = {
+        'frames': int(float(arguments['--frames'])),
+        'nights': int(arguments['--nights']),
+        'size': int(arguments['--size']),
+    }
+    threshold = float(arguments['--threshold'])
+    tmp_dir = tempfile.TemporaryDirectory()
+    archive_dir = arguments['--archive']
+    if archive_dir is None:
+        archive_dir = os.path.join(tmp_dir.name, 'archive')
+    if not os.path.isdir(archive_dir):
+        synthetic.make_archive(archive_dir, **config)
+
+    results = {
+        'config': config,
+        'python': platform.python_version(),
+        'stages': run_stages(archive_dir, tmp_dir.name),
+    }
+    results['peak_rss_mib'] = peak_rss_mib()
+    print_results(results)
+    if arguments['--output']:
+        with open(arguments['--output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline_fname = arguments['--baseline']
+    if arguments['--save-baseline']:
+        with open(baseline_fname, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        return
+    if not os.path.exists(baseline_fname):
+        print(f'no baseline {baseline_fname}')
+        return
+    with open(baseline_fname) as f:
+        regressions = compare(results, json.load(f), threshold)
+    for regression in regressions:
+        print(f'regression: {regression}')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+bench_skyindex
+
+Builds a `skyindex.SkyIndex` over random frames and times point, cone and
+polygon queries at random positions.
+
+Usage:
+  bench_skyindex.py [--frames=N] [--queries=Q] [--cell=DEG]
+  bench_skyindex.py -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -n --frames=N       Number of frames [default: 1000000]
+  -q --queries=Q      Number of queries of each kind [default: 1000]
+  -c --cell=DEG       Cell size in degrees [default: 1]
+"""
+
+import time
+
+import docopt
+import numpy as np
+
+from void import skyindex
+
+
+def random_frames(n, seed=0):
+    rng = np.random.RandomState(seed)
+    frames = np.zeros(
+        n,
+        dtype=[(name, 'f8') for name in skyindex.FIELDS[:-1]]
+        + [('date_obs', 'M8[ns]')],
+    )
+    frames['ra_center'] = rng.uniform(0, 360, n)
+    frames['dec_center'] = np.rad2deg(np.arcsin(rng.uniform(-1, 1, n)))
+    frames['x_deg_size'] = rng.uniform(0.5, 1, n)
+    frames['y_deg_size'] = rng.uniform(0.5, 1, n)
+    frames['pos_angle'] = rng.uniform(0, 360, n)
+    seconds = rng.randint(0, 10 * 365 * 86400, n).astype('m8[s]')
+    frames['date_obs'] = np.datetime64('2010-01-01', 'ns') + seconds
+    return frames
+
+
+def per_query(func, queries):
+    start = time.perf_counter()
+    found = sum(len(func(*query)) for query in queries)
+    elapsed = time.perf_counter() - start
+    return 1000 * elapsed / len(queries), found / len(queries)
+
+
+def main():
+    arguments = docopt.docopt(__doc__, help=True)
+    n_frames = int(float(arguments['--frames']))
+    n_queries = int(arguments['--queries'])
+    frames = random_frames(n_frames)
+    start = time.perf_counter()
+    index = skyindex.SkyIndex.build(frames, float(arguments['--cell']))
+    print(f'build {n_frames} frames: {time.perf_counter() - start:.2f} s')
+
+    rng = np.random.RandomState(1)
+    ra = rng.uniform(0, 360, n_queries)
+    dec = np.rad2deg(np.arcsin(rng.uniform(-1, 1, n_queries)))
+    polygons = [
+        [(r - 0.2, d - 0.2), (r + 0.2, d - 0.2), (r + 0.2, d + 0.2)]
+        for r, d in zip(ra, np.clip(dec, -80, 80))
+    ]
+    for name, func, queries in (
+        ('point', index.point, list(zip(ra, dec))),
+        ('cone 0.5 deg', index.cone, [(r, d, 0.5) for r, d in zip(ra, dec)]),
+        ('polygon', index.polygon, [(polygon,) for polygon in polygons]),
+        (
+            'point, 1 month',
+            index.point,
+            [(r, d, '2015-01-01', '2015-02-01') for r, d in zip(ra, dec)],
+        ),
+    ):
+        elapsed, found = per_query(func, queries)
+        print(f'{name:>16}: {elapsed:.3f} ms, {found:.1f} frames per query')
+
+
+if __name__ == '__main__':
+    main()
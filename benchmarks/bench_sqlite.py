@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+bench_sqlite
+
+Loads random frames into a SQLite observation database, see `void.db`,
+and times point, cone and time queries at random positions.
+
+Usage:
+  bench_sqlite.py [--frames=N] [--queries=Q] [--batch-size=N] [--db=PATH]
+  bench_sqlite.py -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -n --frames=N       Number of frames [default: 1000000]
+  -q --queries=Q      Number of queries of each kind [default: 1000]
+  -b --batch-size=N   Rows per transaction [default: 100000]
+  -d --db=PATH        Database file, a temporary one by default
+"""
+
+import os
+import tempfile
+import time
+
+import docopt
+import numpy as np
+
+from void import db, ingest
+
+
+def random_records(n, seed=0):
+    rng = np.random.RandomState(seed)
+    ra = rng.uniform(0, 360, n)
+    dec = np.rad2deg(np.arcsin(rng.uniform(-1, 1, n)))
+    x_size = rng.uniform(0.5, 1, n)
+    y_size = rng.uniform(0.5, 1, n)
+    pos_angle = rng.uniform(0, 360, n)
+    seconds = rng.randint(0, 10 * 365 * 86400, n).astype('m8[s]')
+    date_obs = np.datetime_as_string(np.datetime64('2010-01-01') + seconds)
+    for i in range(n):
+        yield {
+            'path': f'/data/{i:07d}.fits',
+            'date_obs': date_obs[i],
+            'exposure': 60.0,
+            'focus': 4400,
+            'ra_center': ra[i],
+            'dec_center': dec[i],
+            'x_deg_size': x_size[i],
+            'y_deg_size': y_size[i],
+            'pos_angle': pos_angle[i],
+            'mag_lim': 20.0,
+        }
+
+
+def per_query(func, queries):
+    start = time.perf_counter()
+    found = sum(len(list(func(*query))) for query in queries)
+    elapsed = time.perf_counter() - start
+    return 1000 * elapsed / len(queries), found / len(queries)
+
+
+def main():
+    arguments = docopt.docopt(__doc__, help=True)
+    n_frames = int(float(arguments['--frames']))
+    n_queries = int(arguments['--queries'])
+    batch_size = int(float(arguments['--batch-size']))
+    fname = arguments['--db']
+    if fname is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        fname = os.path.join(tmp_dir.name, 'void.sqlite')
+
+    with db.connect(fname) as database:
+        database.create_schema()
+        start = time.perf_counter()
+        ingest.ingest_records(database, random_records(n_frames), batch_size)
+        elapsed = time.perf_counter() - start
+        print(
+            f'insert {n_frames} frames: {elapsed:.1f} s, '
+            f'{n_frames / elapsed:.0f} frames/s'
+        )
+        start = time.perf_counter()
+        ingest.ingest_records(database, random_records(n_frames), batch_size)
+        print(f'reinsert unchanged: {time.perf_counter() - start:.1f} s')
+
+        rng = np.random.RandomState(1)
+        ra = rng.uniform(0, 360, n_queries)
+        dec = np.rad2deg(np.arcsin(rng.uniform(-1, 1, n_queries)))
+        days = rng.randint(0, 10 * 365, n_queries).astype('m8[D]')
+        starts = np.datetime64('2010-01-01') + days
+        times = [
+            (str(day), str(day + np.timedelta64(1, 'D'))) for day in starts
+        ]
+        for name, func, queries in (
+            ('point', database.query_covers, list(zip(ra, dec))),
+            (
+                'cone 0.5 deg',
+                database.query_cone,
+                [(r, d, 0.5) for r, d in zip(ra, dec)],
+            ),
+            ('1 day', database.query_time, times),
+            (
+                'point, 1 month',
+                database.query_covers,
+                [(r, d, '2015-01-01', '2015-02-01') for r, d in zip(ra, dec)],
+            ),
+        ):
+            elapsed, found = per_query(func, queries)
+            print(
+                f'{name:>16}: {elapsed:.3f} ms, {found:.1f} frames per query'
+            )
+
+
+if __name__ == '__main__':
+    main()
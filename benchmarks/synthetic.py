@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+synthetic
+
+Writes an archive of synthetic FITS frames for benchmarks, one directory
+per observing night named YYYY-MM-DD under a directory per year. Frames
+are spread over the nights and taken from dusk to dawn, with the headers
+read by void_reducer and random sky images. A fraction of the frames is
+already flagged, as void_sniffer leaves them.
+
+Usage:
+  synthetic.py DEST_DIR [--frames=N] [--nights=N] [--size=PIXELS] \
+[--flagged=FRACTION] [--start=DATE] [--seed=S]
+  synthetic.py -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -n --frames=N       Number of frames [default: 1000]
+  -d --nights=N       Number of nights [default: 10]
+  -s --size=PIXELS    Width and height of frames [default: 256]
+  -f --flagged=FRACTION
+                      Fraction of frames flagged [default: 0.2]
+  -t --start=DATE     Date of the first night [default: 2019-01-01]
+  -r --seed=S         Random seed [default: 0]
+"""
+
+import os
+
+import docopt
+import numpy as np
+from astropy.io import fits
+
+FLAG_NAME = 'VISNJAN'
+# Frames are taken from 18:00 on the night's date for up to 12 hours
+DUSK_HOURS = 18
+NIGHT_HOURS = 12
+PIXEL_SCALE = 0.0003  # deg/px
+SKY_LEVEL = 1000
+SKY_NOISE = 30
+BLOCK_SIZE = 2880
+
+
+def night_dates(n_nights, start, rng):
+    """ Dates of `n_nights` nights from `start`, a few days apart. """
+    gaps = rng.randint(1, 4, n_nights)
+    gaps[0] = 0
+    return np.datetime64(start, 'D') + np.cumsum(gaps).astype('m8[D]')
+
+
+def frame_times(nights, n_frames, rng):
+    """ Sorted DATE-OBS times of `n_frames` frames over `nights`. """
+    night = np.sort(rng.randint(0, len(nights), n_frames))
+    offsets = DUSK_HOURS * 3600 + rng.uniform(0, NIGHT_HOURS * 3600, n_frames)
+    times = nights[night] + (1e3 * offsets).astype('m8[ms]')
+    order = np.lexsort((times, night))
+    return night[order], times[order]
+
+
+def frame_header(rng, date_obs, size, flagged):
+    header = fits.Header()
+    header['SIMPLE'] = True
+    header['BITPIX'] = 16
+    header['NAXIS'] = 2
+    header['NAXIS1'] = size
+    header['NAXIS2'] = size
+    header['BZERO'] = 32768
+    header['BSCALE'] = 1
+    header['DATE-OBS'] = date_obs
+    header['EXPTIME'] = float(rng.choice([30.0, 60.0, 120.0]))
+    header['FOCUSPOS'] = int(rng.randint(4000, 5000))
+    header['CRVAL1'] = float(rng.uniform(0, 360))
+    header['CRVAL2'] = float(np.rad2deg(np.arcsin(rng.uniform(-0.5, 1))))
+    header['CDELT1'] = -PIXEL_SCALE
+    header['CDELT2'] = PIXEL_SCALE
+    header['PA'] = float(rng.uniform(0, 360))
+    header['ZMAG'] = float(rng.uniform(17, 19))
+    header['TELESCOP'] = 'synthetic'
+    header['FILTER'] = 'L'
+    if flagged:
+        header[FLAG_NAME] = 'True'
+    header['HISTORY'] = 'written by benchmarks/synthetic.py'
+    return header
+
+
+def frame_data(rng, size):
+    sky = rng.normal(SKY_LEVEL, SKY_NOISE, (size, size))
+    # Unsigned 16 bit values, stored signed with BZERO
+    return (sky.astype('u2') - np.uint16(32768)).astype('>i2')
+
+
+def write_frame(fname, header, data):
+    data_bytes = data.tobytes()
+    padding = -len(data_bytes) % BLOCK_SIZE
+    with open(fname, 'wb') as f:
+        f.write(header.tostring().encode('ascii'))
+        f.write(data_bytes)
+        f.write(bytes(padding))
+
+
+def make_archive(
+    dest_dir,
+    frames=1000,
+    nights=10,
+    size=256,
+    flagged=0.2,
+    start='2019-01-01',
+    seed=0,
+):
+    """ Write the archive under `dest_dir`, returning its frame paths. """
+    rng = np.random.RandomState(seed)
+    dates = night_dates(nights, start, rng)
+    night, times = frame_times(dates, frames, rng)
+    is_flagged = rng.uniform(0, 1, frames) < flagged
+    paths = []
+    for i, (n, time, frame_flagged) in enumerate(
+        zip(night, times, is_flagged)
+    ):
+        date = str(dates[n])
+        night_dir = os.path.join(dest_dir, date[:4], date)
+        os.makedirs(night_dir, exist_ok=True)
+        fname = os.path.join(night_dir, f'frame_{i:06d}.fits')
+        header = frame_header(rng, str(time), size, frame_flagged)
+        write_frame(fname, header, frame_data(rng, size))
+        paths.append(fname)
+    return paths
+
+
+def main():
+    arguments = docopt.docopt(__doc__, help=True)
+    paths = make_archive(
+        arguments['DEST_DIR'],
+        frames=int(float(arguments['--frames'])),
+        nights=int(arguments['--nights']),
+        size=int(arguments['--size']),
+        flagged=float(arguments['--flagged']),
+        start=arguments['--start'],
+        seed=int(arguments['--seed']),
+    )
+    print(f'wrote {len(paths)} frames to {arguments["DEST_DIR"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,14 @@ setup(
     url='https://github.com/astrohr/void',
     author='astrohr',
     author_email='dagor@astro.hr',
-    scripts=['scripts/void_sniffer', 'scripts/void_reducer'],
+    scripts=[
+        'scripts/void_sniffer',
+        'scripts/void_reducer',
+        'scripts/void_ingest',
+        'scripts/void_query',
+        'scripts/void_daemon',
+        'scripts/void_preview',
+    ],
     packages=['void'],
     license='MIT',
     keywords='',
@@ -18,7 +25,7 @@ setup(
         'docopt>=0.6.2,<0.7',
         'astropy>=3.1.1,<3.2',
         'psycopg2>=2.7,<2.8',
-        'numpy>=1.11.0,<1.16',
+        'numpy>=1.15.0,<1.16',
     ],
     extras_require={'dev': ['flake8', 'black', 'coverage']},
 )
@@ -1,66 +1,33 @@
 #!/usr/bin/python3
 """
-Example program to insert image paths into a database.
+Insert image paths into a PostgreSQL database, see void_ingest.
 
 Usage:
   Setup.py <db> (--user=USER) (--passwd=PASSWORD) (--src=IMAGES_FOLDER_PATH) \
-  [--host=HOST] [--port=PORT]
+  [--host=HOST] [--port=PORT] [--batch-size=N]
 
 Options:
    -h, --help       Show this message.
+   --host=HOST      [default: 127.0.0.1]
+   --port=PORT      [default: 5432]
+   --batch-size=N   Rows per transaction [default: 10000]
 
 """
-import os
-
-import psycopg2
 from docopt import docopt
 
-arguments = docopt(__doc__)
-
-# Required args
-db = arguments.get("<db>")
-user = arguments.get("--user")
-passwd = arguments.get("--passwd")
-src = arguments.get("--src")
+from void import db, ingest
 
-# Optional args
-host = arguments.get("--host")
-port = arguments.get("--port")
-
-# If optional args are None
-if not host:
-    host = "127.0.0.1"
-if not port:
-    port = "5432"
+arguments = docopt(__doc__)
 
-# PostgreSQL opearations
-conn = psycopg2.connect(
-    database=db, user=user, password=passwd, host=host, port=port
+dsn = db.postgres_dsn(
+    dbname=arguments["<db>"],
+    user=arguments["--user"],
+    password=arguments["--passwd"],
+    host=arguments["--host"],
+    port=arguments["--port"],
 )
-
-print("Opened database successfully")
-
-cur = conn.cursor()
-
-# Create table (example only)
-cur.execute(
-    "CREATE TABLE OBSERVATIONS "
-    "(ID INT PRIMARY KEY     NOT NULL, "
-    "PATH           TEXT    NOT NULL);"
+inserted = ingest.ingest_dir(
+    dsn, arguments["--src"], int(arguments["--batch-size"])
 )
 
-print("Table created successfully")
-
-content = os.listdir(src)
-imgs = [f for f in content if f.endswith(".fit")]
-
-for i, img in enumerate(imgs):
-    cur.execute(
-        "INSERT INTO OBSERVATIONS (ID,PATH) "
-        "VALUES ({}, '{}');".format(i, os.path.abspath(img))
-    )
-
-print("Values inserted succesfully")
-
-conn.commit()
-conn.close()
+print("{} paths inserted".format(inserted))
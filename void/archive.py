@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Reading FITS files stored in uncompressed tar and in zip night archives.
+
+A file inside an archive is named by the archive path and the member name
+joined with `SEPARATOR`, e.g. `2019-01-09.tar::frames/0001.fits`. Members
+are read at their offset in the archive, nothing is extracted.
+"""
+
+import collections
+import contextlib
+import functools
+import logging
+import os
+import struct
+import tarfile
+import zipfile
+
+log = logging.getLogger(__name__)
+
+SEPARATOR = '::'
+EXTENSIONS = ('.tar', '.zip')
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+# Offset of member data in the archive, None for compressed members
+Member = collections.namedtuple('Member', ['name', 'offset', 'size'])
+
+
+def is_archive(fname):
+    return fname.endswith(EXTENSIONS)
+
+
+def is_member(path):
+    return SEPARATOR in path
+
+
+def join_path(archive_fname, name):
+    return f'{archive_fname}{SEPARATOR}{name}'
+
+
+def split_path(path):
+    """ Split `path` into archive path and member name. """
+    archive_fname, _, name = path.partition(SEPARATOR)
+    return archive_fname, name
+
+
+def stat(path):
+    """ Like `os.stat`, but stat the archive of archive members. """
+    return os.stat(split_path(path)[0])
+
+
+def member_index(archive_fname):
+    """
+    Members of `archive_fname` by name, in archive order.
+
+    The index is built once per archive and reused while the archive's
+    size and mtime are unchanged.
+    """
+    archive_stat = os.stat(archive_fname)
+    return _member_index(
+        os.path.abspath(archive_fname),
+        archive_stat.st_size,
+        archive_stat.st_mtime_ns,
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _member_index(abs_fname, size, mtime_ns):
+    log.debug('indexing archive %s', abs_fname)
+    if abs_fname.endswith('.zip'):
+        members = _zip_members(abs_fname)
+    else:
+        members = _tar_members(abs_fname)
+    return {member.name: member for member in members}
+
+
+def _tar_members(fname):
+    # Only member headers are read, tarfile seeks over member data
+    with tarfile.open(fname, 'r:') as tar:
+        for info in tar:
+            if info.isfile():
+                yield Member(info.name, info.offset_data, info.size)
+
+
+def _zip_members(fname):
+    with zipfile.ZipFile(fname) as zip_file, open(fname, 'rb') as raw:
+        for info in zip_file.infolist():
+            if info.is_dir():
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                yield Member(info.filename, None, info.file_size)
+                continue
+            # Local header lengths may differ from the central directory
+            raw.seek(info.header_offset)
+            local_header = ZIP_LOCAL_HEADER.unpack(
+                raw.read(ZIP_LOCAL_HEADER.size)
+            )
+            name_length, extra_length = local_header[-2:]
+            offset = (
+                info.header_offset
+                + ZIP_LOCAL_HEADER.size
+                + name_length
+                + extra_length
+            )
+            yield Member(info.filename, offset, info.file_size)
+
+
+def members(archive_fname, extensions):
+    """ Yield paths of members of `archive_fname` with `extensions`. """
+    for name in member_index(archive_fname):
+        if name.endswith(extensions):
+            yield join_path(archive_fname, name)
+
+
+@contextlib.contextmanager
+def open_member(path):
+    """
+    Open archive member `path` for reading, positioned at its start.
+    """
+    archive_fname, name = split_path(path)
+    try:
+        member = member_index(archive_fname)[name]
+    except KeyError:
+        raise FileNotFoundError(f'no member {name} in {archive_fname}')
+    if member.offset is None:
+        with zipfile.ZipFile(archive_fname) as zip_file:
+            with zip_file.open(name) as member_file:
+                yield member_file
+        return
+    with open(archive_fname, 'rb') as archive_file:
+        archive_file.seek(member.offset)
+        yield archive_file
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""
+Binary catalog of header data, readable with `numpy.memmap`.
+
+A catalog file starts with `MAGIC`, followed by the length of a JSON
+schema header as a little-endian uint32 and the schema itself, padded so
+that rows start at a multiple of `ALIGN` bytes. Rows of fixed width
+follow, one per frame, until the end of the file. They hold numbers
+only, paths are concatenated in a file next to the catalog, see
+`paths_fname`, and each row ends with the offset and size of its path:
+
+    >>> cat = read_catalog('void.cat')
+    >>> night = cat[(cat['date_obs'] >= t0) & (cat['date_obs'] < t1)]
+    >>> paths = read_paths('void.cat', night)
+"""
+
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+from void import time_utils
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'\x93VOIDCAT'
+VERSION = 2
+ALIGN = 64
+SCHEMA_LENGTH = struct.Struct('<I')
+PATHS_SUFFIX = '.paths'
+
+CATALOG_DTYPE = np.dtype(
+    [
+        ('date_obs', '<M8[ns]'),
+        ('exposure', '<f8'),
+        ('focus', '<f8'),
+        ('ra_center', '<f8'),
+        ('dec_center', '<f8'),
+        ('x_deg_size', '<f8'),
+        ('y_deg_size', '<f8'),
+        ('pos_angle', '<f8'),
+        ('mag_lim', '<f8'),
+        ('path_offset', '<u8'),
+        ('path_size', '<u8'),
+    ]
+)
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def paths_fname(fname):
+    """ Name of the file holding the paths of catalog `fname`. """
+    return fname + PATHS_SUFFIX
+
+
+def schema_bytes(dtype=CATALOG_DTYPE):
+    """ Header of a new catalog with rows of `dtype`. """
+    schema = json.dumps({'version': VERSION, 'dtype': dtype.descr})
+    schema = schema.encode('ascii')
+    length = len(MAGIC) + SCHEMA_LENGTH.size + len(schema)
+    schema += b' ' * (-length % ALIGN)
+    return MAGIC + SCHEMA_LENGTH.pack(len(schema)) + schema
+
+
+def read_schema(catalog_file):
+    """ Return the row dtype and the offset of the first row. """
+    magic = catalog_file.read(len(MAGIC))
+    if magic != MAGIC:
+        raise CatalogError(f'not a void catalog: {catalog_file.name}')
+    (length,) = SCHEMA_LENGTH.unpack(catalog_file.read(SCHEMA_LENGTH.size))
+    schema = json.loads(catalog_file.read(length).decode('ascii'))
+    if schema['version'] != VERSION:
+        raise CatalogError(f'unknown catalog version: {schema["version"]}')
+    descr = [tuple(field) for field in schema['dtype']]
+    return np.dtype(descr), len(MAGIC) + SCHEMA_LENGTH.size + length
+
+
+def read_catalog(fname, mode='r'):
+    """
+    Map the rows of catalog `fname` as a structured array.
+
+    Nothing is parsed, fields are read from the file as they are used.
+    A trailing partial row, left by an interrupted write, is ignored.
+    """
+    with open(fname, 'rb') as catalog_file:
+        dtype, offset = read_schema(catalog_file)
+        size = os.fstat(catalog_file.fileno()).st_size
+    n_rows = (size - offset) // dtype.itemsize
+    if n_rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(
+        fname, dtype=dtype, mode=mode, offset=offset, shape=n_rows
+    )
+
+
+def read_paths(fname, rows):
+    """
+    Paths of `rows` of catalog `fname` as bytes, e.g. of a selection of
+    `read_catalog(fname)`.
+    """
+    if not len(rows):
+        return []
+    paths = np.memmap(paths_fname(fname), dtype='u1', mode='r')
+    offsets = rows['path_offset'].tolist()
+    sizes = rows['path_size'].tolist()
+    return [
+        paths[offset:offset + size].tobytes()
+        for offset, size in zip(offsets, sizes)
+    ]
+
+
+def header_row(fname, data):
+    """
+    Catalog row of FITS file `fname` from its `reducer.header_data`, with
+    its absolute path first.
+    """
+    path = os.fsencode(os.path.abspath(fname))
+    return (
+        path,
+        time_utils.parse_fits_time(data['date_obs']),
+        data['exposure'],
+        data['focus'],
+        data['ra_center'],
+        data['dec_center'],
+        data['x_deg_size'],
+        data['y_deg_size'],
+        data['pos_angle'],
+        data['mag_lim'],
+    )
+
+
+class CatalogWriter:
+    """
+    Write rows to a new catalog, or append them to an existing one.
+
+    Rows are buffered and written `buffer_rows` at a time, each after
+    its path, so that an interrupted write leaves no row without one.
+    """
+
+    def __init__(
+        self, fname, append=False, dtype=CATALOG_DTYPE, buffer_rows=4096
+    ):
+        self.fname = fname
+        self.dtype = dtype
+        self.buffer_rows = buffer_rows
+        self.rows = []
+        self.path_offset = 0
+        if append and os.path.exists(fname) and os.path.getsize(fname):
+            self.file = open(fname, 'r+b')
+            self.paths_file = open(paths_fname(fname), 'ab')
+            self._seek_end()
+        else:
+            self.file = open(fname, 'wb')
+            self.file.write(schema_bytes(dtype))
+            self.paths_file = open(paths_fname(fname), 'wb')
+        log.debug('writing catalog %s', fname)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _seek_end(self):
+        """
+        Check the schema and drop a trailing partial row, and paths past
+        the last row.
+        """
+        dtype, offset = read_schema(self.file)
+        if dtype != self.dtype:
+            self._close_files()
+            raise CatalogError(f'catalog schema differs: {self.fname}')
+        size = os.fstat(self.file.fileno()).st_size
+        end = size - (size - offset) % dtype.itemsize
+        if end != size:
+            log.warning('dropping partial row of %s', self.fname)
+            self.file.truncate(end)
+        if end > offset:
+            self.file.seek(end - dtype.itemsize)
+            last = np.frombuffer(self.file.read(dtype.itemsize), dtype)[0]
+            self.path_offset = int(last['path_offset'] + last['path_size'])
+        paths_size = os.fstat(self.paths_file.fileno()).st_size
+        if paths_size < self.path_offset:
+            self._close_files()
+            raise CatalogError(f'catalog paths missing: {self.fname}')
+        self.paths_file.truncate(self.path_offset)
+        self.file.seek(end)
+
+    def write_row(self, row):
+        """ Buffer `row`, a path as bytes followed by the values. """
+        self.rows.append(row)
+        if len(self.rows) >= self.buffer_rows:
+            self.flush()
+
+    def write_rows(self, paths, rows):
+        """ Write a structured array of rows at once, with their `paths`. """
+        self.flush()
+        self._write(paths, np.array(rows, dtype=self.dtype))
+
+    def _write(self, paths, rows):
+        sizes = np.array([len(path) for path in paths], dtype='u8')
+        rows['path_size'] = sizes
+        rows['path_offset'] = self.path_offset + np.cumsum(sizes) - sizes
+        self.paths_file.write(b''.join(paths))
+        self.paths_file.flush()
+        self.file.write(rows.tobytes())
+        self.path_offset += int(sizes.sum())
+
+    def flush(self):
+        if self.rows:
+            paths = [row[0] for row in self.rows]
+            rows = np.array(
+                [tuple(row[1:]) + (0, 0) for row in self.rows],
+                dtype=self.dtype,
+            )
+            self._write(paths, rows)
+            self.rows = []
+        self.file.flush()
+
+    def _close_files(self):
+        self.file.close()
+        self.paths_file.close()
+
+    def close(self):
+        self.flush()
+        self._close_files()
@@ -3,13 +3,55 @@
 Functions used in misc files.
 """
 
+import atexit
+import bisect
+import collections
+import contextlib
+import cProfile
+import importlib
+import json
 import logging
+import os
+import sys
+import threading
+import time
+import types
+from concurrent import futures
 
 import docopt
 
+log = logging.getLogger(__name__)
+
 LOG_FORMAT = (
     '%(levelname)-8s  %(asctime)s  %(process)-5d  %(name)-26s  %(message)s'
 )
+# Path to write cProfile stats of a run to, see `configure_profile`
+PROFILE_ENV = 'VOID_PROFILE'
+# Functions run when a command finishes, by `run_exit_funcs`
+EXIT_FUNCS = []
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for module `name`, which is imported on first attribute
+    access, as any other import, and used through this from then on.
+    """
+
+    def __getattr__(self, attr):
+        module = self.__dict__.get('_module')
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self._module = module
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """
+    Module `name`, imported once used. Keeps numpy, astropy and the
+    modules using them out of the startup of scripts, so that --help and
+    --version return without waiting for them.
+    """
+    return sys.modules.get(name) or LazyModule(name)
 
 
 def configure_log(verbosity):
@@ -23,3 +65,175 @@ def configure_log(verbosity):
     if verbosity not in levels.keys():
         raise docopt.DocoptExit('--verbosity not one of 0, 1, 2, 3, 4')
     logging.basicConfig(level=levels[verbosity], format=LOG_FORMAT)
+
+
+class Stats:
+    """
+    Counters and latency histograms of pipeline stages.
+
+    Disabled, counting and timing cost an attribute check. Stages run in
+    worker processes are not counted, only those of the main process and
+    its threads.
+    """
+
+    # Upper bounds of latency buckets in seconds, 1 us to 16 s by 4x
+    BUCKETS = tuple(1e-6 * 4**i for i in range(13))
+    NULL_TIMER = contextlib.nullcontext()
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.counters = collections.Counter()
+        self.latencies = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def error(self, exc):
+        """ Count `exc` under errors of its type. """
+        self.count(f'errors.{type(exc).__name__}')
+
+    def timer(self, name):
+        """ Context manager adding its run time to stage `name`. """
+        if not self.enabled:
+            return self.NULL_TIMER
+        return self._timer(name)
+
+    @contextlib.contextmanager
+    def _timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_latency(name, time.perf_counter() - start)
+
+    def add_latency(self, name, seconds):
+        bucket = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            stage = self.latencies.get(name)
+            if stage is None:
+                stage = self.latencies[name] = {
+                    'count': 0,
+                    'total_s': 0.0,
+                    'max_s': 0.0,
+                    'buckets': [0] * (len(self.BUCKETS) + 1),
+                }
+            stage['count'] += 1
+            stage['total_s'] += seconds
+            stage['max_s'] = max(stage['max_s'], seconds)
+            stage['buckets'][bucket] += 1
+
+    def summary(self):
+        """
+        Counters and stages as a JSON dictionary. Histograms map bucket
+        upper bounds in seconds to counts, leaving out empty buckets.
+        """
+        bounds = [f'{bound:g}' for bound in self.BUCKETS] + ['inf']
+        with self._lock:
+            stages = {
+                name: {
+                    'count': stage['count'],
+                    'total_s': stage['total_s'],
+                    'mean_s': stage['total_s'] / stage['count'],
+                    'max_s': stage['max_s'],
+                    'histogram': {
+                        bound: count
+                        for bound, count in zip(bounds, stage['buckets'])
+                        if count
+                    },
+                }
+                for name, stage in sorted(self.latencies.items())
+            }
+            return {
+                'elapsed_s': time.perf_counter() - self.started,
+                'counters': dict(sorted(self.counters.items())),
+                'stages': stages,
+            }
+
+    def write(self, stream=None):
+        stream = sys.stderr if stream is None else stream
+        stream.write(json.dumps(self.summary()) + '\n')
+
+
+STATS = Stats()
+
+
+def run_exit_funcs():
+    """
+    Run and remove `EXIT_FUNCS`, last registered first. Called at exit,
+    and by the daemon when a command run in a forked child finishes.
+    """
+    while EXIT_FUNCS:
+        func = EXIT_FUNCS.pop()
+        try:
+            func()
+        except Exception:
+            log.exception('exit function failed')
+
+
+atexit.register(run_exit_funcs)
+
+
+def configure_stats(enabled):
+    """ Enable `STATS` if `enabled`, writing them to stderr at exit. """
+    if not enabled:
+        return
+    STATS.enabled = True
+    STATS.started = time.perf_counter()
+    EXIT_FUNCS.append(STATS.write)
+
+
+def configure_profile():
+    """
+    Profile the run with cProfile if the `PROFILE_ENV` variable is set,
+    writing stats to the file it names at exit, see `pstats`.
+    """
+    fname = os.environ.get(PROFILE_ENV)
+    if not fname:
+        return None
+    profiler = cProfile.Profile()
+
+    def dump():
+        profiler.disable()
+        profiler.dump_stats(fname)
+        log.info('profile written to %s', fname)
+
+    EXIT_FUNCS.append(dump)
+    profiler.enable()
+    return profiler
+
+
+def bounded_map(executor, func, iterable, window, ordered=True):
+    """
+    Map `func` over `iterable` on `executor`, with at most `window` calls
+    in flight at any time.
+
+    Yields `(item, future)` pairs of finished calls, in input order if
+    `ordered`, otherwise in completion order. Calls still pending when the
+    generator is closed are cancelled.
+    """
+    pending = {}
+    try:
+        for item in iterable:
+            pending[executor.submit(func, item)] = item
+            if len(pending) >= window:
+                yield from _pop_done(pending, ordered)
+        while pending:
+            yield from _pop_done(pending, ordered)
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _pop_done(pending, ordered):
+    if ordered:
+        first = next(iter(pending))
+        done = [first]
+        futures.wait(done)
+    else:
+        done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+    for future in done:
+        yield pending.pop(future), future
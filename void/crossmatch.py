@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""
+Cross-matching ephemerides of moving objects against image footprints.
+
+Ephemerides map designations to structured arrays of `EPHEMERIS_DTYPE`,
+positions in degrees at MJD times, motion in arcsec per minute and its
+position angle in degrees east of north, e.g. from
+`ephemeris.by_designation`. Frames are structured arrays
+with the fields of `FRAME_FIELDS`, e.g. a `void.catalog` or from
+`reducer.read_header_data_many`.
+
+Frames are sorted by time once, each object then only looks at the
+frames within its ephemeris time span. Its position is interpolated to
+the middle of each of those exposures and tested against the frame
+footprint, for all objects and frames at once.
+"""
+
+import logging
+
+import numpy as np
+
+from void import math_utils, time_utils
+
+log = logging.getLogger(__name__)
+
+EPHEMERIS_DTYPE = np.dtype(
+    [
+        ('mjd', 'f8'),
+        ('ra', 'f8'),
+        ('dec', 'f8'),
+        ('motion', 'f8'),
+        ('pa', 'f8'),
+    ]
+)
+
+FRAME_FIELDS = (
+    'date_obs',
+    'ra_center',
+    'dec_center',
+    'x_deg_size',
+    'y_deg_size',
+    'pos_angle',
+)
+
+# Offsets are in degrees from the frame center, along its x and y sizes
+MATCH_DTYPE = np.dtype(
+    [
+        ('designation', 'U32'),
+        ('frame', 'i8'),
+        ('mjd', 'f8'),
+        ('ra', 'f8'),
+        ('dec', 'f8'),
+        ('x_offset', 'f8'),
+        ('y_offset', 'f8'),
+    ]
+)
+
+# Days an ephemeris is extrapolated by its motion, beyond its first and
+# last position
+EXTRAPOLATE_DAYS = 0.25
+# Object and frame pairs interpolated at once
+CHUNK_PAIRS = 1_000_000
+
+
+def frame_mjd(frames):
+    """ MJD of the middle of each exposure, or its start without one. """
+    mjd = time_utils.datetime64_to_mjd(frames['date_obs'])
+    if 'exposure' in frames.dtype.names:
+        exposure = np.nan_to_num(frames['exposure'])
+        mjd = mjd + 0.5 * exposure / 86400
+    return mjd
+
+
+def crossmatch(
+    ephemerides,
+    frames,
+    extrapolate=EXTRAPOLATE_DAYS,
+    chunk_pairs=CHUNK_PAIRS,
+):
+    """
+    Find the frames each object of `ephemerides` falls on.
+
+    Returns an array of `MATCH_DTYPE`, ordered by object, in the order of
+    `ephemerides`, and by frame time. `frame` is the row in `frames`, and
+    `mjd`, `ra` and `dec` the predicted position during its exposure.
+    Ephemerides without motion are not extrapolated.
+    """
+    designations = list(ephemerides)
+    ephemeris = _Ephemeris([ephemerides[name] for name in designations])
+    frame_times = frame_mjd(frames)
+    frame_order = np.argsort(frame_times, kind='stable')
+    frame_order = frame_order[np.isfinite(frame_times[frame_order])]
+    sorted_times = frame_times[frame_order]
+
+    # The sweep: each object's window of frames, sorted by time
+    t_first, t_last = ephemeris.window(extrapolate)
+    dec_min, dec_max = ephemeris.dec_range(extrapolate)
+    frame_radius = 0.5 * np.hypot(frames['x_deg_size'], frames['y_deg_size'])
+    frame_lo = np.searchsorted(sorted_times, t_first, 'left')
+    frame_hi = np.searchsorted(sorted_times, t_last, 'right')
+    n_pairs = np.maximum(frame_hi - frame_lo, 0)
+
+    matches = []
+    for objects in _chunks(n_pairs, chunk_pairs):
+        counts = n_pairs[objects]
+        pair_objects = np.repeat(objects, counts)
+        pair_frames = frame_order[
+            np.repeat(frame_lo[objects], counts)
+            + math_utils.concat_ranges(counts)
+        ]
+        # Most pairs are far apart in declination, drop them before the
+        # interpolation and projection
+        frame_dec = frames['dec_center'][pair_frames]
+        near = frame_dec + frame_radius[pair_frames] >= dec_min[pair_objects]
+        near &= frame_dec - frame_radius[pair_frames] <= dec_max[pair_objects]
+        pair_objects, pair_frames = pair_objects[near], pair_frames[near]
+        mjd = frame_times[pair_frames]
+        ra, dec = ephemeris.position(pair_objects, mjd)
+        xi, eta = math_utils.gnomonic(
+            frames['ra_center'][pair_frames],
+            frames['dec_center'][pair_frames],
+            ra,
+            dec,
+        )
+        x_offset, y_offset = math_utils.footprint_coords(
+            xi, eta, frames['pos_angle'][pair_frames]
+        )
+        inside = (
+            np.abs(x_offset) <= 0.5 * frames['x_deg_size'][pair_frames]
+        ) & (np.abs(y_offset) <= 0.5 * frames['y_deg_size'][pair_frames])
+        chunk = np.empty(np.count_nonzero(inside), dtype=MATCH_DTYPE)
+        chunk['designation'] = np.asarray(designations, dtype='U32')[
+            pair_objects[inside]
+        ]
+        chunk['frame'] = pair_frames[inside]
+        chunk['mjd'] = mjd[inside]
+        chunk['ra'] = ra[inside]
+        chunk['dec'] = dec[inside]
+        chunk['x_offset'] = x_offset[inside]
+        chunk['y_offset'] = y_offset[inside]
+        matches.append(chunk)
+        log.debug('%d pairs, %d matches', len(mjd), len(chunk))
+    if not matches:
+        return np.empty(0, dtype=MATCH_DTYPE)
+    return np.concatenate(matches)
+
+
+def _chunks(n_pairs, chunk_pairs):
+    """ Split objects into runs of about `chunk_pairs` pairs. """
+    objects = np.flatnonzero(n_pairs)
+    if not len(objects):
+        return
+    chunk_ids = np.cumsum(n_pairs[objects]) // max(chunk_pairs, 1)
+    splits = np.flatnonzero(np.diff(chunk_ids)) + 1
+    yield from np.split(objects, splits)
+
+
+class _Ephemeris:
+    """ Ephemerides of many objects, concatenated and sorted by time. """
+
+    def __init__(self, ephemerides):
+        rows = [_sorted_rows(rows) for rows in ephemerides]
+        self.counts = np.array([len(rows) for rows in rows], np.int64)
+        self.first = np.cumsum(self.counts) - self.counts
+        self.last = self.first + self.counts - 1
+        rows = np.concatenate(rows + [_sorted_rows([])])
+        self.mjd = rows['mjd']
+        self.ra = rows['ra']
+        self.dec = rows['dec']
+        self.motion = rows['motion']
+        self.pa = rows['pa']
+        # Sort keys over all objects, by object first, then by time
+        self.mjd_base, self.mjd_scale = 0.0, 1.0
+        if len(self.mjd):
+            self.mjd_base = self.mjd.min()
+            self.mjd_scale += self.mjd.max() - self.mjd_base
+        objects = np.repeat(np.arange(len(self.counts)), self.counts)
+        self.keys = self._key(objects, self.mjd)
+
+    def _key(self, objects, mjd):
+        return objects * self.mjd_scale + (mjd - self.mjd_base)
+
+    def window(self, extrapolate):
+        """
+        Time range of each object, extended by `extrapolate` days at ends
+        with a known motion. NaN for objects without positions.
+        """
+        t_first = np.full(len(self.counts), np.nan)
+        t_last = np.full(len(self.counts), np.nan)
+        known = self.counts > 0
+        first, last = self.first[known], self.last[known]
+        t_first[known] = self.mjd[first] - np.where(
+            np.isfinite(self.motion[first]), extrapolate, 0
+        )
+        t_last[known] = self.mjd[last] + np.where(
+            np.isfinite(self.motion[last]), extrapolate, 0
+        )
+        return t_first, t_last
+
+    def dec_range(self, extrapolate):
+        """
+        Declinations each object may have within its `window`, in degrees.
+        """
+        dec_min = np.full(len(self.counts), np.nan)
+        dec_max = np.full(len(self.counts), np.nan)
+        known = self.counts > 0
+        objects = np.repeat(np.arange(len(self.counts)), self.counts)
+        np.fmin.at(dec_min, objects, self.dec)
+        np.fmax.at(dec_max, objects, self.dec)
+        reach = np.nan_to_num(self.motion) * extrapolate * 1440 / 3600
+        margin = np.zeros(len(self.counts))
+        np.maximum.at(margin, objects, reach)
+        dec_min[known] -= margin[known]
+        dec_max[known] += margin[known]
+        return dec_min, dec_max
+
+    def position(self, objects, mjd):
+        """ Positions of `objects` at times `mjd`, in degrees. """
+        first = self.first[objects]
+        last = self.last[objects]
+        # Keys of other objects sort entirely before or after, clipping
+        # keeps to the rows of the object itself
+        before = np.searchsorted(self.keys, self._key(objects, mjd), 'right')
+        before = np.clip(before - 1, first, last)
+        after = np.minimum(before + 1, last)
+
+        # Linear between the rows around `mjd`, across RA 0/360
+        span = self.mjd[after] - self.mjd[before]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(
+                span > 0, (mjd - self.mjd[before]) / span, 0.0
+            )
+        fraction = np.clip(fraction, 0, 1)
+        d_ra = (self.ra[after] - self.ra[before] + 180) % 360 - 180
+        ra = self.ra[before] + fraction * d_ra
+        dec = self.dec[before] + fraction * (
+            self.dec[after] - self.dec[before]
+        )
+
+        # By motion and its position angle, outside of the ephemeris span
+        outside = np.where(mjd < self.mjd[first], first, -1)
+        outside = np.where(mjd > self.mjd[last], last, outside)
+        extrapolated = outside >= 0
+        if np.any(extrapolated):
+            rows = outside[extrapolated]
+            minutes = (mjd[extrapolated] - self.mjd[rows]) * 1440
+            distance = self.motion[rows] * minutes / 3600
+            pa = np.deg2rad(self.pa[rows])
+            cos_dec = np.cos(np.deg2rad(self.dec[rows]))
+            dec[extrapolated] = self.dec[rows] + distance * np.cos(pa)
+            ra[extrapolated] = self.ra[rows] + distance * np.sin(pa) / cos_dec
+        return ra % 360, dec
+
+
+def _sorted_rows(rows):
+    """
+    Rows as `EPHEMERIS_DTYPE`, missing fields NaN, sorted by time. Rows
+    without a time are dropped.
+    """
+    rows = np.asarray(rows)
+    result = np.full(len(rows), np.nan, dtype=EPHEMERIS_DTYPE)
+    for name in EPHEMERIS_DTYPE.names:
+        if rows.dtype.names and name in rows.dtype.names:
+            result[name] = rows[name]
+    result = result[np.isfinite(result['mjd'])]
+    return result[np.argsort(result['mjd'], kind='stable')]
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+"""
+void_daemon 0.1
+
+Runs void_sniffer, void_reducer and void_preview in a warm process, which
+has numpy and astropy imported already, so short runs skip the startup.
+The server listens on a Unix socket and forks a child per run. The client
+passes ARGS, its working directory, VOID_* environment variables, like
+VOID_PROFILE, stdin, stdout, stderr and the exit status through, so it
+can take the place of a script in a pipeline, e.g.
+
+  void_daemon sniffer DIR --ignore-flag | void_daemon reducer --with-path
+
+The socket is created readable by its owner only. Without --socket, it
+is void.sock under $XDG_RUNTIME_DIR or void-UID.sock in the temporary
+directory.
+
+Usage:
+  void_daemon [--socket=PATH] [--verbosity=V] serve
+  void_daemon [--socket=PATH] stop
+  void_daemon [--socket=PATH] (sniffer | reducer | preview) [ARGS...]
+  void_daemon -v | --version
+  void_daemon -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -v --version        Show program name and version number
+  -s --socket=PATH    Unix socket of the server
+  -V --verbosity=V    Logging verbosity of the server, 0 to 4 [default: 2]
+"""
+
+import functools
+import importlib
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+
+import docopt
+
+from void import common
+
+log = logging.getLogger(__name__)
+
+# Commands run by the server, by their script modules
+COMMANDS = {
+    'sniffer': 'void.sniffer',
+    'reducer': 'void.reducer',
+    'preview': 'void.preview',
+}
+# Imported by the server before forking, so that runs start warm
+PRELOAD = ('numpy', 'astropy.io.fits', 'astropy.time', 'void.catalog')
+# Frames sent to the client: kind and length, or exit status
+FRAME = struct.Struct('>cI')
+STDOUT = b'o'
+STDERR = b'e'
+EXIT = b'x'
+CHUNK_SIZE = 65536
+# Environment variables passed from the client to runs
+ENV_PREFIX = 'VOID_'
+
+
+def default_socket():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'void.sock')
+    return os.path.join(tempfile.gettempdir(), f'void-{os.getuid()}.sock')
+
+
+class FrameWriter(io.RawIOBase):
+    """ Writes to `sock` as frames of `kind`. """
+
+    def __init__(self, sock, kind):
+        super().__init__()
+        self.sock = sock
+        self.kind = kind
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            self.sock.sendall(FRAME.pack(self.kind, len(data)) + data)
+        return len(data)
+
+
+def frame_stream(sock, kind, line_buffering=False):
+    buffered = io.BufferedWriter(FrameWriter(sock, kind), CHUNK_SIZE)
+    return io.TextIOWrapper(
+        buffered, encoding='utf-8', line_buffering=line_buffering
+    )
+
+
+class RunHandler(socketserver.StreamRequestHandler):
+    """ Runs the command of a request, in a forked child of the server. """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        if request['command'] == 'stop':
+            log.info('stopping')
+            os.kill(os.getppid(), signal.SIGTERM)
+            self.request.sendall(FRAME.pack(EXIT, 0))
+            return
+        stdout = frame_stream(self.request, STDOUT)
+        stderr = frame_stream(self.request, STDERR, line_buffering=True)
+        status = run(
+            request['command'],
+            request['argv'],
+            request['cwd'],
+            request['environ'],
+            io.TextIOWrapper(self.rfile, encoding='utf-8'),
+            stdout,
+            stderr,
+        )
+        stdout.flush()
+        stderr.flush()
+        self.request.sendall(FRAME.pack(EXIT, status))
+
+
+def client_environ(environ=None):
+    """ Variables of `environ`, by default `os.environ`, passed to runs. """
+    environ = os.environ if environ is None else environ
+    return {
+        name: value
+        for name, value in environ.items()
+        if name.startswith(ENV_PREFIX)
+    }
+
+
+def run(command, argv, cwd, environ, stdin, stdout, stderr):
+    """
+    Run `command` with `argv` in `cwd`, with the VOID_* variables of
+    `environ`, on the given streams, as its script would run. Returns the
+    exit status. Only to be called in a child, it changes the working
+    directory, environment, streams and logging of the process.
+    """
+    module = common.lazy_import(COMMANDS[command])
+    os.chdir(cwd)
+    for name in client_environ():
+        del os.environ[name]
+    os.environ.update(client_environ(environ))
+    sys.argv = [f'void_{command}'] + list(argv)
+    sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+    # The command configures logging to its stderr
+    logging.root.handlers = []
+    status = 0
+    try:
+        module.main()
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            stderr.write(f'{e.code}\n')
+            status = 1
+        else:
+            status = e.code or 0
+    except BaseException:
+        traceback.print_exc(file=stderr)
+        status = 1
+    finally:
+        # Children leave through os._exit, which skips atexit, so --stats
+        # and profiles are written here
+        common.run_exit_funcs()
+    return status
+
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+def preload():
+    for name in PRELOAD:
+        importlib.import_module(name)
+
+
+def serve(socket_path):
+    """ Serve runs on `socket_path` until SIGTERM or SIGINT. """
+    preload()
+    if os.path.exists(socket_path):
+        try:
+            connect(socket_path).close()
+        except ConnectionRefusedError:
+            log.info('removing stale socket %s', socket_path)
+            os.unlink(socket_path)
+        else:
+            raise docopt.DocoptExit(f'already serving on {socket_path}')
+
+    def terminate(*_):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, terminate)
+    umask = os.umask(0o177)
+    try:
+        server = Server(socket_path, RunHandler)
+    finally:
+        os.umask(umask)
+    log.info('serving on %s', socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.debug('SIGINT')
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _reader(stdin):
+    """
+    Read function of `stdin`, unbuffered if it is a file. A buffered read
+    left blocking in a thread at exit holds a lock the shutdown needs.
+    """
+    try:
+        fd = stdin.fileno()
+    except (AttributeError, OSError):
+        return functools.partial(stdin.read1, CHUNK_SIZE)
+    return functools.partial(os.read, fd, CHUNK_SIZE)
+
+
+def _send_input(sock, read):
+    try:
+        while True:
+            chunk = read()
+            if not chunk:
+                break
+            sock.sendall(chunk)
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        # The run finished without reading all of it
+        pass
+
+
+def request(
+    socket_path,
+    command,
+    argv=(),
+    stdin=None,
+    stdout=None,
+    stderr=None,
+    environ=None,
+):
+    """
+    Run `command` with `argv` on the server at `socket_path`, passing
+    binary streams and the VOID_* variables of `environ`, by default
+    `os.environ`, through. Returns the exit status of the run.
+    """
+    stdin = sys.stdin.buffer if stdin is None else stdin
+    stdout = sys.stdout.buffer if stdout is None else stdout
+    stderr = sys.stderr.buffer if stderr is None else stderr
+    header = {
+        'command': command,
+        'argv': list(argv),
+        'cwd': os.getcwd(),
+        'environ': client_environ(environ),
+    }
+    with connect(socket_path) as sock:
+        sock.sendall(json.dumps(header).encode() + b'\n')
+        if command != 'stop':
+            sender = threading.Thread(
+                target=_send_input, args=(sock, _reader(stdin)), daemon=True
+            )
+            sender.start()
+        frames = sock.makefile('rb')
+        outputs = {STDOUT: stdout, STDERR: stderr}
+        while True:
+            frame = frames.read(FRAME.size)
+            if len(frame) < FRAME.size:
+                raise ConnectionError('server closed the connection')
+            kind, length = FRAME.unpack(frame)
+            if kind == EXIT:
+                stdout.flush()
+                return length
+            outputs[kind].write(frames.read(length))
+            if kind == STDERR:
+                stderr.flush()
+
+
+def main():
+    name_and_version = __doc__.strip().splitlines()[0]
+    arguments = docopt.docopt(
+        __doc__, help=True, version=name_and_version, options_first=True
+    )
+    socket_path = arguments['--socket'] or default_socket()
+    if arguments['serve']:
+        common.configure_log(arguments['--verbosity'])
+        serve(socket_path)
+        return
+    command = 'stop'
+    for name in COMMANDS:
+        if arguments[name]:
+            command = name
+    try:
+        status = request(socket_path, command, arguments['ARGS'])
+    except (FileNotFoundError, ConnectionRefusedError):
+        raise docopt.DocoptExit(f'no server on {socket_path}')
+    except KeyboardInterrupt:
+        status = 130
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,653 @@
+#!/usr/bin/env python
+"""
+Observation database backends, PostgreSQL with PostGIS and SQLite with
+an R*Tree.
+
+`connect` picks the backend from the database name: a `postgresql://`
+URL or a libpq connection string like `dbname=void user=void` opens
+PostgreSQL, anything else is the path of a SQLite file. psycopg2 is only
+imported when a PostgreSQL database is opened.
+
+Observations are keyed by path. Rows are inserted in batches, each
+committed on its own. Paths already in the database are skipped, or
+with `upsert_observations` updated only where their values changed, so
+an interrupted ingest can be rerun and a rerun writes next to nothing.
+
+Queries go through the spatial index of either backend first, the
+footprints found are then tested exactly, like in `void.skyindex`.
+"""
+
+import io
+import logging
+import math
+import sqlite3
+
+import numpy as np
+
+from void import math_utils, time_utils
+
+log = logging.getLogger(__name__)
+
+POSTGRES_PREFIXES = ('postgresql://', 'postgres://')
+SQLITE_PREFIX = 'sqlite:///'
+
+# Values of reducer records, in table column order
+VALUE_COLUMNS = (
+    'date_obs',
+    'exposure',
+    'focus',
+    'ra_center',
+    'dec_center',
+    'x_deg_size',
+    'y_deg_size',
+    'pos_angle',
+    'mag_lim',
+)
+# Rows of `observation_rows`, the footprint is derived from the values
+OBSERVATION_COLUMNS = ('path',) + VALUE_COLUMNS + ('footprint',)
+# Vertices of `math_utils.calculate_polys` as a closed polygon ring, the
+# first and last vertices are opposite corners, as are the middle two
+FOOTPRINT_RING = [0, 1, 3, 2, 0]
+# Rows returned by queries
+RESULT_COLUMNS = ('path',) + VALUE_COLUMNS
+# Bounding boxes of footprints, the time range is of DATE-OBS only
+BBOX_COLUMNS = (
+    'ra_min',
+    'ra_max',
+    'dec_min',
+    'dec_max',
+    'mjd_min',
+    'mjd_max',
+)
+# Degrees added to the distance a query footprint may have from a position
+# in RA and Dec, as the sides of a footprint polygon run straight in the
+# tangent plane
+PREFILTER_SLACK = 0.05
+# RA range of any stored footprint polygon, whose vertices lie around an RA
+# center from 0 to 360
+POLAR_RA_BAND = (-360.0, 720.0)
+FETCH_ROWS = 10000
+
+
+def connect(name):
+    """ Open the database `name` with the matching backend. """
+    if name.startswith(POSTGRES_PREFIXES) or '=' in name:
+        return PostgresDatabase(name)
+    if name.startswith(SQLITE_PREFIX):
+        name = name[len(SQLITE_PREFIX):]
+    return SQLiteDatabase(name)
+
+
+def postgres_dsn(**params):
+    """ libpq connection string of `params`, skipping None values. """
+    return ' '.join(
+        f'{key}={_dsn_value(value)}'
+        for key, value in params.items()
+        if value is not None
+    )
+
+
+def _dsn_value(value):
+    value = str(value).replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{value}'"
+
+
+def observation_rows(records):
+    """
+    Rows of `OBSERVATION_COLUMNS` of reducer `records`, dicts with a
+    "path". Missing and NaN values are None, as are footprints of records
+    without a full geometry. Times are ISO strings in UTC.
+    """
+    records = list(records)
+    values = [
+        [record.get(name) for name in VALUE_COLUMNS] for record in records
+    ]
+    columns = list(zip(*values)) or [()] * len(VALUE_COLUMNS)
+    date_obs = [
+        None if value is None else time_utils.parse_fits_time(value)
+        for value in columns[0]
+    ]
+    date_obs = np.array(date_obs, dtype='datetime64[us]')
+    date_strs = np.datetime_as_string(date_obs)
+    geometry = np.array(columns[3:8], dtype=float).reshape(5, len(records))
+    ra, dec, x_size, y_size, pos_angle = geometry
+    vertices = math_utils.footprint_vertices(
+        np.column_stack((ra, dec)), x_size, y_size, pos_angle
+    )
+    footprints = footprint_wkt(vertices)
+    complete = np.all(np.isfinite(geometry), axis=0)
+    rows = []
+    for i, record in enumerate(records):
+        row = [record['path']]
+        row.append(None if np.isnat(date_obs[i]) else str(date_strs[i]))
+        row.extend(_value(value) for value in values[i][1:])
+        row.append(footprints[i] if complete[i] else None)
+        rows.append(tuple(row))
+    return rows
+
+
+def bbox_rows(rows):
+    """
+    `BBOX_COLUMNS` of `observation_rows`, around the circle through the
+    footprint vertices, None without a full geometry or time.
+    """
+    columns = list(zip(*rows)) or [()] * len(OBSERVATION_COLUMNS)
+    index = OBSERVATION_COLUMNS.index
+    ra, dec, x_size, y_size = (
+        np.array(columns[index(name)], dtype=float)
+        for name in ('ra_center', 'dec_center', 'x_deg_size', 'y_deg_size')
+    )
+    ra_min, ra_max, dec_min, dec_max = math_utils.circle_bbox(
+        ra, dec, 0.5 * np.hypot(x_size, y_size)
+    )
+    mjd = _mjd(columns[index('date_obs')])
+    return [
+        tuple(_value(value) for value in bbox)
+        for bbox in zip(
+            ra_min.tolist(),
+            ra_max.tolist(),
+            dec_min.tolist(),
+            dec_max.tolist(),
+            mjd.tolist(),
+            mjd.tolist(),
+        )
+    ]
+
+
+def _mjd(times):
+    times = np.array(times, dtype='datetime64[us]')
+    return np.atleast_1d(time_utils.datetime64_to_mjd(times))
+
+
+def _time_bound(value):
+    """ Query time bound `value` as an ISO string, like stored times. """
+    if value is None:
+        return None
+    return str(time_utils.parse_fits_time(value).astype('datetime64[us]'))
+
+
+def _within(rows, ra, dec, radius):
+    """ Result `rows` whose footprint comes within `radius` of a position. """
+    if not rows:
+        return []
+    index = RESULT_COLUMNS.index
+    columns = list(zip(*rows))
+    ra_center, dec_center, x_size, y_size, pos_angle = (
+        np.array(columns[index(name)], dtype=float)
+        for name in (
+            'ra_center',
+            'dec_center',
+            'x_deg_size',
+            'y_deg_size',
+            'pos_angle',
+        )
+    )
+    distance = math_utils.footprint_distance(
+        ra,
+        dec,
+        np.column_stack((ra_center, dec_center)),
+        x_size,
+        y_size,
+        pos_angle,
+    )
+    return [row for row, near in zip(rows, distance <= radius) if near]
+
+
+def _value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def footprint_wkt(vertices):
+    """ WKT polygons of (N, 4, 2) footprint `vertices`, in degrees. """
+    rings = np.asarray(vertices)[:, FOOTPRINT_RING]
+    return [
+        'POLYGON(({}))'.format(
+            ','.join(f'{x!r} {y!r}' for x, y in ring.tolist())
+        )
+        for ring in rings
+    ]
+
+
+class Database:
+    """ Connection to an observation database. """
+
+    SCHEMA = ()
+    # Columns set by upserts
+    COLUMNS = OBSERVATION_COLUMNS
+    # Only rows with changed values are updated
+    UPSERT_CHANGED = (
+        ' ON CONFLICT (path) DO UPDATE SET {assignments}'
+        ' WHERE ({columns}) {distinct} ({excluded})'
+    )
+    DISTINCT = 'IS DISTINCT FROM'
+
+    def __init__(self, name):
+        self.name = name
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def create_schema(self):
+        cursor = self.conn.cursor()
+        for statement in self.SCHEMA:
+            cursor.execute(statement)
+        self.conn.commit()
+
+    def insert_paths(self, paths):
+        """
+        Insert observations of `paths` not stored yet, without committing.
+        Returns the number of new rows.
+        """
+        raise NotImplementedError
+
+    def upsert_observations(self, rows):
+        """
+        Insert or update `observation_rows`, without committing. Returns
+        the number of new or changed rows.
+        """
+        raise NotImplementedError
+
+    def query_time(self, start, end):
+        """
+        Yield observations taken from `start` to `end`, FITS time strings,
+        as `RESULT_COLUMNS` tuples ordered by time.
+        """
+        raise NotImplementedError
+
+    def query_covers(self, ra, dec, start=None, end=None):
+        """
+        Yield observations whose footprint covers position `ra`, `dec` in
+        degrees, optionally taken from `start` to `end`.
+        """
+        return self.query_cone(ra, dec, 0, start, end)
+
+    def query_cone(self, ra, dec, radius, start=None, end=None):
+        """
+        Yield observations whose footprint comes within `radius` degrees
+        of `ra`, `dec`, optionally taken from `start` to `end`.
+        """
+        ra = ra % 360
+        start, end = _time_bound(start), _time_bound(end)
+        for rows in self._cone_candidates(ra, dec, radius, start, end):
+            yield from _within(rows, ra, dec, radius)
+
+    def _cone_candidates(self, ra, dec, radius, start, end):
+        """ Lists of result rows with footprints possibly in the cone. """
+        raise NotImplementedError
+
+    @classmethod
+    def upsert_clause(cls):
+        # The footprint follows from the values, and has no equality
+        return cls.UPSERT_CHANGED.format(
+            assignments=', '.join(
+                f'{name} = EXCLUDED.{name}' for name in cls.COLUMNS[1:]
+            ),
+            columns=', '.join(
+                f'observations.{name}' for name in VALUE_COLUMNS
+            ),
+            distinct=cls.DISTINCT,
+            excluded=', '.join(f'EXCLUDED.{name}' for name in VALUE_COLUMNS),
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SQLiteDatabase(Database):
+    """
+    SQLite database, footprints are stored as WKT text.
+
+    Footprint bounding boxes and times are kept in an R*Tree by triggers.
+    The database is in WAL mode, so queries are not blocked by a running
+    ingest, and only synced at checkpoints. Query statements are built
+    from constant text, so the connection prepares each of them once and
+    reuses it from its statement cache.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS observations ('
+        'id INTEGER PRIMARY KEY, '
+        'path TEXT NOT NULL UNIQUE, '
+        'date_obs TEXT, '
+        'exposure REAL, '
+        'focus INTEGER, '
+        'ra_center REAL, '
+        'dec_center REAL, '
+        'x_deg_size REAL, '
+        'y_deg_size REAL, '
+        'pos_angle REAL, '
+        'mag_lim REAL, '
+        'footprint TEXT, '
+        'ra_min REAL, '
+        'ra_max REAL, '
+        'dec_min REAL, '
+        'dec_max REAL, '
+        'mjd_min REAL, '
+        'mjd_max REAL)',
+        'CREATE INDEX IF NOT EXISTS observations_date_obs_idx '
+        'ON observations (date_obs)',
+        'CREATE VIRTUAL TABLE IF NOT EXISTS observations_rtree USING rtree('
+        'id, ra_min, ra_max, dec_min, dec_max, mjd_min, mjd_max)',
+        # Observations without a time are found at any time
+        'CREATE TRIGGER IF NOT EXISTS observations_rtree_insert '
+        'AFTER INSERT ON observations WHEN NEW.ra_min IS NOT NULL BEGIN '
+        'INSERT INTO observations_rtree VALUES (NEW.id, '
+        'NEW.ra_min, NEW.ra_max, NEW.dec_min, NEW.dec_max, '
+        'COALESCE(NEW.mjd_min, -1e9), COALESCE(NEW.mjd_max, 1e9)); END',
+        'CREATE TRIGGER IF NOT EXISTS observations_rtree_update '
+        'AFTER UPDATE ON observations BEGIN '
+        'DELETE FROM observations_rtree WHERE id = OLD.id; '
+        'INSERT INTO observations_rtree SELECT NEW.id, '
+        'NEW.ra_min, NEW.ra_max, NEW.dec_min, NEW.dec_max, '
+        'COALESCE(NEW.mjd_min, -1e9), COALESCE(NEW.mjd_max, 1e9) '
+        'WHERE NEW.ra_min IS NOT NULL; END',
+        'CREATE TRIGGER IF NOT EXISTS observations_rtree_delete '
+        'AFTER DELETE ON observations BEGIN '
+        'DELETE FROM observations_rtree WHERE id = OLD.id; END',
+    )
+    COLUMNS = OBSERVATION_COLUMNS + BBOX_COLUMNS
+    DISTINCT = 'IS NOT'
+    # Older versions have no ON CONFLICT clause
+    HAS_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+    PRAGMAS = (
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        # In KiB, the default of 2 MiB makes large batches thrash
+        'PRAGMA cache_size = -262144',
+    )
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.conn = sqlite3.connect(name)
+        for pragma in self.PRAGMAS:
+            self.conn.execute(pragma)
+        log.debug('opened SQLite database %s', name)
+
+    def insert_paths(self, paths):
+        cursor = self.conn.executemany(
+            'INSERT OR IGNORE INTO observations (path) VALUES (?)',
+            ((path,) for path in paths),
+        )
+        return cursor.rowcount
+
+    def upsert_observations(self, rows):
+        rows = _unique_paths(rows)
+        rows = [row + bbox for row, bbox in zip(rows, bbox_rows(rows))]
+        if not self.HAS_UPSERT:
+            return self._insert_update(rows)
+        # Row counts leave out changes by the R*Tree triggers
+        cursor = self.conn.executemany(
+            'INSERT INTO observations ({}) VALUES ({}){}'.format(
+                ', '.join(self.COLUMNS),
+                ', '.join('?' * len(self.COLUMNS)),
+                self.upsert_clause(),
+            ),
+            rows,
+        )
+        return cursor.rowcount
+
+    def _insert_update(self, rows):
+        """
+        Upsert `rows` of `COLUMNS` with an insert of new paths and an
+        update of changed values, as one statement needs SQLite 3.24.
+        """
+        inserted = self.conn.executemany(
+            'INSERT OR IGNORE INTO observations ({}) VALUES ({})'.format(
+                ', '.join(self.COLUMNS), ', '.join('?' * len(self.COLUMNS))
+            ),
+            rows,
+        ).rowcount
+        n_values = len(VALUE_COLUMNS)
+        updated = self.conn.executemany(
+            'UPDATE observations SET {} '
+            'WHERE path = ? AND ({}) IS NOT ({})'.format(
+                ', '.join(f'{name} = ?' for name in self.COLUMNS[1:]),
+                ', '.join(VALUE_COLUMNS),
+                ', '.join('?' * n_values),
+            ),
+            (row[1:] + row[:1] + row[1:1 + n_values] for row in rows),
+        ).rowcount
+        return inserted + updated
+
+    def query_time(self, start, end):
+        cursor = self.conn.execute(
+            'SELECT {} FROM observations '
+            'WHERE date_obs >= ? AND date_obs <= ? '
+            'ORDER BY date_obs'.format(', '.join(RESULT_COLUMNS)),
+            (_time_bound(start), _time_bound(end)),
+        )
+        yield from cursor
+
+    def _cone_candidates(self, ra, dec, radius, start, end):
+        ra_min, ra_max, dec_min, dec_max = math_utils.circle_bbox(
+            ra, dec, radius
+        )
+        sql = (
+            'SELECT o.id, {} FROM observations_rtree AS r '
+            'JOIN observations AS o ON o.id = r.id '
+            'WHERE r.ra_max >= ? AND r.ra_min <= ? '
+            'AND r.dec_max >= ? AND r.dec_min <= ?'
+        ).format(', '.join(f'o.{name}' for name in RESULT_COLUMNS))
+        time_params = ()
+        if start is not None:
+            sql += ' AND r.mjd_max >= ? AND o.date_obs >= ?'
+            time_params += (_mjd([start])[0], start)
+        if end is not None:
+            sql += ' AND r.mjd_min <= ? AND o.date_obs <= ?'
+            time_params += (_mjd([end])[0], end)
+
+        # Footprints around RA 0 may be stored 360 degrees away, also when
+        # the cone reaches a pole and spans all RA around `ra`
+        found = set()
+        for shift in (0, 360, -360):
+            cursor = self.conn.execute(
+                sql,
+                (
+                    float(ra_min) + shift,
+                    float(ra_max) + shift,
+                    float(dec_min),
+                    float(dec_max),
+                )
+                + time_params,
+            )
+            for rows in _fetch(cursor):
+                yield [row[1:] for row in rows if row[0] not in found]
+                found.update(row[0] for row in rows)
+
+
+class PostgresDatabase(Database):
+    """
+    PostgreSQL database, `name` is a URL or libpq connection string.
+
+    Footprints are PostGIS polygons, in degrees of RA and Dec, under a
+    GiST index. Times are under a BRIN index, which stays small and is
+    effective as long as observations are loaded roughly in time order.
+
+    Batches are loaded with `COPY` into a temporary table and moved to
+    `observations` from there. Queries run in named, server-side cursors,
+    which send rows `FETCH_ROWS` at a time as they are read.
+    """
+
+    SCHEMA = (
+        'CREATE EXTENSION IF NOT EXISTS postgis',
+        'CREATE TABLE IF NOT EXISTS observations ('
+        'id BIGSERIAL PRIMARY KEY, '
+        'path TEXT NOT NULL UNIQUE, '
+        'date_obs TIMESTAMP, '
+        'exposure DOUBLE PRECISION, '
+        'focus DOUBLE PRECISION, '
+        'ra_center DOUBLE PRECISION, '
+        'dec_center DOUBLE PRECISION, '
+        'x_deg_size DOUBLE PRECISION, '
+        'y_deg_size DOUBLE PRECISION, '
+        'pos_angle DOUBLE PRECISION, '
+        'mag_lim DOUBLE PRECISION, '
+        'footprint geometry(Polygon))',
+        # Tables created with an integer focus, which truncated it
+        'DO $$ BEGIN '
+        'IF (SELECT data_type FROM information_schema.columns '
+        "WHERE table_schema = current_schema() "
+        "AND table_name = 'observations' AND column_name = 'focus') "
+        "= 'bigint' THEN "
+        'ALTER TABLE observations ALTER COLUMN focus TYPE DOUBLE PRECISION; '
+        'END IF; END $$',
+        'CREATE INDEX IF NOT EXISTS observations_footprint_idx '
+        'ON observations USING GIST (footprint)',
+        'CREATE INDEX IF NOT EXISTS observations_date_obs_idx '
+        'ON observations USING BRIN (date_obs)',
+    )
+    BATCH_SCHEMA = (
+        'CREATE TEMPORARY TABLE IF NOT EXISTS observations_batch '
+        '(path TEXT NOT NULL) ON COMMIT DELETE ROWS'
+    )
+    STAGING_SCHEMA = (
+        'CREATE TEMPORARY TABLE IF NOT EXISTS observations_staging '
+        'ON COMMIT DELETE ROWS AS SELECT {} FROM observations WITH NO DATA'
+    ).format(', '.join(OBSERVATION_COLUMNS))
+
+    def __init__(self, name):
+        import psycopg2
+
+        super().__init__(name)
+        self.conn = psycopg2.connect(name)
+        self.queries = 0
+        log.debug('opened PostgreSQL database')
+
+    def insert_paths(self, paths):
+        cursor = self.conn.cursor()
+        cursor.execute(self.BATCH_SCHEMA)
+        cursor.copy_expert(
+            'COPY observations_batch (path) FROM STDIN',
+            io.StringIO(copy_text((path,) for path in paths)),
+        )
+        cursor.execute(
+            'INSERT INTO observations (path) '
+            'SELECT path FROM observations_batch '
+            'ON CONFLICT (path) DO NOTHING'
+        )
+        return cursor.rowcount
+
+    def upsert_observations(self, rows):
+        cursor = self.conn.cursor()
+        cursor.execute(self.STAGING_SCHEMA)
+        # Footprints are parsed from WKT by COPY
+        columns = ', '.join(OBSERVATION_COLUMNS)
+        cursor.copy_expert(
+            f'COPY observations_staging ({columns}) FROM STDIN',
+            io.StringIO(copy_text(_unique_paths(rows))),
+        )
+        cursor.execute(
+            f'INSERT INTO observations ({columns}) '
+            f'SELECT {columns} FROM observations_staging'
+            + self.upsert_clause()
+        )
+        return cursor.rowcount
+
+    def query_time(self, start, end):
+        cursor = self._query_cursor()
+        cursor.execute(
+            'SELECT {} FROM observations '
+            'WHERE date_obs >= %s AND date_obs <= %s '
+            'ORDER BY date_obs'.format(', '.join(RESULT_COLUMNS)),
+            (_time_bound(start), _time_bound(end)),
+        )
+        for rows in self._fetch_closing(cursor):
+            yield from rows
+
+    def _cone_candidates(self, ra, dec, radius, start, end):
+        ra_min, ra_max, dec_min, dec_max = math_utils.circle_bbox(
+            ra, dec, radius
+        )
+        if dec_min <= -90 or dec_max >= 90:
+            # Cones reaching a pole span all RA, any footprint in the Dec
+            # band may be within them
+            where = 'footprint && ST_MakeEnvelope(%s, %s, %s, %s)'
+            params = (
+                POLAR_RA_BAND[0],
+                float(dec_min) - PREFILTER_SLACK,
+                POLAR_RA_BAND[1],
+                float(dec_max) + PREFILTER_SLACK,
+            )
+        else:
+            # Positions 360 degrees away are for footprints around RA 0,
+            # and the distance in RA grows towards the poles, as far as
+            # the RA range of the cone
+            points = 'MULTIPOINT({})'.format(
+                ','.join(
+                    f'{ra + shift!r} {dec!r}' for shift in (0, 360, -360)
+                )
+            )
+            half_width = 0.5 * float(ra_max - ra_min)
+            distance = max(half_width, radius) + PREFILTER_SLACK
+            where = 'ST_DWithin(footprint, ST_GeomFromText(%s), %s)'
+            params = (points, distance)
+        sql = 'SELECT {} FROM observations WHERE {}'.format(
+            ', '.join(RESULT_COLUMNS), where
+        )
+        if start is not None:
+            sql += ' AND date_obs >= %s'
+            params += (start,)
+        if end is not None:
+            sql += ' AND date_obs <= %s'
+            params += (end,)
+        cursor = self._query_cursor()
+        cursor.execute(sql, params)
+        yield from self._fetch_closing(cursor)
+
+    def _query_cursor(self):
+        """ New named cursor, its rows stay on the server until fetched. """
+        self.queries += 1
+        cursor = self.conn.cursor(name=f'void_query_{self.queries}')
+        cursor.itersize = FETCH_ROWS
+        return cursor
+
+    @staticmethod
+    def _fetch_closing(cursor):
+        # Abandoned queries release their server-side cursors as well
+        try:
+            yield from _fetch(cursor)
+        finally:
+            cursor.close()
+
+
+def _fetch(cursor):
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            return
+        yield rows
+
+
+def _unique_paths(rows):
+    """ `rows` with the last of each path, an upsert touches rows once. """
+    return list({row[0]: row for row in rows}.values())
+
+
+def copy_text(rows):
+    """ `rows` in the text format of PostgreSQL `COPY`. """
+    return ''.join(
+        '\t'.join(_copy_value(value) for value in row) + '\n' for row in rows
+    )
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
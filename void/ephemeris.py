@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+Reading ephemerides in the format of the MPC ephemeris service.
+
+Each object starts with a header line, e.g.
+
+    * A1083fA  3 mea. 18.8  18 x 15 sec
+
+with its designation, optionally the number of measurements, magnitude,
+the planned exposures and a note, followed by fixed width rows:
+
+    2018 08 18 2200   22 01 02.6 -11 10 04 177.1  18.8   13.30  078.0 ...
+
+of date, UT, R.A. and Decl. (J2000), elongation, V, motion in "/min and
+its P.A. Other lines are ignored.
+
+Files are streamed, rows of many objects are collected into batches of
+about `BATCH_LINES` and converted column-wise at once.
+"""
+
+import collections
+import logging
+import re
+
+import numpy as np
+
+from void import time_utils
+
+log = logging.getLogger(__name__)
+
+BATCH_LINES = 65536
+
+# A superset of `crossmatch.EPHEMERIS_DTYPE`
+ROW_DTYPE = np.dtype(
+    [
+        ('mjd', 'f8'),
+        ('ra', 'f8'),
+        ('dec', 'f8'),
+        ('elongation', 'f8'),
+        ('mag', 'f8'),
+        ('motion', 'f8'),
+        ('pa', 'f8'),
+    ]
+)
+
+HEADER_RE = re.compile(
+    r'\*\s*(?P<designation>\S+)'
+    r'(?:\s+(?P<observations>\d+)\s+mea\.?)?'
+    r'(?:\s+(?P<mag>\d+\.\d*))?'
+    r'(?:\s+(?P<exposures>\d+)\s*x\s*(?P<exposure_time>\d+(?:\.\d*)?)\s*sec)?'
+    r'\s*(?P<note>.*?)\s*'
+)
+
+# Columns of the fixed width fields, the values after Decl. may be
+# shifted by a character, their columns span the gaps between them
+ROW_WIDTH = 66
+DATE_COLUMNS = {'year': (0, 4), 'month': (5, 7), 'day': (8, 10)}
+UT_COLUMNS = {'hour': (11, 13), 'minute': (13, 15)}
+RA_COLUMNS = ((18, 20), (21, 23), (24, 28))
+DEC_SIGN_COLUMN = 29
+DEC_COLUMNS = ((30, 32), (33, 35), (36, 38))
+FLOAT_COLUMNS = {
+    'elongation': (38, 45),
+    'mag': (45, 52),
+    'motion': (52, 59),
+    'pa': (59, 66),
+}
+
+# `exposures` of `exposure_time` seconds are planned, None if unknown
+EphemerisObject = collections.namedtuple(
+    'EphemerisObject',
+    [
+        'designation',
+        'observations',
+        'mag',
+        'exposures',
+        'exposure_time',
+        'note',
+        'rows',
+    ],
+)
+
+
+def read_ephemeris_file(fname, batch_lines=BATCH_LINES):
+    """ Yield the `EphemerisObject`s of file `fname`. """
+    with open(fname, 'rb') as ephemeris_file:
+        yield from read_ephemerides(ephemeris_file, batch_lines)
+
+
+def read_ephemerides(lines, batch_lines=BATCH_LINES):
+    """
+    Yield an `EphemerisObject` for each object in `lines`, in order.
+
+    `lines` are bytes or str. Only the current batch is held in memory.
+    """
+    headers, counts, rows = [], [], []
+    for line in lines:
+        if isinstance(line, str):
+            line = line.encode('ascii', 'replace')
+        line = line.rstrip()
+        if line[:1].isdigit():
+            if not headers:
+                log.warning('ephemeris row without an object: %r', line)
+                continue
+            rows.append(line)
+            counts[-1] += 1
+        elif line.startswith(b'*'):
+            if len(rows) >= batch_lines:
+                yield from _objects(headers, counts, rows)
+                headers, counts, rows = [], [], []
+            headers.append(parse_header(line.decode('ascii', 'replace')))
+            counts.append(0)
+    yield from _objects(headers, counts, rows)
+
+
+def parse_header(line):
+    """ Fields of an object header `line`, as a dict. """
+    match = HEADER_RE.fullmatch(line.rstrip())
+    if match is None:
+        raise ValueError(f'invalid ephemeris header: {line!r}')
+    fields = match.groupdict()
+    for name in ('observations', 'exposures'):
+        if fields[name] is not None:
+            fields[name] = int(fields[name])
+    for name in ('mag', 'exposure_time'):
+        if fields[name] is not None:
+            fields[name] = float(fields[name])
+    return fields
+
+
+def _objects(headers, counts, rows):
+    rows = parse_rows(rows)
+    stop = 0
+    for header, count in zip(headers, counts):
+        start, stop = stop, stop + count
+        yield EphemerisObject(rows=rows[start:stop], **header)
+
+
+def parse_rows(lines):
+    """ Convert ephemeris row `lines`, as bytes, to `ROW_DTYPE`. """
+    rows = np.empty(len(lines), dtype=ROW_DTYPE)
+    if not lines:
+        return rows
+    width = max(ROW_WIDTH, max(len(line) for line in lines))
+    chars = (
+        np.array(lines, dtype=f'S{width}')
+        .view(np.uint8)
+        .reshape(len(lines), width)
+        .copy()
+    )
+    # Short lines are padded with zeros
+    chars[chars == 0] = ord(' ')
+
+    # As ISO strings, e.g. 2018-08-18T20:00, parsed by numpy
+    iso = np.empty((len(lines), 16), np.uint8)
+    iso[:, [4, 7]] = ord('-')
+    iso[:, 10] = ord('T')
+    iso[:, 13] = ord(':')
+    for iso_start, name in ((0, 'year'), (5, 'month'), (8, 'day')):
+        start, stop = DATE_COLUMNS[name]
+        iso[:, iso_start:iso_start + stop - start] = chars[:, start:stop]
+    for iso_start, name in ((11, 'hour'), (14, 'minute')):
+        start, stop = UT_COLUMNS[name]
+        iso[:, iso_start:iso_start + stop - start] = chars[:, start:stop]
+    times = iso.view('S16').ravel().astype('datetime64[m]')
+    rows['mjd'] = time_utils.datetime64_to_mjd(times)
+
+    rows['ra'] = 15 * _sexagesimal(chars, RA_COLUMNS)
+    sign = np.where(chars[:, DEC_SIGN_COLUMN] == ord('-'), -1.0, 1.0)
+    rows['dec'] = sign * _sexagesimal(chars, DEC_COLUMNS)
+    for name, (start, stop) in FLOAT_COLUMNS.items():
+        rows[name] = _floats(chars, start, stop)
+    return rows
+
+
+def _sexagesimal(chars, columns):
+    (d_start, d_stop), (m_start, m_stop), (s_start, s_stop) = columns
+    return (
+        _floats(chars, d_start, d_stop)
+        + _floats(chars, m_start, m_stop) / 60
+        + _floats(chars, s_start, s_stop) / 3600
+    )
+
+
+def _floats(chars, start, stop):
+    """ Floats in columns `start:stop` of `chars`, NaN where blank. """
+    columns = np.ascontiguousarray(chars[:, start:stop])
+    blank = np.all(columns == ord(' '), axis=1)
+    columns[blank, -1] = ord('0')
+    values = columns.view(f'S{stop - start}').ravel()
+    try:
+        floats = values.astype(float)
+    except ValueError:
+        floats = np.array([_float(value) for value in values])
+    floats[blank] = np.nan
+    return floats
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        log.warning('invalid ephemeris value %r', value.decode())
+        return np.nan
+
+
+def by_designation(objects):
+    """
+    Rows of `objects` by designation, as taken by `crossmatch.crossmatch`.
+    """
+    rows = collections.defaultdict(list)
+    for ephemeris_object in objects:
+        rows[ephemeris_object.designation].append(ephemeris_object.rows)
+    return {
+        designation: np.concatenate(object_rows)
+        for designation, object_rows in rows.items()
+    }
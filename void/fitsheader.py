@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""
+Reading FITS primary headers without touching the image data.
+
+Gzip compressed files are decompressed only up to the end of the header.
+Of tile compressed files, the header of the compressed image extension is
+read and presented as the image header it stands for.
+"""
+
+import gzip
+import logging
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional
+
+from void import archive, common
+
+fits = common.lazy_import('astropy.io.fits')
+
+log = logging.getLogger(__name__)
+
+COPY_BUFSIZE = 1024 * 1024
+GZIP_EXTENSIONS = ('.fits.gz', '.fit.gz')
+TILE_EXTENSIONS = ('.fits.fz', '.fit.fz')
+EXTENSIONS = ('.fits', '.fit') + GZIP_EXTENSIONS + TILE_EXTENSIONS
+COMMENTARY_KEYWORDS = ('COMMENT', 'HISTORY', '')
+
+# Keywords describing the layout of an HDU rather than the image
+IMAGE_STRUCTURE_RE = re.compile(
+    r'SIMPLE|XTENSION|BITPIX|NAXIS\d*|EXTEND|PCOUNT|GCOUNT'
+)
+TABLE_STRUCTURE_RE = re.compile(
+    r'XTENSION|BITPIX|NAXIS\d*|PCOUNT|GCOUNT|TFIELDS|THEAP'
+    r'|T(TYPE|FORM|UNIT|SCAL|ZERO|NULL|DIM|DISP)\d+'
+    r'|ZIMAGE|ZCMPTYPE|ZBITPIX|ZNAXIS\d*|ZTILE\d+|ZNAME\d+|ZVAL\d+'
+    r'|ZMASKCMP|ZSIMPLE|ZTENSION|ZEXTEND|ZBLOCKED|ZPCOUNT|ZGCOUNT'
+    r'|ZHECKSUM|ZDATASUM|ZQUANTIZ|ZDITHER0|CHECKSUM|DATASUM'
+)
+
+
+class HeaderRecord:
+    """
+    Primary header of a FITS file, parsed from a single read.
+
+    `size` is the length in bytes of the padded header block on disk,
+    which starts at `offset`, so the image data starts at their sum. Both
+    `header` and `size` are None for records of files that were not
+    opened. `data` holds whatever a consumer extracted from the header.
+
+    For tile compressed files, `header` is the image header and
+    `stored_header` the header of the compressed image extension.
+    """
+
+    def __init__(
+        self,
+        fname: str,
+        header: Optional['fits.Header'],
+        size: Optional[int],
+        offset: int = 0,
+        stored_header: Optional['fits.Header'] = None,
+    ):
+        self.fname = fname
+        self.header = header
+        self.size = size
+        self.offset = offset
+        self.stored_header = stored_header
+        self.data = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.fname!r})'
+
+
+def is_writable(fname):
+    """ Check if headers of `fname` can be written by `write_header`. """
+    return not (archive.is_member(fname) or fname.endswith(GZIP_EXTENSIONS))
+
+
+def read_header(fname):
+    """
+    Open `fname` once and parse its primary header.
+
+    `fname` may also name a member of an archive, see `void.archive`.
+    """
+    log.debug('reading header %s', fname)
+    common.STATS.count('files_opened')
+    with common.STATS.timer('read_header'):
+        record = _open_header(fname)
+    common.STATS.count('bytes_read', record.offset + record.size)
+    return record
+
+
+def _open_header(fname):
+    if archive.is_member(fname):
+        opened = archive.open_member(fname)
+    else:
+        opened = open(fname, 'rb')
+    with opened as fits_file:
+        if fname.endswith(GZIP_EXTENSIONS):
+            with gzip.GzipFile(fileobj=fits_file) as gzip_file:
+                return _read_header(fname, gzip_file)
+        return _read_header(fname, fits_file)
+
+
+def _read_header(fname, fits_file):
+    start = fits_file.tell()
+    header = fits.Header.fromfile(fits_file)
+    size = fits_file.tell() - start
+    if not fname.endswith(TILE_EXTENSIONS):
+        return HeaderRecord(fname, header, size)
+    # The primary HDU has no data, the image is in the first extension
+    if header.get('NAXIS', 0):
+        raise ValueError(f'not a tile compressed image: {fname}')
+    offset = size
+    stored_header = fits.Header.fromfile(fits_file)
+    size = fits_file.tell() - start - offset
+    if not stored_header.get('ZIMAGE', False):
+        raise ValueError(f'not a tile compressed image: {fname}')
+    return HeaderRecord(
+        fname, image_header(stored_header), size, offset, stored_header
+    )
+
+
+def image_header(stored_header):
+    """ Header of the image compressed into `stored_header`'s table. """
+    header = fits.Header()
+    header['SIMPLE'] = stored_header.get('ZSIMPLE', True)
+    header['BITPIX'] = stored_header['ZBITPIX']
+    header['NAXIS'] = stored_header['ZNAXIS']
+    for axis in range(1, header['NAXIS'] + 1):
+        header[f'NAXIS{axis}'] = stored_header[f'ZNAXIS{axis}']
+    for card in stored_header.cards:
+        if TABLE_STRUCTURE_RE.fullmatch(card.keyword):
+            continue
+        if card.keyword == 'EXTNAME' and card.value == 'COMPRESSED_IMAGE':
+            continue
+        header.append(card)
+    return header
+
+
+def _stored_header(record):
+    """ Header to write, with changed image cards copied to the table. """
+    if record.stored_header is None:
+        return record.header
+    stored_header = record.stored_header
+    for card in record.header.cards:
+        keyword = card.keyword
+        if keyword in COMMENTARY_KEYWORDS:
+            continue
+        if IMAGE_STRUCTURE_RE.fullmatch(keyword):
+            continue
+        if keyword not in stored_header:
+            stored_header.append(card)
+        elif stored_header[keyword] != card.value:
+            stored_header[keyword] = card.value
+    return stored_header
+
+
+def write_header(record, inplace=True):
+    """
+    Write `record.header` back to `record.fname`, leaving image data alone.
+
+    With `inplace`, the header is written over the existing header block
+    when it still fits into its padding. Otherwise the file is rewritten
+    atomically. Returns True if the header was updated in place.
+    Archive members and gzip compressed files are read-only.
+    """
+    if not is_writable(record.fname):
+        raise ValueError(f'read-only FITS file: {record.fname}')
+    header_bytes = _stored_header(record).tostring().encode('ascii')
+    if inplace and len(header_bytes) == record.size:
+        log.debug('writing header in place %s', record.fname)
+        with common.STATS.timer('write_header'):
+            with open(record.fname, 'r+b') as fits_file:
+                fits_file.seek(record.offset)
+                fits_file.write(header_bytes)
+        common.STATS.count('bytes_written', len(header_bytes))
+        return True
+    log.debug('rewriting %s', record.fname)
+    with common.STATS.timer('rewrite_header'):
+        written = _rewrite_header(record, header_bytes)
+    common.STATS.count('bytes_written', written)
+    record.size = len(header_bytes)
+    return False
+
+
+def _rewrite_header(record, header_bytes):
+    """
+    Replace the header of `record.fname` through a temporary file.
+
+    Image data is streamed from the old file, never loaded whole, and the
+    temporary file is renamed over the original only once complete.
+    Returns the number of bytes written.
+    """
+    fname = record.fname
+    dirname = os.path.dirname(os.path.abspath(fname))
+    fd, tmp_fname = tempfile.mkstemp(prefix='.void-', dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file, open(fname, 'rb') as src_file:
+            tmp_file.write(src_file.read(record.offset))
+            tmp_file.write(header_bytes)
+            src_file.seek(record.offset + record.size)
+            shutil.copyfileobj(src_file, tmp_file, COPY_BUFSIZE)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+            written = tmp_file.tell()
+        shutil.copymode(fname, tmp_fname)
+        os.replace(tmp_fname, fname)
+    except BaseException:
+        os.unlink(tmp_fname)
+        raise
+    return written
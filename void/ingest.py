@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+void_ingest 0.2
+
+Stores observations in the observations table of DATABASE. Reads
+`void_reducer --with-path` JSON lines from stdin and inserts them, or
+updates observations of the same path where values changed. Given a
+SRC_DIR, stores only the absolute paths of FITS files found under it.
+Rows are loaded in batches, each committed on its own, so an interrupted
+run can simply be started again.
+
+DATABASE is a postgresql:// URL, a libpq connection string, e.g.
+"dbname=void user=void", or the path of a SQLite file.
+
+Usage:
+  void_ingest DATABASE [--batch-size=N] [--verbosity=V]
+  void_ingest DATABASE --src=SRC_DIR [--batch-size=N] [--verbosity=V]
+  void_ingest -v | --version
+  void_ingest -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -v --version        Show program name and version number
+  -s --src=SRC_DIR    Directory searched for FITS files and archives
+  -b --batch-size=N   Rows per transaction [default: 10000]
+  -V --verbosity=V    Logging verbosity, 0 to 4 [default: 2]
+"""
+
+import itertools
+import json
+import logging
+import os
+import sys
+
+import docopt
+
+from void import common, db, sniffer
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 10000
+
+
+def find_paths(src_dir):
+    """ Absolute paths of FITS files under `src_dir`, in sorted order. """
+    walker = sniffer.Sniffer(search_dir=src_dir, ordered=True)
+    for fname in walker.walk():
+        yield os.path.abspath(fname)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest_paths(database, paths, batch_size=BATCH_SIZE):
+    """
+    Insert `paths` into `database`, committing every `batch_size` paths.
+    Returns the number of new rows.
+    """
+    inserted = 0
+    for batch in batches(paths, batch_size):
+        count = database.insert_paths(batch)
+        database.commit()
+        inserted += count
+        log.info('%d of %d paths new', count, len(batch))
+    return inserted
+
+
+def read_records(lines):
+    """ Reducer records with a path from JSON `lines`. """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            log.warning(f'invalid record: {e}')
+            continue
+        if not isinstance(record, dict) or 'path' not in record:
+            log.warning('record without a path, see void_reducer --with-path')
+            continue
+        yield record
+
+
+def ingest_records(database, records, batch_size=BATCH_SIZE):
+    """
+    Upsert reducer `records` into `database`, committing every
+    `batch_size` records. Returns the number of new or changed rows.
+    """
+    changed = 0
+    for batch in batches(records, batch_size):
+        count = database.upsert_observations(db.observation_rows(batch))
+        database.commit()
+        changed += count
+        log.info('%d of %d records new or changed', count, len(batch))
+    return changed
+
+
+def ingest_stream(name, lines, batch_size=BATCH_SIZE):
+    """ Store reducer JSON `lines` in database `name`. """
+    with db.connect(name) as database:
+        database.create_schema()
+        return ingest_records(database, read_records(lines), batch_size)
+
+
+def ingest_dir(name, src_dir, batch_size=BATCH_SIZE):
+    """ Store FITS files under `src_dir` in database `name`. """
+    with db.connect(name) as database:
+        database.create_schema()
+        return ingest_paths(database, find_paths(src_dir), batch_size)
+
+
+def main():
+    name_and_version = __doc__.strip().splitlines()[0]
+    arguments = docopt.docopt(__doc__, help=True, version=name_and_version)
+    common.configure_log(arguments['--verbosity'])
+    batch_size = int(arguments['--batch-size'])
+    if batch_size < 1:
+        raise docopt.DocoptExit('--batch-size must be positive')
+    name = arguments['DATABASE']
+    try:
+        if arguments['--src']:
+            inserted = ingest_dir(name, arguments['--src'], batch_size)
+            log.info('%d new observations', inserted)
+        else:
+            changed = ingest_stream(name, sys.stdin, batch_size)
+            log.info('%d new or changed observations', changed)
+    except KeyboardInterrupt:
+        log.debug('SIGINT')
+
+
+if __name__ == '__main__':
+    main()
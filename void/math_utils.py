@@ -10,6 +10,13 @@ def sort_ndarray(arr):
     return sorted(arr, key=sum)
 
 
+def concat_ranges(counts):
+    """ Concatenated `numpy.arange(count)` for each of `counts`. """
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    return np.arange(counts.sum()) - np.repeat(starts, counts)
+
+
 def calculate_poly(image_center, image_x, image_y, pos_angle):
     """ Calculate coordinates of the image vertices. """
 
@@ -40,3 +47,160 @@ def calculate_poly(image_center, image_x, image_y, pos_angle):
     poly_arr = sort_ndarray(poly_arr)
 
     return poly_arr
+
+
+def calculate_polys(image_centers, images_x, images_y, pos_angles):
+    """
+    Calculate coordinates of the vertices of many images at once.
+
+    Takes N-length arrays, or (N, 2) for `image_centers`, and returns an
+    (N, 4, 2) array, with vertices ordered as by `calculate_poly`.
+    """
+    image_centers = np.asarray(image_centers, dtype=float).reshape(-1, 2)
+    images_x = np.asarray(images_x, dtype=float)
+    images_y = np.asarray(images_y, dtype=float)
+    pos_angles = np.deg2rad(360 - np.asarray(pos_angles, dtype=float))
+
+    images_diag = np.sqrt(images_x ** 2 + images_y ** 2)
+    phi = np.arctan2(images_y, images_x)
+
+    # Vertices of `calculate_poly` are pairwise opposite around the
+    # center, only the angles pos_angle + phi and pos_angle - phi are needed
+    angles = np.column_stack((pos_angles + phi, pos_angles - phi))
+    half_diagonals = 0.5 * images_diag[:, np.newaxis]
+    offsets = np.empty(angles.shape + (2,))
+    offsets[:, :, 0] = np.cos(angles) * half_diagonals
+    offsets[:, :, 1] = np.sin(angles) * half_diagonals
+    polys = np.concatenate((-offsets, offsets), axis=1)
+    polys += image_centers[:, np.newaxis, :]
+
+    # Stable, like `sorted` in `sort_ndarray`, so ties keep their order
+    order = np.argsort(polys.sum(axis=2), axis=1, kind='stable')
+    return np.take_along_axis(polys, order[:, :, np.newaxis], axis=1)
+
+
+def angular_separation(ra1, dec1, ra2, dec2):
+    """ Great circle distance between sky positions, all in degrees. """
+    ra1, dec1, ra2, dec2 = map(np.deg2rad, (ra1, dec1, ra2, dec2))
+    sin_ddec = np.sin(0.5 * (dec2 - dec1))
+    sin_dra = np.sin(0.5 * (ra2 - ra1))
+    hav = sin_ddec ** 2 + np.cos(dec1) * np.cos(dec2) * sin_dra ** 2
+    return np.rad2deg(2 * np.arcsin(np.sqrt(np.clip(hav, 0, 1))))
+
+
+def gnomonic(ra0, dec0, ra, dec):
+    """
+    Project sky positions onto the plane tangent at (`ra0`, `dec0`).
+
+    Returns standard coordinates (xi, eta) in degrees, xi growing with RA.
+    Positions more than 90 degrees away have no projection and are NaN.
+    """
+    ra0, dec0, ra, dec = map(np.deg2rad, (ra0, dec0, ra, dec))
+    cos_dra = np.cos(ra - ra0)
+    cos_c = np.sin(dec0) * np.sin(dec) + np.cos(dec0) * np.cos(dec) * cos_dra
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_c = np.where(cos_c > 0, cos_c, np.nan)
+        xi = np.cos(dec) * np.sin(ra - ra0) / cos_c
+        eta = (
+            np.cos(dec0) * np.sin(dec) - np.sin(dec0) * np.cos(dec) * cos_dra
+        ) / cos_c
+    return np.rad2deg(xi), np.rad2deg(eta)
+
+
+def gnomonic_inverse(ra0, dec0, xi, eta):
+    """
+    Sky positions of standard coordinates (xi, eta) in degrees, in the
+    plane tangent at (`ra0`, `dec0`). Inverse of `gnomonic`, RA is not
+    wrapped into 0 to 360 but stays continuous around `ra0`.
+    """
+    dec0, xi, eta = map(np.deg2rad, (dec0, xi, eta))
+    rho = np.sqrt(1 + xi ** 2 + eta ** 2)
+    dec = np.arcsin((np.sin(dec0) + eta * np.cos(dec0)) / rho)
+    d_ra = np.arctan2(xi, np.cos(dec0) - eta * np.sin(dec0))
+    return ra0 + np.rad2deg(d_ra), np.rad2deg(dec)
+
+
+def footprint_coords(xi, eta, pos_angle):
+    """
+    Rotate tangent plane coordinates into the axes of an image.
+
+    The first axis runs along the image x size and the second along its
+    y size, oriented as the vertices of `calculate_poly`.
+    """
+    pos_angle = np.deg2rad(360 - pos_angle)
+    cos_pa, sin_pa = np.cos(pos_angle), np.sin(pos_angle)
+    return xi * cos_pa + eta * sin_pa, eta * cos_pa - xi * sin_pa
+
+
+def in_footprint(ra, dec, image_center, image_x, image_y, pos_angle):
+    """
+    Check if sky positions fall within image footprints.
+
+    The footprint is the `image_x` by `image_y` degrees rectangle rotated
+    by `pos_angle` in the tangent plane at `image_center`, so positions
+    across RA 0/360 or near the poles are handled like any other.
+    """
+    image_center = np.asarray(image_center, dtype=float)
+    xi, eta = gnomonic(image_center[..., 0], image_center[..., 1], ra, dec)
+    u, v = footprint_coords(xi, eta, pos_angle)
+    return (np.abs(u) <= 0.5 * image_x) & (np.abs(v) <= 0.5 * image_y)
+
+
+def footprint_distance(ra, dec, image_center, image_x, image_y, pos_angle):
+    """
+    Distance in degrees of sky positions from image footprints, as in
+    `in_footprint`, measured in the tangent plane. 0 within a footprint,
+    NaN more than 90 degrees away.
+    """
+    image_center = np.asarray(image_center, dtype=float)
+    xi, eta = gnomonic(image_center[..., 0], image_center[..., 1], ra, dec)
+    u, v = footprint_coords(xi, eta, pos_angle)
+    du = np.maximum(np.abs(u) - 0.5 * image_x, 0)
+    dv = np.maximum(np.abs(v) - 0.5 * image_y, 0)
+    return np.hypot(du, dv)
+
+
+def footprint_vertices(image_centers, images_x, images_y, pos_angles):
+    """
+    Sky positions of the vertices of image footprints, (N, 4, 2), ordered
+    as by `calculate_polys`.
+
+    The vertices of `calculate_polys` around (0, 0) are taken as tangent
+    plane offsets from each center, RA stays continuous around it.
+    """
+    image_centers = np.asarray(image_centers, dtype=float).reshape(-1, 2)
+    images_x, images_y, pos_angles = (
+        np.broadcast_to(np.asarray(value, dtype=float), len(image_centers))
+        for value in (images_x, images_y, pos_angles)
+    )
+    offsets = calculate_polys(
+        np.zeros_like(image_centers), images_x, images_y, pos_angles
+    )
+    ra, dec = gnomonic_inverse(
+        image_centers[:, np.newaxis, 0],
+        image_centers[:, np.newaxis, 1],
+        offsets[..., 0],
+        offsets[..., 1],
+    )
+    return np.stack((ra, dec), axis=-1)
+
+
+def circle_bbox(ra, dec, radius):
+    """
+    RA and Dec ranges containing circles of `radius` degrees.
+
+    RA ranges are around `ra` and may extend below 0 or above 360, for
+    circles reaching a pole they span 360 degrees.
+    """
+    ra, dec, radius = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (ra, dec, radius))
+    )
+    dec_min = np.maximum(dec - radius, -90)
+    dec_max = np.minimum(dec + radius, 90)
+    polar = (dec_min <= -90) | (dec_max >= 90)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.sin(np.deg2rad(radius)) / np.cos(np.deg2rad(dec))
+    half_width = np.where(
+        polar | (ratio >= 1), 180, np.rad2deg(np.arcsin(np.minimum(ratio, 1)))
+    )
+    return ra - half_width, ra + half_width, dec_min, dec_max
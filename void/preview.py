@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+"""
+void_preview 0.1
+
+Writes quick-look previews of FITS files named on stdin, like
+void_reducer, and outputs their paths. A preview of a frame is written
+under OUT_DIR at the frame's absolute path, with a .png or .npy suffix,
+unless one newer than the frame is there already.
+
+Image data is memory mapped, never read whole, and reduced to at most
+SIZE pixels on a side, by averaging blocks or by taking every n-th
+pixel. PNG previews are 8 bit grayscale, north up, stretched between
+percentiles of a subsample. NPY previews hold the reduced physical
+values as float32, in FITS row order. Only uncompressed files can be
+mapped, others are skipped.
+
+Usage:
+  void_preview OUT_DIR [--size=SIZE] [--format=FORMAT] [--method=METHOD] \
+[--percentiles=LOW,HIGH] [--jobs=N] [--force] [--stats] [--verbosity=V]
+  void_preview -v | --version
+  void_preview -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -v --version        Show program name and version number
+  -s --size=SIZE      Largest side of previews in pixels [default: 256]
+  -f --format=FORMAT  "png" or "npy" [default: png]
+  -m --method=METHOD  "mean" of blocks or "stride" [default: mean]
+  -p --percentiles=LOW,HIGH
+                      Percentiles stretched to black and white
+                      [default: 0.5,99.5]
+  -j --jobs=N         Number of processes writing previews [default: 1]
+  -F --force          Write previews even if up to date
+  -S --stats          Write counters and stage latencies as JSON to stderr
+                      at exit, of the main process only
+  -V --verbosity=V    Logging verbosity, 0 to 4 [default: 2]
+"""
+
+import functools
+import logging
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from concurrent import futures
+
+import docopt
+
+from void import archive, common, fitsheader, reducer
+
+np = common.lazy_import('numpy')
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('png', 'npy')
+METHODS = ('mean', 'stride')
+BITPIX_DTYPES = {
+    8: 'u1',
+    16: '>i2',
+    32: '>i4',
+    64: '>i8',
+    -32: '>f4',
+    -64: '>f8',
+}
+# Bytes of image data averaged at once, bounds memory of large frames
+CHUNK_BYTES = 16 * 2**20
+# Values the stretch percentiles are computed from
+SAMPLE_SIZE = 65536
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COMPRESSION = 6
+# Files in flight per process with --jobs
+WINDOW_PER_JOB = 4
+
+
+def map_image(fname):
+    """
+    Memory mapped image of FITS file `fname`, with its BSCALE and BZERO.
+    Of cubes, the first plane. Raises ValueError for files that cannot
+    be mapped.
+    """
+    compressed = fitsheader.GZIP_EXTENSIONS + fitsheader.TILE_EXTENSIONS
+    if archive.is_member(fname) or fname.endswith(compressed):
+        raise ValueError(f'not an uncompressed FITS file: {fname}')
+    record = fitsheader.read_header(fname)
+    header = record.header
+    naxis = header.get('NAXIS', 0)
+    if naxis < 2:
+        raise ValueError(f'no image in primary HDU: {fname}')
+    try:
+        dtype = BITPIX_DTYPES[header['BITPIX']]
+    except KeyError:
+        raise ValueError(f'unknown BITPIX {header["BITPIX"]}: {fname}')
+    shape = tuple(header[f'NAXIS{axis}'] for axis in range(naxis, 0, -1))
+    data = np.memmap(
+        fname,
+        dtype=dtype,
+        mode='r',
+        offset=record.offset + record.size,
+        shape=shape,
+    )
+    while data.ndim > 2:
+        data = data[0]
+    return data, header.get('BSCALE', 1.0), header.get('BZERO', 0.0)
+
+
+def reduction_factor(shape, size):
+    """ Smallest factor reducing `shape` to at most `size` per side. """
+    return max(1, -(-max(shape) // size))
+
+
+def block_mean(data, factor, chunk_bytes=CHUNK_BYTES):
+    """
+    Means of `factor` x `factor` blocks of `data`, as float32, leaving
+    out rows and columns past the last whole block. Reads `data` a band
+    of rows at a time.
+    """
+    n_rows = data.shape[0] // factor
+    n_cols = data.shape[1] // factor
+    width = n_cols * factor
+    band_bytes = factor * width * data.dtype.itemsize
+    bands = max(1, chunk_bytes // max(1, band_bytes))
+    result = np.empty((n_rows, n_cols), dtype='f4')
+    for start in range(0, n_rows, bands):
+        stop = min(n_rows, start + bands)
+        chunk = np.asarray(
+            data[start * factor:stop * factor, :width], dtype='f4'
+        )
+        blocks = chunk.reshape(stop - start, factor, n_cols, factor)
+        result[start:stop] = blocks.mean(axis=(1, 3))
+    return result
+
+
+def reduce_image(data, size, method='mean'):
+    """ `data` reduced to at most `size` pixels per side, as float32. """
+    factor = reduction_factor(data.shape, size)
+    if method == 'stride' or factor == 1:
+        return np.asarray(data[::factor, ::factor], dtype='f4')
+    return block_mean(data, factor)
+
+
+def stretch(image, low=0.5, high=99.5, sample_size=SAMPLE_SIZE):
+    """
+    `image` scaled to uint8, between its `low` and `high` percentiles, as
+    estimated from an even subsample. NaN are black.
+    """
+    flat = image.ravel()
+    step = max(1, flat.size // sample_size)
+    sample = flat[::step]
+    sample = sample[np.isfinite(sample)]
+    if not sample.size:
+        return np.zeros(image.shape, dtype='u1')
+    vmin, vmax = np.percentile(sample, [low, high])
+    scale = 255 / (vmax - vmin) if vmax > vmin else 0.0
+    scaled = np.rint((image - vmin) * scale)
+    scaled[np.isnan(scaled)] = 0
+    return np.clip(scaled, 0, 255).astype('u1')
+
+
+def png_bytes(image):
+    """ 8 bit grayscale PNG of 2D uint8 `image`. """
+    height, width = image.shape
+    # Filter type 0 before each row
+    rows = np.zeros((height, width + 1), dtype='u1')
+    rows[:, 1:] = image
+    chunks = (
+        (b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)),
+        (b'IDAT', zlib.compress(rows.tobytes(), PNG_COMPRESSION)),
+        (b'IEND', b''),
+    )
+    return PNG_SIGNATURE + b''.join(
+        struct.pack('>I', len(data))
+        + kind
+        + data
+        + struct.pack('>I', zlib.crc32(kind + data))
+        for kind, data in chunks
+    )
+
+
+def preview_path(out_dir, fname, fmt):
+    path = os.path.abspath(fname).lstrip(os.sep)
+    return os.path.join(out_dir, f'{path}.{fmt}')
+
+
+def is_up_to_date(path, fname):
+    try:
+        return os.stat(path).st_mtime >= os.stat(fname).st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def write_atomic(path, write):
+    """ Write `path` through a temporary file, with `write(file)`. """
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_fname = tempfile.mkstemp(prefix='.void-', dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            write(tmp_file)
+        os.replace(tmp_fname, path)
+    except BaseException:
+        os.unlink(tmp_fname)
+        raise
+
+
+def make_preview(
+    fname,
+    out_dir,
+    size=256,
+    fmt='png',
+    method='mean',
+    percentiles=(0.5, 99.5),
+    force=False,
+):
+    """
+    Write the preview of `fname` under `out_dir`, unless up to date.
+    Returns the preview path.
+    """
+    path = preview_path(out_dir, fname, fmt)
+    if not force and is_up_to_date(path, fname):
+        log.debug('up to date: %s', path)
+        common.STATS.count('previews_up_to_date')
+        return path
+    data, bscale, bzero = map_image(fname)
+    with common.STATS.timer('reduce_image'):
+        image = reduce_image(data, size, method) * bscale + bzero
+    if fmt == 'npy':
+        write_atomic(path, lambda f: np.save(f, image))
+    else:
+        with common.STATS.timer('encode_png'):
+            png = png_bytes(np.flipud(stretch(image, *percentiles)))
+        write_atomic(path, lambda f: f.write(png))
+    common.STATS.count('previews_written')
+    log.debug('wrote %s', path)
+    return path
+
+
+def write_path(path):
+    sys.stdout.write(f'{path}\n')
+
+
+def preview_parallel(fnames, jobs, preview):
+    """ Write previews of `fnames` on a pool of `jobs` processes. """
+    with futures.ProcessPoolExecutor(jobs) as executor:
+        results = common.bounded_map(
+            executor, preview, fnames, jobs * WINDOW_PER_JOB
+        )
+        for fname, future in results:
+            reducer.write_result(fname, future.result, write_path)
+
+
+def parse_percentiles(value):
+    try:
+        low, high = (float(part) for part in value.split(','))
+    except ValueError:
+        raise docopt.DocoptExit('--percentiles must be LOW,HIGH')
+    if not 0 <= low < high <= 100:
+        raise docopt.DocoptExit('--percentiles must be 0 <= LOW < HIGH <= 100')
+    return low, high
+
+
+def main():
+    name_and_version = __doc__.strip().splitlines()[0]
+    arguments = docopt.docopt(__doc__, help=True, version=name_and_version)
+    common.configure_log(arguments['--verbosity'])
+    common.configure_stats(arguments['--stats'])
+    common.configure_profile()
+    fmt = arguments['--format']
+    if fmt not in FORMATS:
+        raise docopt.DocoptExit('--format not one of png, npy')
+    method = arguments['--method']
+    if method not in METHODS:
+        raise docopt.DocoptExit('--method not one of mean, stride')
+    size = int(arguments['--size'])
+    if size < 1:
+        raise docopt.DocoptExit('--size must be positive')
+    jobs = int(arguments['--jobs'])
+    preview = functools.partial(
+        make_preview,
+        out_dir=arguments['OUT_DIR'],
+        size=size,
+        fmt=fmt,
+        method=method,
+        percentiles=parse_percentiles(arguments['--percentiles']),
+        force=arguments['--force'],
+    )
+    log.debug('listening')
+
+    try:
+        fnames = reducer.read_fnames(sys.stdin)
+        if jobs > 1:
+            preview_parallel(fnames, jobs, preview)
+        else:
+            for fname in fnames:
+                reducer.write_result(
+                    fname, functools.partial(preview, fname), write_path
+                )
+        log.debug('EOF')
+    except KeyboardInterrupt:
+        log.debug('SIGINT')
+
+
+if __name__ == '__main__':
+    main()
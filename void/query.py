@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+void_query 0.1
+
+Finds observations stored by void_ingest, taken within a time range, or
+with a footprint covering a position or within RADIUS degrees of it.
+Rows are streamed from the database as JSON lines, or into a catalog
+file, see void.catalog, never collected in memory. Times are FITS time
+strings, positions in degrees.
+
+With --batch, queries are read from stdin, one per line, as the words
+following DATABASE, e.g. "cone 10.5 -20 0.5 2019-01-01 2019-02-01" with
+the optional time range last. All of them run on the same connection,
+JSON rows have the "query" line number, counted from 0.
+
+Usage:
+  void_query DATABASE time TMIN TMAX [options]
+  void_query DATABASE covers RA DEC [TMIN TMAX] [options]
+  void_query DATABASE cone RA DEC RADIUS [TMIN TMAX] [options]
+  void_query DATABASE --batch [options]
+  void_query -v | --version
+  void_query -h | --help
+
+Options:
+  -h --help           Show this help screen
+  -v --version        Show program name and version number
+  -b --batch          Read queries from stdin
+  -f --output-format=FORMAT
+                      "json" lines to stdout, or a binary "catalog" file
+                      [default: json]
+  -o --output=PATH    Catalog file to write, required by the catalog format,
+                      paths are written to PATH.paths
+  -a --append         Append to an existing catalog instead of replacing it
+  -V --verbosity=V    Logging verbosity, 0 to 4 [default: 2]
+"""
+
+import datetime
+import json
+import logging
+import os
+import shlex
+import sys
+
+import docopt
+import numpy as np
+
+from void import catalog, common, db, time_utils
+
+log = logging.getLogger(__name__)
+
+# Words of each query, after its name, the time range is optional for
+# positions
+QUERIES = {
+    'time': ('TMIN', 'TMAX'),
+    'covers': ('RA', 'DEC', 'TMIN', 'TMAX'),
+    'cone': ('RA', 'DEC', 'RADIUS', 'TMIN', 'TMAX'),
+}
+OPTIONAL_WORDS = {'covers': 2, 'cone': 2}
+
+
+def parse_query(words):
+    """
+    Name and arguments of query `words`, as on the command line.
+    Raises ValueError for anything else, or times not in FITS format.
+    """
+    if not words or words[0] not in QUERIES:
+        raise ValueError(f'unknown query: {" ".join(words)}')
+    name, values = words[0], list(words[1:])
+    n_words = len(QUERIES[name])
+    if not n_words - OPTIONAL_WORDS.get(name, 0) <= len(values) <= n_words:
+        raise ValueError(f'{name} takes {" ".join(QUERIES[name])}')
+    values += [None] * (n_words - len(values))
+    n_floats = n_words - 2
+    floats = tuple(float(value) for value in values[:n_floats])
+    times = tuple(values[n_floats:])
+    for value in times:
+        if value is not None:
+            time_utils.parse_fits_time(value)
+    return name, floats + times
+
+
+def run_query(database, name, args):
+    """ Yield result rows of query `name` on `database`. """
+    if name == 'time':
+        return database.query_time(*args)
+    if name == 'covers':
+        return database.query_covers(*args)
+    return database.query_cone(*args)
+
+
+def read_queries(lines):
+    """ Yield line numbers and parsed queries of `lines`. """
+    for number, line in enumerate(lines):
+        words = shlex.split(line)
+        if not words:
+            continue
+        try:
+            yield number, parse_query(words)
+        except ValueError as e:
+            log.warning(f'line {number}: {e}')
+
+
+def json_row(row, query=None):
+    data = {
+        name: _json_value(value)
+        for name, value in zip(db.RESULT_COLUMNS, row)
+    }
+    if query is not None:
+        data['query'] = query
+    return json.dumps(data)
+
+
+def _json_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(timespec='microseconds')
+    return value
+
+
+def catalog_row(row):
+    """
+    Catalog row of a result `row`, like `catalog.header_row`. Missing
+    values are NaT and NaN.
+    """
+    path, date_obs, *values = row
+    if date_obs is None:
+        date_obs = 'NaT'
+    return (
+        os.fsencode(path),
+        np.datetime64(date_obs, 'ns'),
+        *(np.nan if value is None else value for value in values),
+    )
+
+
+def write_json(line):
+    sys.stdout.write(f'{line}\n')
+
+
+def main():
+    name_and_version = __doc__.strip().splitlines()[0]
+    arguments = docopt.docopt(__doc__, help=True, version=name_and_version)
+    common.configure_log(arguments['--verbosity'])
+    output_format = arguments['--output-format']
+    if output_format not in ('json', 'catalog'):
+        raise docopt.DocoptExit('--output-format not one of json, catalog')
+    if output_format == 'catalog' and not arguments['--output']:
+        raise docopt.DocoptExit('--output required by catalog format')
+    if arguments['--batch']:
+        queries = read_queries(sys.stdin)
+    else:
+        name = next(word for word in QUERIES if arguments[word])
+        words = [name] + [
+            arguments[word]
+            for word in QUERIES[name]
+            if arguments[word] is not None
+        ]
+        try:
+            queries = [(None, parse_query(words))]
+        except ValueError as e:
+            raise docopt.DocoptExit(str(e))
+
+    writer = None
+    if output_format == 'catalog':
+        writer = catalog.CatalogWriter(
+            arguments['--output'], append=arguments['--append']
+        )
+    try:
+        with db.connect(arguments['DATABASE']) as database:
+            for number, (name, args) in queries:
+                log.debug('query %s %s', name, args)
+                for row in run_query(database, name, args):
+                    if writer is None:
+                        write_json(json_row(row, number))
+                    else:
+                        writer.write_row(catalog_row(row))
+        log.debug('done')
+    except KeyboardInterrupt:
+        log.debug('SIGINT')
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,107 +2,313 @@
 """
 void_reducer 0.1
 
-Prints header data from a FITS filenames from stdin.
+Prints header data from a FITS filenames from stdin. Gzip (.fits.gz) and
+tile compressed (.fits.fz) files are read up to the end of their header.
+Archive members are read as ARCHIVE::MEMBER, a .tar or .zip archive path
+reads all FITS files in the archive.
 
 Usage:
-  void_reducer [--verbosity=V]
+  void_reducer [--jobs=N] [--unordered] [--output-format=FORMAT] \
+[--output=PATH] [--append] [--with-path] [--stats] [--verbosity=V]
   void_reducer -v | --version
   void_reducer -h | --help
 
 Options:
   -h --help           Show this help screen
   -v --version        Show program name and version number
+  -j --jobs=N         Number of processes reading files [default: 1]
+  -u --unordered      With --jobs, output in completion order instead of
+                      input order
+  -f --output-format=FORMAT
+                      "json" lines to stdout, or a binary "catalog" file,
+                      see void.catalog [default: json]
+  -o --output=PATH    Catalog file to write, required by the catalog format,
+                      paths are written to PATH.paths
+  -a --append         Append to an existing catalog instead of replacing it
+  -p --with-path      Add the absolute "path" of each file to JSON output,
+                      as read by void_ingest
+  -S --stats          Write counters and stage latencies as JSON to stderr
+                      at exit, of the main process only
   -V --verbosity=V    Logging verbosity, 0 to 4 [default: 2]
 """
 
 import json
 import logging
+import os
 import sys
+from concurrent import futures
 
 import docopt
-import numpy as np
-from astropy.io import fits
 
-from void import common
+from void import archive, common, fitsheader
+
+catalog = common.lazy_import('void.catalog')
+np = common.lazy_import('numpy')
+time_utils = common.lazy_import('void.time_utils')
 
 log = logging.getLogger(__name__)
 
+# Files in flight per process with --jobs
+WINDOW_PER_JOB = 8
+
+HEADER_KEYS = (
+    'DATE-OBS',
+    'EXPTIME',
+    'FOCUSPOS',
+    'CRVAL1',
+    'CRVAL2',
+    'NAXIS1',
+    'NAXIS2',
+    'CDELT1',
+    'CDELT2',
+    'PA',
+    'ZMAG',
+)
+
+HEADER_FIELDS = [
+    ('date_obs', 'datetime64[ns]'),
+    ('exposure', 'f8'),
+    # Float, so that invalid rows can hold NaN
+    ('focus', 'f8'),
+    ('ra_center', 'f8'),
+    ('dec_center', 'f8'),
+    ('x_deg_size', 'f8'),
+    ('y_deg_size', 'f8'),
+    ('pos_angle', 'f8'),
+    ('mag_lim', 'f8'),
+    ('valid', '?'),
+]
+
+
+def __getattr__(name):
+    # HEADER_DTYPE is made on first use, numpy is not imported before
+    if name == 'HEADER_DTYPE':
+        return np.dtype(HEADER_FIELDS)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 def read_header_data(fits_fname):
     """
     Read header data from a certain FITS file as a JSON dictionary.
     """
     log.debug('reading %s', fits_fname)
+    record = fitsheader.read_header(fits_fname)
+    data = header_data(record.header)
+    log.debug('read %s', fits_fname)
+    return data
+
+
+def header_data(header_dict):
+    """
+    Extract header data from a FITS primary header as a JSON dictionary.
+    """
+    date_obs = header_dict['DATE-OBS']
+    exp = header_dict['EXPTIME']
+    focus = header_dict['FOCUSPOS']
+    ra_center = header_dict['CRVAL1']
+    dec_center = header_dict['CRVAL2']
+
+    x_pix_size = header_dict['NAXIS1']
+    y_pix_size = header_dict['NAXIS2']
 
-    with fits.open(fits_fname) as hdul:
-        header_dict = hdul[0].header
+    # Scaling factors in [deg/px]
+    x_scale = abs(header_dict['CDELT1'])
+    y_scale = abs(header_dict['CDELT2'])
 
-        date_obs = header_dict['DATE-OBS']
-        exp = header_dict['EXPTIME']
-        focus = header_dict['FOCUSPOS']
-        ra_center = header_dict['CRVAL1']
-        dec_center = header_dict['CRVAL2']
+    x_deg_size = float(x_pix_size * x_scale)
+    y_deg_size = float(y_pix_size * y_scale)
 
-        x_pix_size = header_dict['NAXIS1']
-        y_pix_size = header_dict['NAXIS2']
+    pos_angle = header_dict['PA']
 
-        # Scaling factors in [deg/px]
-        x_scale = abs(header_dict['CDELT1'])
-        y_scale = abs(header_dict['CDELT2'])
+    # Limiting magnitude
+    mag_norm = header_dict['ZMAG']
+    mag_lim = mag_norm + 2.5 * np.log(exp)
 
-        x_deg_size = float(x_pix_size * x_scale)
-        y_deg_size = float(y_pix_size * y_scale)
+    return {
+        'date_obs': date_obs,
+        'exposure': exp,
+        'focus': focus,
+        'ra_center': ra_center,
+        'dec_center': dec_center,
+        'x_deg_size': x_deg_size,
+        'y_deg_size': y_deg_size,
+        'pos_angle': pos_angle,
+        'mag_lim': mag_lim,
+    }
 
-        pos_angle = header_dict['PA']
 
-        # Limiting magnitude
-        mag_norm = header_dict['ZMAG']
-        mag_lim = mag_norm + 2.5 * np.log(exp)
+def read_header_data_many(fits_fnames):
+    """
+    Read header data from many FITS files as a structured array.
+
+    Rows follow the order of `fits_fnames`, with `HEADER_FIELDS`.
+    Values are parsed row by row, DATE-OBS by `time_utils.parse_fits_time`
+    and the others as floats, and derived values are computed for the
+    whole batch at once. Rows of files that could not be read or parsed
+    have `valid` set to False and NaN or NaT in the other fields.
+    """
+    raw_rows = []
+    valid = []
+    for fits_fname in fits_fnames:
+        try:
+            header_dict = fitsheader.read_header(fits_fname).header
+            row = tuple(header_dict[key] for key in HEADER_KEYS)
+            date_obs = time_utils.parse_fits_time(row[0])
+            values = tuple(float(value) for value in row[1:])
+            raw_rows.append((date_obs,) + values)
+            valid.append(True)
+        except Exception as e:
+            log.warning(f'{fits_fname}: {e}')
+            common.STATS.error(e)
+            raw_rows.append(None)
+            valid.append(False)
+    valid = np.array(valid, dtype=bool)
+    dtype = np.dtype(HEADER_FIELDS)
+    data = np.zeros(len(raw_rows), dtype=dtype)
+    data['valid'] = valid
+    for name in dtype.names:
+        if dtype[name].kind == 'f':
+            data[name] = np.nan
+    data['date_obs'] = np.datetime64('NaT')
+    if not valid.any():
+        return data
 
-        log.debug('read %s', fits_fname)
+    rows = [row for row in raw_rows if row is not None]
+    date_obs = [row[0] for row in rows]
+    columns = np.array([row[1:] for row in rows], dtype='f8').T
+    exp, focus, ra_center, dec_center = columns[:4]
+    x_pix_size, y_pix_size, cdelt1, cdelt2, pos_angle, mag_norm = columns[4:]
 
-        return {
-            'date_obs': date_obs,
-            'exposure': exp,
-            'focus': focus,
-            'ra_center': ra_center,
-            'dec_center': dec_center,
-            'x_deg_size': x_deg_size,
-            'y_deg_size': y_deg_size,
-            'pos_angle': pos_angle,
-            'mag_lim': mag_lim,
-        }
+    data['date_obs'][valid] = date_obs
+    data['exposure'][valid] = exp
+    data['focus'][valid] = focus
+    data['ra_center'][valid] = ra_center
+    data['dec_center'][valid] = dec_center
+    data['x_deg_size'][valid] = x_pix_size * np.abs(cdelt1)
+    data['y_deg_size'][valid] = y_pix_size * np.abs(cdelt2)
+    data['pos_angle'][valid] = pos_angle
+    data['mag_lim'][valid] = mag_norm + 2.5 * np.log(exp)
+    return data
 
 
 def encode_header_data(data):
     log.debug(f'JSON data: {data}')
-    json_dict = json.dumps(data)
+    with common.STATS.timer('encode_json'):
+        json_dict = json.dumps(data)
     return json_dict
 
 
+def reduce_file(fname):
+    data = read_header_data(fname)
+    return encode_header_data(data)
+
+
+def reduce_file_with_path(fname):
+    data = read_header_data(fname)
+    data['path'] = os.path.abspath(fname)
+    return encode_header_data(data)
+
+
+def reduce_file_row(fname):
+    data = read_header_data(fname)
+    return catalog.header_row(fname, data)
+
+
+def write_json(json_dict):
+    sys.stdout.write(f'{json_dict}\n')
+
+
+def read_fnames(lines):
+    for line in lines:
+        fname = line.strip()
+        if not fname:
+            continue
+        if archive.is_archive(fname):
+            yield from read_archive_fnames(fname)
+            continue
+        log.info(f'processing {fname}')
+        yield fname
+
+
+def read_archive_fnames(archive_fname):
+    try:
+        fnames = list(archive.members(archive_fname, fitsheader.EXTENSIONS))
+    except FileNotFoundError:
+        log.warning(f'FileNotFoundError: "{archive_fname}"')
+        return
+    except Exception as e:
+        log.warning(f'{archive_fname}: {e}', exc_info=True)
+        common.STATS.error(e)
+        return
+    for fname in fnames:
+        log.info(f'processing {fname}')
+        yield fname
+
+
+def write_result(fname, get_result, write=write_json):
+    try:
+        write(get_result())
+    except FileNotFoundError as e:
+        log.warning(f'FileNotFoundError: "{fname}"')
+        common.STATS.error(e)
+    except Exception as e:
+        log.warning(f'{e}', exc_info=True)
+        common.STATS.error(e)
+
+
+def reduce_parallel(
+    fnames, jobs, ordered=True, reduce=reduce_file, write=write_json
+):
+    """
+    Reduce `fnames` on a pool of `jobs` processes, writing the results.
+
+    At most `WINDOW_PER_JOB` files per process are in flight, so memory
+    stays flat however long the input is.
+    """
+    with futures.ProcessPoolExecutor(jobs) as executor:
+        results = common.bounded_map(
+            executor, reduce, fnames, jobs * WINDOW_PER_JOB, ordered
+        )
+        for fname, future in results:
+            write_result(fname, future.result, write)
+
+
 def main():
     name_and_version = __doc__.strip().splitlines()[0]
     arguments = docopt.docopt(__doc__, help=True, version=name_and_version)
     common.configure_log(arguments['--verbosity'])
+    common.configure_stats(arguments['--stats'])
+    common.configure_profile()
+    jobs = int(arguments['--jobs'])
+    writer = None
+    reduce, write = reduce_file, write_json
+    if arguments['--output-format'] == 'catalog':
+        if not arguments['--output']:
+            raise docopt.DocoptExit('--output required by catalog format')
+        writer = catalog.CatalogWriter(
+            arguments['--output'], append=arguments['--append']
+        )
+        reduce, write = reduce_file_row, writer.write_row
+    elif arguments['--output-format'] not in ('json', None):
+        raise docopt.DocoptExit('--output-format not one of json, catalog')
+    elif arguments['--with-path']:
+        reduce = reduce_file_with_path
     log.debug('listening')
 
     try:
-        for line in sys.stdin:
-            fname = line.strip()
-            if not fname:
-                continue
-            log.info(f'processing {fname}')
-            try:
-                data = read_header_data(fname)
-                json_dict = encode_header_data(data)
-                sys.stdout.write(f'{json_dict}\n')
-            except FileNotFoundError:
-                log.warning(f'FileNotFoundError: "{fname}"')
-            except Exception as e:
-                log.warning(f'{e}', exc_info=True)
+        fnames = read_fnames(sys.stdin)
+        if jobs > 1:
+            ordered = not arguments['--unordered']
+            reduce_parallel(fnames, jobs, ordered, reduce, write)
+        else:
+            for fname in fnames:
+                write_result(fname, lambda: reduce(fname), write)
         log.debug('EOF')
     except KeyboardInterrupt:
         log.debug('SIGINT')
+    finally:
+        if writer is not None:
+            writer.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Persistent index of already scanned FITS files.
+"""
+
+import collections
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+IndexEntry = collections.namedtuple(
+    'IndexEntry', ['date_obs', 'flag_name', 'flagged']
+)
+
+
+class ScanIndex:
+    """
+    SQLite cache of stat data, DATE-OBS and flag state of FITS files.
+
+    An entry is only trusted while size, mtime, ctime and inode of the file
+    are unchanged. Files modified within `RACY_NS` of being indexed are
+    always re-read, as a later write in the same timestamp tick would not
+    change their mtime, unless the entry was stored `written`, right after
+    the modification was our own flag write.
+    """
+
+    RACY_NS: int = 2 * 10 ** 9
+    COMMIT_EVERY: int = 1000
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS files ('
+        'path TEXT PRIMARY KEY, '
+        'size INTEGER NOT NULL, '
+        'mtime_ns INTEGER NOT NULL, '
+        'ctime_ns INTEGER NOT NULL, '
+        'inode INTEGER NOT NULL, '
+        'indexed_ns INTEGER NOT NULL, '
+        'date_obs TEXT, '
+        'flag_name TEXT, '
+        'flagged INTEGER NOT NULL, '
+        'written INTEGER NOT NULL DEFAULT 0)'
+    )
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(self.SCHEMA)
+        columns = [
+            row[1] for row in self.conn.execute('PRAGMA table_info(files)')
+        ]
+        if 'written' not in columns:
+            # Indexes from before `written` was stored
+            self.conn.execute(
+                'ALTER TABLE files '
+                'ADD COLUMN written INTEGER NOT NULL DEFAULT 0'
+            )
+        self.conn.commit()
+        log.debug('opened index %s', db_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @staticmethod
+    def _key(fname):
+        return os.path.abspath(fname)
+
+    def lookup(self, fname, stat):
+        """
+        Return the `IndexEntry` of `fname`, or None if it is missing or
+        the file changed since it was indexed.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT size, mtime_ns, ctime_ns, inode, indexed_ns, '
+                'date_obs, flag_name, flagged, written '
+                'FROM files WHERE path = ?',
+                (self._key(fname),),
+            ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, ctime_ns, inode, indexed_ns = row[:5]
+        if (size, mtime_ns, ctime_ns, inode) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+            stat.st_ctime_ns,
+            stat.st_ino,
+        ):
+            log.debug('changed: %s', fname)
+            return None
+        date_obs, flag_name, flagged, written = row[5:]
+        racy = indexed_ns - max(mtime_ns, ctime_ns) < self.RACY_NS
+        if racy and not written:
+            log.debug('racy: %s', fname)
+            return None
+        return IndexEntry(date_obs, flag_name, bool(flagged))
+
+    def store(self, fname, stat, date_obs, flag_name, flagged, written=False):
+        """
+        Store the entry of `fname`, with `stat` taken after reading it, or
+        if `written`, right after writing it.
+        """
+        row = (
+            self._key(fname),
+            stat.st_size,
+            stat.st_mtime_ns,
+            stat.st_ctime_ns,
+            stat.st_ino,
+            time.time_ns(),
+            date_obs,
+            flag_name,
+            int(flagged),
+            int(written),
+        )
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO files '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                row,
+            )
+            self._pending += 1
+            if self._pending >= self.COMMIT_EVERY:
+                self._commit()
+
+    def _commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+        log.debug('closed index %s', self.db_path)
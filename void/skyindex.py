@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+"""
+In-memory index of image footprints on the sky.
+
+The sky is cut into declination bands `cell_deg` high, and each band into
+RA cells about `cell_deg` wide. Every frame is listed in all cells its
+bounding circle touches, cells that reach a pole span the whole band.
+Frames of a cell are stored contiguously and sorted by time, so a query
+only looks at the cells it touches and, with a time range, at a slice of
+each. Candidates are then tested exactly against their footprints, see
+`math_utils.in_footprint`.
+
+    >>> index = SkyIndex.build(catalog.read_catalog('void.cat'))
+    >>> rows = index.point(167.8, 63.3, tmin='2019-01-01')
+"""
+
+import logging
+
+import numpy as np
+
+from void import math_utils
+
+log = logging.getLogger(__name__)
+
+FIELDS = (
+    'ra_center',
+    'dec_center',
+    'x_deg_size',
+    'y_deg_size',
+    'pos_angle',
+    'date_obs',
+)
+
+
+class SkyGrid:
+    """ Cells of declination bands `cell_deg` high. """
+
+    def __init__(self, cell_deg=1.0):
+        self.cell_deg = float(cell_deg)
+        self.n_bands = int(np.ceil(180 / self.cell_deg))
+        band_centers = -90 + (np.arange(self.n_bands) + 0.5) * self.cell_deg
+        band_centers = np.clip(band_centers, -90, 90)
+        self.band_cells = np.maximum(
+            1, 360 * np.cos(np.deg2rad(band_centers)) / self.cell_deg
+        ).astype(np.int64)
+        self.band_starts = np.zeros(self.n_bands + 1, dtype=np.int64)
+        np.cumsum(self.band_cells, out=self.band_starts[1:])
+        self.n_cells = int(self.band_starts[-1])
+
+    def band(self, dec):
+        band = np.floor((dec + 90) / self.cell_deg).astype(np.int64)
+        return np.clip(band, 0, self.n_bands - 1)
+
+    def cell(self, ra, dec):
+        """ Cell numbers of positions. """
+        ra, dec = np.asarray(ra, dtype=float), np.asarray(dec, dtype=float)
+        band = self.band(dec)
+        n_ra = self.band_cells[band]
+        ra_cell = np.floor(ra / 360 * n_ra).astype(np.int64) % n_ra
+        return self.band_starts[band] + ra_cell
+
+    def cover(self, ra, dec, radius):
+        """
+        Cells touched by circles, as arrays of cells and circle numbers.
+        """
+        ra = np.asarray(ra, dtype=float).ravel()
+        dec = np.asarray(dec, dtype=float).ravel()
+        radius = np.asarray(radius, dtype=float).ravel()
+        band_lo = self.band(dec - radius)
+        band_hi = self.band(dec + radius)
+        polar = (np.abs(dec) + radius >= 90) | (radius >= 90)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            half_width = np.rad2deg(
+                np.arcsin(
+                    np.sin(np.deg2rad(np.minimum(radius, 90)))
+                    / np.cos(np.deg2rad(dec))
+                )
+            )
+        half_width[polar | ~np.isfinite(half_width)] = 180
+
+        # One entry per circle and band, then one per cell of the band
+        n_bands = band_hi - band_lo + 1
+        circles = np.repeat(np.arange(len(ra)), n_bands)
+        bands = band_lo[circles] + math_utils.concat_ranges(n_bands)
+        n_ra = self.band_cells[bands]
+        lo = np.floor((ra - half_width)[circles] / 360 * n_ra)
+        hi = np.floor((ra + half_width)[circles] / 360 * n_ra)
+        lo = lo.astype(np.int64)
+        n_cells = np.minimum(hi.astype(np.int64) - lo + 1, n_ra)
+        lo[n_cells == n_ra] = 0
+        cell_circles = np.repeat(circles, n_cells)
+        cell_bands = np.repeat(bands, n_cells)
+        ra_cells = np.repeat(lo, n_cells) + math_utils.concat_ranges(n_cells)
+        cells = self.band_starts[cell_bands] + (
+            ra_cells % self.band_cells[cell_bands]
+        )
+        return cells, cell_circles
+
+
+class SkyIndex:
+    """
+    Cell index over N frames, queries return sorted frame row numbers.
+
+    Build with `build`, which computes the cells, or `load` a saved
+    index. Frames without a valid position are kept, so row numbers match
+    the input, but are never returned.
+    """
+
+    def __init__(self, frames, cell_deg, cell_offsets, cell_frames):
+        self.cell_deg = float(cell_deg)
+        self.ra = np.ascontiguousarray(frames['ra_center'], dtype=float)
+        self.dec = np.ascontiguousarray(frames['dec_center'], dtype=float)
+        self.x_size = np.ascontiguousarray(frames['x_deg_size'], dtype=float)
+        self.y_size = np.ascontiguousarray(frames['y_deg_size'], dtype=float)
+        self.pos_angle = np.ascontiguousarray(
+            frames['pos_angle'], dtype=float
+        )
+        self.times = _times(frames['date_obs'])
+        self.radius = 0.5 * np.hypot(self.x_size, self.y_size)
+        self.cell_offsets = cell_offsets
+        self.cell_frames = cell_frames
+        self.cell_times = self.times[cell_frames]
+        self.grid = SkyGrid(cell_deg)
+
+    def __len__(self):
+        return len(self.ra)
+
+    @classmethod
+    def build(cls, frames, cell_deg=1.0):
+        """
+        Index structured array `frames`, with at least the fields of
+        `FIELDS`, e.g. a `void.catalog` or from
+        `reducer.read_header_data_many`.
+        """
+        grid = SkyGrid(cell_deg)
+        ra = np.asarray(frames['ra_center'], dtype=float)
+        dec = np.asarray(frames['dec_center'], dtype=float)
+        radius = 0.5 * np.hypot(frames['x_deg_size'], frames['y_deg_size'])
+        valid = np.isfinite(ra) & np.isfinite(dec) & np.isfinite(radius)
+        rows = np.flatnonzero(valid)
+        cells, cell_rows = grid.cover(ra[rows], dec[rows], radius[rows])
+        cell_rows = rows[cell_rows]
+        times = _times(frames['date_obs'])
+        order = np.lexsort((times[cell_rows], cells))
+        cells, cell_rows = cells[order], cell_rows[order]
+        counts = np.bincount(cells, minlength=grid.n_cells)
+        cell_offsets = np.zeros(grid.n_cells + 1, dtype=np.int64)
+        np.cumsum(counts, out=cell_offsets[1:])
+        log.debug(
+            'indexed %d frames in %d cells, %d entries',
+            len(frames),
+            np.count_nonzero(counts),
+            len(cells),
+        )
+        return cls(frames, cell_deg, cell_offsets, cell_rows)
+
+    def save(self, fname):
+        """ Save to `fname` as an uncompressed `.npz`. """
+        dtype = [(name, 'f8') for name in FIELDS[:-1]]
+        frames = np.empty(len(self), dtype=dtype + [('date_obs', 'M8[ns]')])
+        frames['ra_center'] = self.ra
+        frames['dec_center'] = self.dec
+        frames['x_deg_size'] = self.x_size
+        frames['y_deg_size'] = self.y_size
+        frames['pos_angle'] = self.pos_angle
+        frames['date_obs'] = self.times.view('M8[ns]')
+        np.savez(
+            fname,
+            cell_deg=self.cell_deg,
+            frames=frames,
+            cell_offsets=self.cell_offsets,
+            cell_frames=self.cell_frames,
+        )
+
+    @classmethod
+    def load(cls, fname):
+        with np.load(fname) as data:
+            return cls(
+                data['frames'],
+                data['cell_deg'],
+                data['cell_offsets'],
+                data['cell_frames'],
+            )
+
+    def _candidates(self, cells, tmin=None, tmax=None):
+        """ Frames listed in `cells`, within the time range. """
+        starts = self.cell_offsets[cells]
+        ends = self.cell_offsets[cells + 1]
+        if tmin is not None or tmax is not None:
+            starts, ends = starts.copy(), ends.copy()
+            for i, (start, end) in enumerate(zip(starts, ends)):
+                times = self.cell_times[start:end]
+                if tmin is not None:
+                    starts[i] = start + np.searchsorted(times, tmin, 'left')
+                if tmax is not None:
+                    ends[i] = start + np.searchsorted(times, tmax, 'right')
+        if len(cells) == 1:
+            start, end = starts[0], ends[0]
+            return self.cell_frames[start:end]
+        return np.unique(
+            np.concatenate(
+                [
+                    self.cell_frames[start:end]
+                    for start, end in zip(starts, ends)
+                ]
+            )
+        )
+
+    def point(self, ra, dec, tmin=None, tmax=None):
+        """ Frames covering position `ra`, `dec`, in degrees. """
+        cell = self.grid.cell(ra, dec).reshape(1)
+        rows = self._candidates(cell, _time(tmin), _time(tmax))
+        inside = math_utils.in_footprint(
+            ra,
+            dec,
+            np.column_stack((self.ra[rows], self.dec[rows])),
+            self.x_size[rows],
+            self.y_size[rows],
+            self.pos_angle[rows],
+        )
+        return np.sort(rows[inside])
+
+    def cone(self, ra, dec, radius, tmin=None, tmax=None):
+        """
+        Frames whose footprint comes within `radius` degrees of `ra`,
+        `dec`, measured in the tangent plane of each frame.
+        """
+        cells, _ = self.grid.cover(ra, dec, radius)
+        rows = self._candidates(np.unique(cells), _time(tmin), _time(tmax))
+        distance = math_utils.angular_separation(
+            ra, dec, self.ra[rows], self.dec[rows]
+        )
+        rows = rows[distance <= radius + self.radius[rows]]
+        distance = math_utils.footprint_distance(
+            ra,
+            dec,
+            np.column_stack((self.ra[rows], self.dec[rows])),
+            self.x_size[rows],
+            self.y_size[rows],
+            self.pos_angle[rows],
+        )
+        return np.sort(rows[distance <= radius])
+
+    def polygon(self, vertices, tmin=None, tmax=None):
+        """
+        Frames whose footprint overlaps a convex polygon on the sky.
+
+        `vertices` is a (K, 2) sequence of RA, Dec in degrees, in order
+        around the polygon. Overlap is tested in the tangent plane of each
+        frame, by the separating axis theorem.
+        """
+        vertices = np.asarray(vertices, dtype=float)
+        center, radius = _bounding_circle(vertices)
+        cells, _ = self.grid.cover(center[0], center[1], radius)
+        rows = self._candidates(np.unique(cells), _time(tmin), _time(tmax))
+        distance = math_utils.angular_separation(
+            center[0], center[1], self.ra[rows], self.dec[rows]
+        )
+        rows = rows[distance <= radius + self.radius[rows]]
+
+        xi, eta = math_utils.gnomonic(
+            self.ra[rows, np.newaxis],
+            self.dec[rows, np.newaxis],
+            vertices[:, 0],
+            vertices[:, 1],
+        )
+        u, v = math_utils.footprint_coords(
+            xi, eta, self.pos_angle[rows, np.newaxis]
+        )
+        half_x = 0.5 * self.x_size[rows, np.newaxis]
+        half_y = 0.5 * self.y_size[rows, np.newaxis]
+        # Axes of the footprint
+        overlap = (u.min(axis=1) <= half_x[:, 0]) & (
+            u.max(axis=1) >= -half_x[:, 0]
+        )
+        overlap &= (v.min(axis=1) <= half_y[:, 0]) & (
+            v.max(axis=1) >= -half_y[:, 0]
+        )
+        # Edge normals of the polygon, (M, K) each
+        normal_u = np.roll(v, -1, axis=1) - v
+        normal_v = u - np.roll(u, -1, axis=1)
+        projected = (
+            u[:, np.newaxis, :] * normal_u[:, :, np.newaxis]
+            + v[:, np.newaxis, :] * normal_v[:, :, np.newaxis]
+        )
+        reach = np.abs(normal_u) * half_x + np.abs(normal_v) * half_y
+        overlap &= np.all(
+            (projected.min(axis=2) <= reach)
+            & (projected.max(axis=2) >= -reach),
+            axis=1,
+        )
+        return np.sort(rows[overlap])
+
+
+def _times(date_obs):
+    date_obs = np.asarray(date_obs)
+    if date_obs.dtype.kind == 'M':
+        date_obs = date_obs.astype('datetime64[ns]')
+    return date_obs.astype(np.int64)
+
+
+def _time(value):
+    """ Query time bound as int64 nanoseconds, like the index times. """
+    if value is None:
+        return None
+    return np.datetime64(value, 'ns').astype(np.int64)
+
+
+def _bounding_circle(vertices):
+    """ Center and radius of a circle around polygon `vertices`. """
+    ra, dec = np.deg2rad(vertices[:, 0]), np.deg2rad(vertices[:, 1])
+    xyz = np.column_stack(
+        (np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec))
+    )
+    x, y, z = xyz.mean(axis=0)
+    center = (
+        np.rad2deg(np.arctan2(y, x)) % 360,
+        np.rad2deg(np.arctan2(z, np.hypot(x, y))),
+    )
+    radius = math_utils.angular_separation(
+        center[0], center[1], vertices[:, 0], vertices[:, 1]
+    ).max()
+    return center, radius
@@ -3,10 +3,19 @@
 void_sniffer 0.2
 
 Searches for FITS files without a custom header and outputs their paths.
+Gzip (.fits.gz) and tile compressed (.fits.fz) files are searched too, as
+are files in .tar and .zip archives, without extracting them, which are
+output as ARCHIVE::MEMBER. Archive members and gzip files are never
+flagged. With --index, they are stored there as done once output, so
+later runs skip them. Without an index, every run outputs them again and
+they do not count towards --maxn.
 
 Usage:
   void_sniffer SEARCH_DIR [--tmin=TIME_MIN] [--tmax=TIME_MAX] \
-[--maxn=N] [--flag=HEADER | --ignore-flag] [--dry-run] [--verbosity=V]
+[--maxn=N] [--flag=HEADER | --ignore-flag] [--dry-run] \
+[--flag-mode=MODE] [--jobs=N] [--ordered] [--index=PATH] \
+[--prune-dirs=FORMAT] [--watch [--poll=SECONDS] [--settle=SECONDS]] \
+[--emit-records] [--stats] [--verbosity=V]
   void_sniffer -v | --version
   void_sniffer -h | --help
 
@@ -17,28 +26,64 @@ Options:
   -f --flag=HEADER    Name of the header to look for, [default: VISNJAN]
   -n --ignore-flag    Skip header flag check
   -d --dry-run        Skip writing to FITS header.
+  -m --flag-mode=MODE How to write the flag, "inplace" updates the header
+                      block when it has room left, "rewrite" always
+                      rewrites the file [default: inplace]
+  -j --jobs=N         Number of files checked in parallel, flags are written
+                      as files are output [default: 1]
+  -o --ordered        Output files in the same order as a serial run, by
+                      name within a directory, files before subdirectories
+  -x --index=PATH     SQLite index of already checked files, only new or
+                      changed files are opened, created if missing
+  -p --prune-dirs=FORMAT
+                      Skip directories named by a date outside of the time
+                      thresholds, as parsed by strptime FORMAT, e.g. %Y-%m-%d
+  -w --watch          Keep running after the scan and output new files as
+                      they are written
+  -P --poll=SECONDS   Watch by polling directory mtimes, instead of using
+                      inotify when available
+  -s --settle=SECONDS Output watched files only once unchanged for this long
+                      [default: 2]
+  -e --emit-records   Output header data as JSON lines, like void_reducer,
+                      instead of paths
+  -S --stats          Write counters and stage latencies as JSON to stderr
+                      at exit
   -V --verbosity=V    Logging verbosity, 0 to 4 [default: 2]
   -h --help           Show this help screen
   -v --version        Show program name and version number
 """
 # TODO versioning individual scripts?
 
+import collections
+import datetime
 import logging
 import os
 import sys
-from typing import Optional
+import tarfile
+import threading
+import zipfile
+from concurrent import futures
+from typing import Callable, Optional
 
 import docopt
-from astropy.io import fits
-from astropy.time import Time
 
-from void import common
+from void import archive, common, fitsheader, scanindex, watch
+
+reducer = common.lazy_import('void.reducer')
+time_utils = common.lazy_import('void.time_utils')
 
 log = logging.getLogger(__name__)
 
 
 class Sniffer:
     DISABLED_FLAG: str = '0'
+    FLAG_MODES = ('inplace', 'rewrite')
+    WINDOW_PER_JOB: int = 4
+    EXTENSIONS = fitsheader.EXTENSIONS
+    # Night directories also hold frames taken after midnight
+    DATE_DIR_SLACK = datetime.timedelta(days=1)
+    # Paths remembered by watch that are not marked as done otherwise
+    WATCH_SEEN_MAX: int = 2**16
 
     def __init__(
         self,
@@ -48,9 +93,15 @@ class Sniffer:
         tmax: Optional[str] = None,
         flag_name: Optional[str] = None,
         update_flag: Optional[bool] = True,
+        flag_mode: str = 'inplace',
+        jobs: int = 1,
+        ordered: bool = False,
+        index_path: Optional[str] = None,
+        prune_dirs: Optional[str] = None,
+        extract: Optional[Callable] = None,
     ):
         self.search_dir = search_dir
-        self.maxn = maxn
+        self.maxn = None if maxn is None else int(maxn)
         self.tmin = tmin
         self.tmax = tmax
         if flag_name == self.DISABLED_FLAG:
@@ -58,76 +109,406 @@ class Sniffer:
         else:
             self.flag_name = flag_name
         self.update_flag = update_flag
+        if flag_mode not in self.FLAG_MODES:
+            raise ValueError(f'unknown flag mode: {flag_mode}')
+        self.flag_mode = flag_mode
+        self.jobs = int(jobs)
+        if self.jobs < 1:
+            raise ValueError(f'jobs must be positive: {jobs}')
+        self.ordered = ordered
+        self.prune_dirs = prune_dirs
+        self.extract = extract
         self.count = 0
+        self.opened = 0
+        self._opened_lock = threading.Lock()
         self.time_first = None
         self.time_last = None
+        self.index = None
 
+        if index_path:
+            self.index = scanindex.ScanIndex(index_path)
         if self.tmin:
             self.time_first = self.parse_time(self.tmin)
         if self.tmax:
             self.time_last = self.parse_time(self.tmax)
         log.debug('init done')
 
-    def check_flag(self, fits_fname):
-        log.debug('checking flag %s', fits_fname)
-        with fits.open(fits_fname) as hdul:
-            header_dict = hdul[0].header
-            if header_dict.get(self.flag_name, '').strip():
-                log.debug('true: %s', fits_fname)
-                return True
-        log.debug('false: %s', fits_fname)
+    def read_record(self, fits_fname):
+        with self._opened_lock:
+            self.opened += 1
+        return fitsheader.read_header(fits_fname)
+
+    def check_flag(self, record):
+        log.debug('checking flag %s', record.fname)
+        if record.header.get(self.flag_name, '').strip():
+            log.debug('true: %s', record.fname)
+            return True
+        log.debug('false: %s', record.fname)
         return False
 
+    def walk(self):
+        """
+        Yield paths of FITS files under `search_dir`, top-down.
+
+        Only names with a FITS extension are turned into paths, and date
+        directories outside of the time range are not entered at all.
+        FITS members of archives are yielded as archive member paths.
+        """
+        if archive.is_archive(self.search_dir):
+            yield from self.walk_archive(self.search_dir)
+            return
+        stack = [self.search_dir]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                with common.STATS.timer('scandir'):
+                    with os.scandir(dir_path) as dir_entries:
+                        entries = list(dir_entries)
+            except OSError as e:
+                log.debug('skipping %s: %s', dir_path, e)
+                common.STATS.error(e)
+                continue
+            if self.ordered:
+                entries.sort(key=lambda entry: entry.name)
+            rel_dir = os.path.relpath(dir_path)
+            prefix = '' if rel_dir == os.curdir else rel_dir + os.sep
+            subdirs = []
+            for entry in entries:
+                if entry.name.endswith(self.EXTENSIONS):
+                    if entry.is_file():
+                        common.STATS.count('files_seen')
+                        yield prefix + entry.name
+                elif archive.is_archive(entry.name):
+                    if entry.is_file():
+                        yield from self.walk_archive(prefix + entry.name)
+                elif entry.is_dir(follow_symlinks=False):
+                    if not self.prune_dir(entry.name):
+                        subdirs.append(entry.path)
+            stack.extend(reversed(subdirs))
+
+    def walk_archive(self, archive_fname):
+        try:
+            fnames = list(archive.members(archive_fname, self.EXTENSIONS))
+        except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+            log.warning(f'skipping archive {archive_fname}: {e}')
+            common.STATS.error(e)
+            return
+        if self.ordered:
+            fnames.sort()
+        common.STATS.count('files_seen', len(fnames))
+        yield from fnames
+
+    def prune_dir(self, name):
+        """
+        Check if directory `name` is a date outside of the time range.
+        """
+        if not self.prune_dirs:
+            return False
+        if self.time_first is None and self.time_last is None:
+            return False
+        try:
+            start, end = self.date_dir_range(name, self.prune_dirs)
+        except ValueError:
+            return False
+        if self.time_last is not None and start > self.time_last:
+            log.debug('pruning %s, after --tmax', name)
+            return True
+        if self.time_first is not None and end < self.time_first:
+            log.debug('pruning %s, before --tmin', name)
+            return True
+        return False
+
+    @classmethod
+    def date_dir_range(cls, name, date_format):
+        """
+        Time range that frames in a directory called `name` may have.
+
+        The range spans a day, a month or a year, depending on the finest
+        field in `date_format`, widened by `DATE_DIR_SLACK` on both ends.
+        """
+        start = datetime.datetime.strptime(name, date_format)
+        if '%d' in date_format or '%j' in date_format:
+            end = start + datetime.timedelta(days=1)
+        elif '%m' in date_format or '%b' in date_format:
+            end = (start + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            end = start.replace(year=start.year + 1)
+        start -= cls.DATE_DIR_SLACK
+        end += cls.DATE_DIR_SLACK
+        return (
+            cls.parse_time(start.strftime('%Y-%m-%dT%H:%M:%S')),
+            cls.parse_time(end.strftime('%Y-%m-%dT%H:%M:%S')),
+        )
+
     def find_fits(self):
-        for root, _, files in os.walk(self.search_dir):
-            for file in files:
-                abs_fname = os.path.relpath(
-                    os.path.normpath(os.path.join(root, file))
-                )
+        for record in self.find_records():
+            yield record.fname
+
+    def find_records(self):
+        """
+        Like `find_fits`, but yield the header records of the files.
+        """
+        try:
+            if self.jobs > 1:
+                yield from self._find_records_parallel()
+                return
+            for abs_fname in self.walk():
                 try:
-                    if self.validate_file(abs_fname):
-                        yield abs_fname
+                    record = self.accept_file(abs_fname)
                 except StopIteration:
                     return
+                if record is not None:
+                    yield record
+        finally:
+            if self.index is not None:
+                self.index.commit()
+
+    def watch(self, settle=2.0, poll=None):
+        """
+        Like `find_fits`, but keep watching `search_dir` afterwards and
+        yield new files once they are completely written.
+
+        Watching starts before the scan, so no file can slip in between.
+        Each path is yielded at most once. Files marked as done are
+        rejected by their flag or the index, only the last
+        `WATCH_SEEN_MAX` others are remembered.
+        """
+        for record in self.watch_records(settle=settle, poll=poll):
+            yield record.fname
+
+    def watch_records(self, settle=2.0, poll=None):
+        """
+        Like `watch`, but yield the header records of the files.
+        """
+        watcher = watch.watcher(
+            self.search_dir,
+            self.EXTENSIONS,
+            settle=settle,
+            poll=poll,
+            skip_dir=self.prune_dir,
+        )
+        seen = collections.OrderedDict()
+
+        def remember(record):
+            if self.is_marked(record):
+                return
+            seen[record.fname] = None
+            if len(seen) > self.WATCH_SEEN_MAX:
+                seen.popitem(last=False)
+
+        for record in self.find_records():
+            remember(record)
+            yield record
+        if self.maxn_reached():
+            return
+        for path in watcher:
+            fname = os.path.relpath(path)
+            if fname in seen:
+                continue
+            try:
+                record = self.accept_file(fname)
+            except StopIteration:
+                return
+            except Exception as e:
+                log.warning(f'{fname}: {e}', exc_info=True)
+                common.STATS.error(e)
+                continue
+            finally:
+                if self.index is not None:
+                    self.index.commit()
+            if record is None:
+                continue
+            remember(record)
+            yield record
+            if self.maxn_reached():
+                return
+
+    def _find_records_parallel(self):
+        """
+        Check and flag files on a thread pool.
+
+        Files are counted against `maxn` one at a time, as their checks
+        complete, and each is flagged right before it is yielded, so the
+        output stops exactly at `maxn` and an interrupted run leaves no
+        flagged file that was not output.
+        """
+        window = self.jobs * self.WINDOW_PER_JOB
+        update_flag = self.flag_name and self.update_flag
+        with futures.ThreadPoolExecutor(self.jobs) as executor:
+            checked = common.bounded_map(
+                executor, self.check_file, self.walk(), window, self.ordered
+            )
+            try:
+                for record in self._take(future for _, future in checked):
+                    if update_flag:
+                        self.flag_file(record)
+                    yield record
+            finally:
+                checked.close()
+
+    def _take(self, checked):
+        if self.maxn_reached():
+            return
+        for future in checked:
+            record = future.result()
+            if record is None:
+                continue
+            if self.counts_towards_maxn(record):
+                self.count += 1
+            yield record
+            if self.maxn_reached():
+                return
+
+    def maxn_reached(self):
+        return self.maxn is not None and self.count >= self.maxn
+
+    def counts_towards_maxn(self, record):
+        """
+        Check if `record` counts towards `maxn`. Files that are to be
+        flagged but cannot be, and are not stored in an index either, are
+        output again by every run and would block progress.
+        """
+        return (
+            not (self.flag_name and self.update_flag)
+            or self.is_marked(record)
+        )
+
+    def is_marked(self, record):
+        """
+        Check if output `record` is marked as done, by its flag or in the
+        index, so that checking it again rejects it.
+        """
+        return bool(self.flag_name and self.update_flag) and (
+            self.index is not None or fitsheader.is_writable(record.fname)
+        )
 
     @staticmethod
     def parse_time(time_str):
-        if 'T' not in time_str:
-            time_str += 'T00:00:00.00'
-        return Time(time_str, format='fits')
+        return time_utils.parse_fits_time(time_str)
 
-    def get_fits_time(self, fits_fname):
-        with fits.open(fits_fname) as hdul:
-            time_str = hdul[0].header['DATE-OBS']
-            return self.parse_time(time_str)
+    def get_fits_time(self, record):
+        time_str = record.header['DATE-OBS']
+        return self.parse_time(time_str)
 
-    def flag_file(self, fits_fname):
-        data, header = fits.getdata(fits_fname, header=True)
-        header[self.flag_name] = 'True'
-        fits.writeto(fits_fname, data, header, overwrite=True)
+    def flag_file(self, record):
+        if not fitsheader.is_writable(record.fname):
+            log.debug('not flagging read-only %s', record.fname)
+            if self.index is not None:
+                # Done, so that later runs skip it
+                self.store_index(record, archive.stat(record.fname), True)
+            return
+        record.header[self.flag_name] = 'True'
+        common.STATS.count('files_flagged')
+        inplace = self.flag_mode == 'inplace'
+        if not fitsheader.write_header(record, inplace=inplace):
+            log.debug('no room in header, rewrote %s', record.fname)
+        if self.index is not None:
+            # Our own write, the entry is trusted even though it is racy
+            self.store_index(
+                record, archive.stat(record.fname), True, written=True
+            )
 
-    def validate_file(self, fname):
-        if not fname.endswith('.fits') and not fname.endswith('.fit'):
-            return False
-        if self.flag_name and self.check_flag(fname):
-            return False
-        if not self.filter_fits(fname):
-            return False
-        if self.maxn is not None and self.count >= self.maxn:
+    def store_index(self, record, stat, flagged, written=False):
+        date_obs = record.header.get('DATE-OBS')
+        self.index.store(
+            record.fname, stat, date_obs, self.flag_name, flagged, written
+        )
+
+    def check_file(self, fname):
+        """
+        Return the header record of `fname` if it should be output.
+        """
+        if not fname.endswith(self.EXTENSIONS):
+            return None
+        if self.index is not None:
+            return self.check_indexed_file(fname)
+        record = self.read_record(fname)
+        if self.flag_name and self.check_flag(record):
+            return None
+        if not self.filter_fits(record):
+            return None
+        return self.extract_data(record)
+
+    def extract_data(self, record):
+        """
+        Set `record.data` from `extract`, if given.
+
+        Files the data cannot be extracted from are logged and skipped,
+        so they are neither flagged nor output.
+        """
+        if self.extract is None:
+            return record
+        if record.header is None:
+            record = self.read_record(record.fname)
+        try:
+            record.data = self.extract(record.header)
+        except Exception as e:
+            log.warning(f'{record.fname}: {e}', exc_info=True)
+            common.STATS.error(e)
+            return None
+        return record
+
+    def check_indexed_file(self, fname):
+        """
+        Like `check_file`, but answered from the index when `fname` did
+        not change since it was last checked.
+
+        The returned record has no header if the file was not opened.
+        """
+        stat = archive.stat(fname)
+        entry = self.index.lookup(fname, stat)
+        if (
+            entry is not None
+            and entry.date_obs is not None
+            and (not self.flag_name or entry.flag_name == self.flag_name)
+        ):
+            log.debug('indexed: %s', fname)
+            if self.flag_name and entry.flagged:
+                return None
+            if not self.filter_time(self.parse_time(entry.date_obs)):
+                return None
+            if self.flag_name and self.update_flag:
+                record = self.read_record(fname)
+            else:
+                record = fitsheader.HeaderRecord(fname, None, None)
+            return self.extract_data(record)
+        record = self.read_record(fname)
+        flagged = bool(self.flag_name) and self.check_flag(record)
+        self.store_index(record, stat, flagged)
+        if flagged or not self.filter_fits(record):
+            return None
+        return self.extract_data(record)
+
+    def accept_file(self, fname):
+        """
+        Check, count and flag `fname`, returning its record if accepted.
+
+        Raises StopIteration once `maxn` files were accepted.
+        """
+        record = self.check_file(fname)
+        if record is None:
+            return None
+        if self.maxn_reached():
             raise StopIteration
-        self.count += 1
+        if self.counts_towards_maxn(record):
+            self.count += 1
         if self.flag_name and self.update_flag:
-            self.flag_file(fname)
-        return True
+            self.flag_file(record)
+        return record
 
-    def filter_fits(self, fname_i):
+    def validate_file(self, fname):
+        return self.accept_file(fname) is not None
+
+    def filter_fits(self, record):
         """
         Check if the string is a range or something else
         """
-        time_fits = self.get_fits_time(fname_i)
-        if self.time_first and time_fits < self.time_first:
+        return self.filter_time(self.get_fits_time(record))
+
+    def filter_time(self, time_fits):
+        if self.time_first is not None and time_fits < self.time_first:
             filter_value = False
-        elif self.time_last and time_fits > self.time_last:
+        elif self.time_last is not None and time_fits > self.time_last:
             filter_value = False
         else:
             filter_value = True
@@ -139,17 +520,46 @@ def main():
     name_and_version = __doc__.strip().splitlines()[0]
     arguments = docopt.docopt(__doc__, help=True, version=name_and_version)
     common.configure_log(arguments['--verbosity'])
+    common.configure_stats(arguments['--stats'])
+    common.configure_profile()
     log.debug('initialising')
-    sniffer = Sniffer(
-        search_dir=arguments['SEARCH_DIR'],
-        tmin=arguments['--tmin'],
-        tmax=arguments['--tmax'],
-        maxn=arguments['--maxn'],
-        flag_name=arguments['--flag'],
-        update_flag=not arguments['--dry-run'],
-    )
-    for fname_i in sniffer.find_fits():
-        sys.stdout.write(f'{fname_i}\n')
+    emit_records = arguments['--emit-records']
+    try:
+        sniffer = Sniffer(
+            search_dir=arguments['SEARCH_DIR'],
+            tmin=arguments['--tmin'],
+            tmax=arguments['--tmax'],
+            maxn=arguments['--maxn'],
+            flag_name=arguments['--flag'],
+            update_flag=not arguments['--dry-run'],
+            flag_mode=arguments['--flag-mode'],
+            jobs=arguments['--jobs'],
+            ordered=arguments['--ordered'],
+            index_path=arguments['--index'],
+            prune_dirs=arguments['--prune-dirs'],
+            extract=reducer.header_data if emit_records else None,
+        )
+    except ValueError as e:
+        raise docopt.DocoptExit(str(e))
+    try:
+        if arguments['--watch']:
+            poll = arguments['--poll']
+            records = sniffer.watch_records(
+                settle=float(arguments['--settle']),
+                poll=None if poll is None else float(poll),
+            )
+        else:
+            records = sniffer.find_records()
+        for record in records:
+            if emit_records:
+                line = reducer.encode_header_data(record.data)
+            else:
+                line = record.fname
+            sys.stdout.write(f'{line}\n')
+            if arguments['--watch']:
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        log.debug('SIGINT')
 
 
 if __name__ == '__main__':
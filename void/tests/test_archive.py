@@ -0,0 +1,185 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from void import archive, fitsheader, reducer, scanindex, sniffer
+
+DATA_DIR = 'void/tests/data'
+NAMES = ['test_unflagged.fit', 'test2_flagged.fit']
+
+
+class ArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.tar_fname = os.path.join(self.tmp_dir, 'night.tar')
+        with tarfile.open(self.tar_fname, 'w') as tar:
+            for name in NAMES:
+                tar.add(os.path.join(DATA_DIR, name), f'frames/{name}')
+            tar.add(os.path.join(DATA_DIR, 'sub'), 'sub')
+        self.zip_fname = os.path.join(self.tmp_dir, 'night.zip')
+        with zipfile.ZipFile(self.zip_fname, 'w') as zip_file:
+            zip_file.write(os.path.join(DATA_DIR, NAMES[0]), NAMES[0])
+            zip_file.write(
+                os.path.join(DATA_DIR, NAMES[1]),
+                NAMES[1],
+                zipfile.ZIP_DEFLATED,
+            )
+
+    def test_split_path(self):
+        path = archive.join_path('a/night.tar', 'frames/x.fits')
+        self.assertEqual('a/night.tar::frames/x.fits', path)
+        self.assertTupleEqual(
+            ('a/night.tar', 'frames/x.fits'), archive.split_path(path)
+        )
+        self.assertTrue(archive.is_member(path))
+        self.assertFalse(archive.is_member('a/night.tar'))
+
+    def test_tar_members(self):
+        fnames = list(archive.members(self.tar_fname, ('.fit',)))
+        expected = [
+            f'{self.tar_fname}::frames/{NAMES[0]}',
+            f'{self.tar_fname}::frames/{NAMES[1]}',
+            f'{self.tar_fname}::sub/test_in_sub_unflagged.fit',
+        ]
+        self.assertListEqual(expected, fnames)
+
+    def test_member_index_cached(self):
+        index = archive.member_index(self.tar_fname)
+        self.assertIs(index, archive.member_index(self.tar_fname))
+        with tarfile.open(self.tar_fname, 'a') as tar:
+            tar.add(os.path.join(DATA_DIR, NAMES[0]), 'extra.fit')
+        self.assertIn('extra.fit', archive.member_index(self.tar_fname))
+
+    def test_read_header(self):
+        for archive_fname, name in (
+            (self.tar_fname, f'frames/{NAMES[0]}'),
+            (self.zip_fname, NAMES[0]),
+            (self.zip_fname, NAMES[1]),
+        ):
+            path = archive.join_path(archive_fname, name)
+            record = fitsheader.read_header(path)
+            expected = fitsheader.read_header(
+                os.path.join(DATA_DIR, os.path.basename(name))
+            )
+            self.assertEqual(path, record.fname)
+            self.assertEqual(expected.size, record.size)
+            self.assertEqual(expected.header, record.header)
+
+    def test_zip_stored_offset(self):
+        member = archive.member_index(self.zip_fname)[NAMES[0]]
+        with open(self.zip_fname, 'rb') as zip_file:
+            zip_file.seek(member.offset)
+            data = zip_file.read(member.size)
+        with open(os.path.join(DATA_DIR, NAMES[0]), 'rb') as fits_file:
+            self.assertEqual(fits_file.read(), data)
+        self.assertIsNone(archive.member_index(self.zip_fname)[NAMES[1]][1])
+
+    def test_missing_member(self):
+        path = archive.join_path(self.tar_fname, 'nope.fit')
+        with self.assertRaises(FileNotFoundError):
+            fitsheader.read_header(path)
+
+    def test_write_header_read_only(self):
+        path = archive.join_path(self.tar_fname, f'frames/{NAMES[0]}')
+        record = fitsheader.read_header(path)
+        with self.assertRaises(ValueError):
+            fitsheader.write_header(record)
+
+    def test_sniffer(self):
+        os.makedirs(os.path.join(self.tmp_dir, 'bad.zip'))
+        with open(os.path.join(self.tmp_dir, 'broken.tar'), 'wb') as f:
+            f.write(b'not a tar')
+        instance = sniffer.Sniffer(
+            search_dir=self.tmp_dir, flag_name='VISNJAN', ordered=True
+        )
+        with self.assertLogs('void.sniffer', 'WARNING'):
+            fnames = list(instance.find_fits())
+        expected = [
+            os.path.relpath(path)
+            for path in (
+                f'{self.tar_fname}::frames/{NAMES[0]}',
+                f'{self.tar_fname}::sub/test_in_sub_unflagged.fit',
+                f'{self.zip_fname}::{NAMES[0]}',
+            )
+        ]
+        self.assertListEqual(expected, fnames)
+
+    def _sniff_maxn(self, **kwargs):
+        plain_dir = os.path.join(self.tmp_dir, 'plain')
+        if not os.path.isdir(plain_dir):
+            os.makedirs(plain_dir)
+            for name in ('a.fit', 'b.fit'):
+                shutil.copy(
+                    os.path.join(DATA_DIR, NAMES[0]),
+                    os.path.join(plain_dir, name),
+                )
+        instance = sniffer.Sniffer(
+            search_dir=self.tmp_dir,
+            flag_name='VISNJAN',
+            ordered=True,
+            maxn=1,
+            **kwargs,
+        )
+        search_dir = os.path.relpath(self.tmp_dir)
+        fnames = [
+            os.path.relpath(fname, search_dir)
+            for fname in instance.find_fits()
+        ]
+        if instance.index is not None:
+            instance.index.close()
+        return fnames
+
+    @mock.patch.object(scanindex.ScanIndex, 'RACY_NS', 0)
+    def test_sniffer_maxn_index(self):
+        index_path = os.path.join(self.tmp_dir, 'index.sqlite')
+        self.assertListEqual(
+            [f'night.tar::frames/{NAMES[0]}'],
+            self._sniff_maxn(index_path=index_path),
+        )
+        self.assertListEqual(
+            ['night.tar::sub/test_in_sub_unflagged.fit'],
+            self._sniff_maxn(index_path=index_path),
+        )
+        self._sniff_maxn(index_path=index_path)
+        self.assertListEqual(
+            ['plain/a.fit'], self._sniff_maxn(index_path=index_path)
+        )
+
+    def test_sniffer_maxn_no_index(self):
+        members = [
+            f'night.tar::frames/{NAMES[0]}',
+            'night.tar::sub/test_in_sub_unflagged.fit',
+            f'night.zip::{NAMES[0]}',
+        ]
+        self.assertListEqual(members + ['plain/a.fit'], self._sniff_maxn())
+        self.assertListEqual(members + ['plain/b.fit'], self._sniff_maxn())
+        self.assertListEqual(members, self._sniff_maxn())
+        self.assertListEqual(members, self._sniff_maxn(jobs=2))
+
+    def test_sniffer_search_archive(self):
+        instance = sniffer.Sniffer(search_dir=self.zip_fname, ordered=True)
+        expected = [
+            f'{self.zip_fname}::{NAMES[1]}',
+            f'{self.zip_fname}::{NAMES[0]}',
+        ]
+        self.assertListEqual(expected, list(instance.find_fits()))
+
+    @mock.patch('void.reducer.sys')
+    def test_reducer_read_fnames(self, _):
+        lines = [self.zip_fname, 'nope.tar', 'x.fit']
+        with self.assertLogs('void.reducer', 'WARNING'):
+            fnames = list(reducer.read_fnames(lines))
+        expected = [
+            f'{self.zip_fname}::{NAMES[0]}',
+            f'{self.zip_fname}::{NAMES[1]}',
+            'x.fit',
+        ]
+        self.assertListEqual(expected, fnames)
+        data = reducer.read_header_data(fnames[0])
+        expected = reducer.read_header_data(os.path.join(DATA_DIR, NAMES[0]))
+        self.assertDictEqual(expected, data)
@@ -0,0 +1,173 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from void import catalog, reducer
+
+FNAMES = [
+    'void/tests/data/test_unflagged.fit',
+    'void/tests/data/nope.fit',
+    'void/tests/data/test2_flagged.fit',
+]
+PATHS = [os.fsencode(os.path.abspath(fname)) for fname in FNAMES]
+
+
+class CatalogTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fname = os.path.join(self.tmp_dir, 'void.cat')
+        self.rows = [
+            catalog.header_row(fname, reducer.read_header_data(fname))
+            for fname in (FNAMES[0], FNAMES[2])
+        ]
+
+    def test_schema_aligned(self):
+        schema = catalog.schema_bytes()
+        self.assertEqual(0, len(schema) % catalog.ALIGN)
+        self.assertTrue(schema.startswith(catalog.MAGIC))
+
+    def test_roundtrip(self):
+        with catalog.CatalogWriter(self.fname) as writer:
+            for row in self.rows:
+                writer.write_row(row)
+        cat = catalog.read_catalog(self.fname)
+        self.assertIsInstance(cat, np.memmap)
+        self.assertEqual(catalog.CATALOG_DTYPE, cat.dtype)
+        self.assertEqual(88, cat.dtype.itemsize)
+        self.assertListEqual(
+            [PATHS[0], PATHS[2]], catalog.read_paths(self.fname, cat)
+        )
+        self.assertListEqual(
+            [PATHS[2]], catalog.read_paths(self.fname, cat[1:])
+        )
+        expected = np.datetime64('2019-01-09T04:47:09.360', 'ns')
+        self.assertEqual(expected, cat['date_obs'][0])
+        np.testing.assert_array_equal([4408, 4883], cat['focus'])
+        self.assertAlmostEqual(29.813_856_842_555_25, cat['mag_lim'][0])
+
+    def test_empty(self):
+        catalog.CatalogWriter(self.fname).close()
+        cat = catalog.read_catalog(self.fname)
+        self.assertEqual(0, len(cat))
+        self.assertEqual(catalog.CATALOG_DTYPE, cat.dtype)
+        self.assertListEqual([], catalog.read_paths(self.fname, cat))
+
+    def test_append(self):
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(self.rows[0])
+        with catalog.CatalogWriter(self.fname, append=True) as writer:
+            writer.write_row(self.rows[1])
+        cat = catalog.read_catalog(self.fname)
+        expected = [PATHS[0], PATHS[2]]
+        self.assertListEqual(expected, catalog.read_paths(self.fname, cat))
+
+    def test_write_rows(self):
+        rows = np.zeros(2, catalog.CATALOG_DTYPE)
+        rows['exposure'] = [1, 2]
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(self.rows[0])
+            writer.write_rows([b'/a', b'/bc'], rows)
+        cat = catalog.read_catalog(self.fname)
+        self.assertListEqual(
+            [PATHS[0], b'/a', b'/bc'], catalog.read_paths(self.fname, cat)
+        )
+        np.testing.assert_array_equal([1, 2], cat['exposure'][1:])
+
+    def test_replace(self):
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(self.rows[0])
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(self.rows[1])
+        cat = catalog.read_catalog(self.fname)
+        self.assertListEqual([PATHS[2]], catalog.read_paths(self.fname, cat))
+
+    def test_append_partial_row(self):
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(self.rows[0])
+        with open(self.fname, 'ab') as f:
+            f.write(b'\0' * 10)
+        with open(catalog.paths_fname(self.fname), 'ab') as f:
+            f.write(b'/partial')
+        self.assertEqual(1, len(catalog.read_catalog(self.fname)))
+        with self.assertLogs('void.catalog', 'WARNING'):
+            with catalog.CatalogWriter(self.fname, append=True) as writer:
+                writer.write_row(self.rows[1])
+        cat = catalog.read_catalog(self.fname)
+        self.assertListEqual(
+            [PATHS[0], PATHS[2]], catalog.read_paths(self.fname, cat)
+        )
+
+    def test_append_paths_missing(self):
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(self.rows[0])
+        os.unlink(catalog.paths_fname(self.fname))
+        with self.assertRaises(catalog.CatalogError):
+            catalog.CatalogWriter(self.fname, append=True)
+
+    def test_append_schema_differs(self):
+        dtype = np.dtype([('path_offset', '<u8'), ('path_size', '<u8')])
+        catalog.CatalogWriter(self.fname, dtype=dtype).close()
+        with self.assertRaises(catalog.CatalogError):
+            catalog.CatalogWriter(self.fname, append=True)
+
+    def test_not_a_catalog(self):
+        with open(self.fname, 'wb') as f:
+            f.write(b'SIMPLE  =                    T')
+        with self.assertRaises(catalog.CatalogError):
+            catalog.read_catalog(self.fname)
+
+    def test_header_row_focus(self):
+        data = reducer.read_header_data(FNAMES[0])
+        data['focus'] = 4408.5
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(catalog.header_row(FNAMES[0], data))
+        self.assertEqual(4408.5, catalog.read_catalog(self.fname)['focus'])
+
+    def test_long_path(self):
+        data = reducer.read_header_data(FNAMES[0])
+        fname = '/' + 'x' * 300
+        with catalog.CatalogWriter(self.fname) as writer:
+            writer.write_row(catalog.header_row(fname, data))
+        cat = catalog.read_catalog(self.fname)
+        self.assertListEqual(
+            [fname.encode()], catalog.read_paths(self.fname, cat)
+        )
+
+
+class ReducerCatalogTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fname = os.path.join(self.tmp_dir, 'void.cat')
+
+    @mock.patch('void.reducer.common.configure_log')
+    @mock.patch('void.reducer.sys')
+    @mock.patch('docopt.sys')
+    def test_main_catalog(self, p_docopt_sys, p_sys, _):
+        for jobs in ('1', '2'):
+            p_docopt_sys.argv = [
+                'void_reducer',
+                f'--jobs={jobs}',
+                '--output-format=catalog',
+                f'--output={self.fname}',
+                '--append',
+            ]
+            p_sys.stdin = FNAMES
+            with self.assertLogs('void.reducer', 'WARNING'):
+                reducer.main()
+        p_sys.stdout.write.assert_not_called()
+        cat = catalog.read_catalog(self.fname)
+        expected = [PATHS[0], PATHS[2]] * 2
+        self.assertListEqual(expected, catalog.read_paths(self.fname, cat))
+
+    @mock.patch('void.reducer.common.configure_log')
+    @mock.patch('docopt.sys')
+    def test_main_catalog_no_output(self, p_docopt_sys, _):
+        p_docopt_sys.argv = ['void_reducer', '--output-format=catalog']
+        with self.assertRaises(SystemExit):
+            reducer.main()
@@ -1,4 +1,13 @@
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from concurrent import futures
 from unittest import mock
 
 import docopt
@@ -18,3 +27,189 @@ class LogTests(unittest.TestCase):
     def test_configure_log_unknown_cerbosity(self, *_):
         with self.assertRaises(docopt.DocoptExit):
             common.configure_log('321')
+
+
+class BoundedMapTests(unittest.TestCase):
+    def setUp(self):
+        self.executor = futures.ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown)
+
+    @staticmethod
+    def _slow_square(value):
+        time.sleep(0.001 * (5 - value))
+        return value ** 2
+
+    def test_ordered(self):
+        results = [
+            (item, future.result())
+            for item, future in common.bounded_map(
+                self.executor, self._slow_square, range(5), 3
+            )
+        ]
+        expected = [(0, 0), (1, 1), (2, 4), (3, 9), (4, 16)]
+        self.assertListEqual(expected, results)
+
+    def test_unordered(self):
+        results = [
+            (item, future.result())
+            for item, future in common.bounded_map(
+                self.executor, self._slow_square, range(5), 3, ordered=False
+            )
+        ]
+        expected = [(0, 0), (1, 1), (2, 4), (3, 9), (4, 16)]
+        self.assertListEqual(expected, sorted(results))
+
+    def test_window(self):
+        lock = threading.Lock()
+        running = {'now': 0, 'max': 0}
+
+        def func(value):
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            time.sleep(0.001)
+            with lock:
+                running['now'] -= 1
+            return value
+
+        items = list(common.bounded_map(self.executor, func, range(20), 2))
+        self.assertEqual(20, len(items))
+        self.assertLessEqual(running['max'], 2)
+
+    def test_exception(self):
+        def func(value):
+            raise ValueError(value)
+
+        items = common.bounded_map(self.executor, func, ['foo'], 2)
+        item, future = next(items)
+        self.assertEqual('foo', item)
+        with self.assertRaises(ValueError):
+            future.result()
+
+    def test_close_cancels_pending(self):
+        submitted = []
+
+        def items():
+            for value in range(100):
+                submitted.append(value)
+                yield value
+
+        mapped = common.bounded_map(self.executor, str, items(), 5)
+        next(mapped)
+        mapped.close()
+        self.assertLessEqual(len(submitted), 5)
+
+
+class LazyImportTests(unittest.TestCase):
+    def test_imported(self):
+        self.assertIs(unittest, common.lazy_import('unittest'))
+
+    def test_lazy(self):
+        with mock.patch.dict('sys.modules'):
+            sys.modules.pop('colorsys', None)
+            colorsys = common.lazy_import('colorsys')
+            self.assertNotIn('colorsys', sys.modules)
+            self.assertEqual((0, 0, 0), colorsys.rgb_to_hsv(0, 0, 0))
+            self.assertIn('colorsys', sys.modules)
+
+    def test_missing(self):
+        module = common.lazy_import('void.nope')
+        with self.assertRaises(ImportError):
+            module.foo
+
+
+class StatsTests(unittest.TestCase):
+    def setUp(self):
+        self.stats = common.Stats()
+
+    def test_disabled(self):
+        self.stats.count('files_seen')
+        self.stats.error(ValueError())
+        with self.stats.timer('read_header'):
+            pass
+        summary = self.stats.summary()
+        self.assertDictEqual({}, summary['counters'])
+        self.assertDictEqual({}, summary['stages'])
+
+    def test_counters(self):
+        self.stats.enabled = True
+        self.stats.count('files_seen')
+        self.stats.count('bytes_read', 2880)
+        self.stats.count('bytes_read', 5760)
+        self.stats.error(ValueError())
+        self.stats.error(KeyError())
+        self.stats.error(ValueError())
+        self.assertDictEqual(
+            {
+                'bytes_read': 8640,
+                'errors.KeyError': 1,
+                'errors.ValueError': 2,
+                'files_seen': 1,
+            },
+            self.stats.summary()['counters'],
+        )
+
+    def test_histogram(self):
+        self.stats.enabled = True
+        for seconds in (5e-7, 3e-6, 3.5e-6, 100):
+            self.stats.add_latency('read_header', seconds)
+        stage = self.stats.summary()['stages']['read_header']
+        self.assertEqual(4, stage['count'])
+        self.assertEqual(100, stage['max_s'])
+        self.assertAlmostEqual(100.000007, stage['total_s'])
+        self.assertDictEqual(
+            {'1e-06': 1, '4e-06': 2, 'inf': 1}, stage['histogram']
+        )
+
+    def test_timer(self):
+        self.stats.enabled = True
+        with self.assertRaises(ValueError):
+            with self.stats.timer('read_header'):
+                raise ValueError
+        with self.stats.timer('read_header'):
+            pass
+        self.assertEqual(
+            2, self.stats.summary()['stages']['read_header']['count']
+        )
+
+    def test_write(self):
+        self.stats.enabled = True
+        self.stats.count('files_seen')
+        stream = io.StringIO()
+        self.stats.write(stream)
+        summary = json.loads(stream.getvalue())
+        self.assertDictEqual({'files_seen': 1}, summary['counters'])
+
+    @mock.patch('void.common.EXIT_FUNCS', new_callable=list)
+    def test_configure_stats(self, exit_funcs):
+        with mock.patch.object(common, 'STATS', self.stats):
+            common.configure_stats(False)
+            self.assertFalse(self.stats.enabled)
+            self.assertListEqual([], exit_funcs)
+            common.configure_stats(True)
+        self.assertTrue(self.stats.enabled)
+        self.assertListEqual([self.stats.write], exit_funcs)
+
+    @mock.patch('void.common.EXIT_FUNCS', new_callable=list)
+    def test_run_exit_funcs(self, exit_funcs):
+        calls = []
+        exit_funcs.extend(
+            [lambda: calls.append(1), lambda: 1 / 0, lambda: calls.append(3)]
+        )
+        with self.assertLogs('void.common', 'ERROR'):
+            common.run_exit_funcs()
+        self.assertListEqual([3, 1], calls)
+        self.assertListEqual([], exit_funcs)
+
+    @mock.patch('void.common.EXIT_FUNCS', new_callable=list)
+    def test_configure_profile(self, exit_funcs):
+        with mock.patch.dict('os.environ', {common.PROFILE_ENV: ''}):
+            self.assertIsNone(common.configure_profile())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fname = os.path.join(tmp_dir, 'void.prof')
+            with mock.patch.dict('os.environ', {common.PROFILE_ENV: fname}):
+                profiler = common.configure_profile()
+            self.assertIsNotNone(profiler)
+            (dump,) = exit_funcs
+            dump()
+            self.assertGreater(pstats.Stats(fname).total_calls, 0)
@@ -0,0 +1,120 @@
+import unittest
+
+import numpy as np
+
+from void import crossmatch, reducer, time_utils
+
+FNAMES = [
+    'void/tests/data/test_unflagged.fit',
+    'void/tests/data/test2_flagged.fit',
+]
+
+
+def ephemeris(*rows):
+    return np.array(list(rows), dtype=crossmatch.EPHEMERIS_DTYPE)
+
+
+class CrossmatchTests(unittest.TestCase):
+    def setUp(self):
+        # 1 x 1 degree frames at RA 0/360, taken 10 minutes apart
+        self.frames = np.zeros(4, dtype=reducer.HEADER_DTYPE)
+        self.frames['date_obs'] = np.datetime64('2018-08-18T20:00', 'ns')
+        self.frames['date_obs'] += np.arange(4) * np.timedelta64(10, 'm')
+        self.frames['ra_center'] = [0, 0.2, 359.8, 0]
+        self.frames['dec_center'] = 0
+        self.frames['x_deg_size'] = 1
+        self.frames['y_deg_size'] = 1
+        self.frames['pos_angle'] = 0
+        self.mjd = time_utils.datetime64_to_mjd(self.frames['date_obs'])
+
+    def test_interpolate(self):
+        # From RA 359.2 to 0.8 over the 30 minutes of the frames
+        self.frames['ra_center'] = [359.2, 359.7, 0.3, 0.8]
+        ephemerides = {
+            'A': ephemeris(
+                (self.mjd[3], 0.8, 0.1, np.nan, np.nan),
+                (self.mjd[0], 359.2, 0.1, np.nan, np.nan),
+            )
+        }
+        matches = crossmatch.crossmatch(ephemerides, self.frames)
+        np.testing.assert_array_equal([0, 1, 2, 3], matches['frame'])
+        expected_ra = [359.2, 359.7333, 0.2667, 0.8]
+        ra = (matches['ra'] + 180) % 360 - 180
+        np.testing.assert_allclose(
+            (np.array(expected_ra) + 180) % 360 - 180, ra, atol=1e-4
+        )
+        np.testing.assert_allclose(0.1, matches['dec'])
+        np.testing.assert_allclose(
+            [0, 0.0333, -0.0333, 0], matches['x_offset'], atol=1e-4
+        )
+        np.testing.assert_allclose(0.1, matches['y_offset'], atol=1e-6)
+
+    def test_extrapolate(self):
+        # 60 arcsec per minute to the north, known at the first frame
+        ephemerides = {
+            'B': ephemeris((self.mjd[0], 0, 0.2, 60, 0)),
+            'static': ephemeris((self.mjd[0], 0, 0.2, np.nan, np.nan)),
+        }
+        matches = crossmatch.crossmatch(ephemerides, self.frames)
+        b = matches[matches['designation'] == 'B']
+        np.testing.assert_array_equal([0, 1], b['frame'])
+        np.testing.assert_allclose([0.2, 0.3666667], b['dec'])
+        static = matches[matches['designation'] == 'static']
+        np.testing.assert_array_equal([0], static['frame'])
+
+    def test_extrapolate_limit(self):
+        ephemerides = {'C': ephemeris((self.mjd[0] - 1, 0, 0, 0, 0))}
+        matches = crossmatch.crossmatch(ephemerides, self.frames)
+        self.assertEqual(0, len(matches))
+        matches = crossmatch.crossmatch(
+            ephemerides, self.frames, extrapolate=1.1
+        )
+        self.assertEqual(4, len(matches))
+
+    def test_mid_exposure(self):
+        self.frames['exposure'] = 1200
+        ephemerides = {
+            'D': ephemeris(
+                (self.mjd[0], 359.6, 0, np.nan, np.nan),
+                (self.mjd[0] + 1 / 72, 0.4, 0, np.nan, np.nan),
+            )
+        }
+        matches = crossmatch.crossmatch(ephemerides, self.frames)
+        np.testing.assert_array_equal([0, 1], matches['frame'])
+        ra = (matches['ra'] + 180) % 360 - 180
+        np.testing.assert_allclose([0, 0.4], ra, atol=1e-9)
+
+    def test_chunks(self):
+        rng = np.random.RandomState(0)
+        ephemerides = {
+            f'O{i}': ephemeris(
+                (self.mjd[0], rng.uniform(-1, 1) % 360, 0, 1, 90),
+                (self.mjd[3], rng.uniform(-1, 1) % 360, 0, 1, 90),
+            )
+            for i in range(50)
+        }
+        expected = crossmatch.crossmatch(ephemerides, self.frames)
+        chunked = crossmatch.crossmatch(
+            ephemerides, self.frames, chunk_pairs=7
+        )
+        np.testing.assert_array_equal(expected, chunked)
+        self.assertLess(0, len(expected))
+
+    def test_empty(self):
+        ephemerides = {'E': ephemeris(), 'F': np.zeros(0)}
+        matches = crossmatch.crossmatch(ephemerides, self.frames)
+        self.assertEqual(0, len(matches))
+        self.assertEqual(crossmatch.MATCH_DTYPE, matches.dtype)
+        matches = crossmatch.crossmatch({}, self.frames)
+        self.assertEqual(0, len(matches))
+
+    def test_reducer_frames(self):
+        frames = reducer.read_header_data_many(FNAMES)
+        mjd = crossmatch.frame_mjd(frames)
+        ephemerides = {
+            'G': ephemeris((mjd[0], 167.82, 63.31, np.nan, np.nan)),
+            'H': ephemeris((mjd[1], 167.82, 63.31, np.nan, np.nan)),
+        }
+        matches = crossmatch.crossmatch(ephemerides, frames)
+        np.testing.assert_array_equal(['G'], matches['designation'])
+        np.testing.assert_array_equal([0], matches['frame'])
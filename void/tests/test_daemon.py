@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from void import common, daemon, reducer
+
+DATA_DIR = 'void/tests/data'
+FITS_FNAME = os.path.join(DATA_DIR, 'test_unflagged.fit')
+
+
+class DefaultSocketTests(unittest.TestCase):
+    def test_runtime_dir(self):
+        with mock.patch.dict('os.environ', {'XDG_RUNTIME_DIR': '/run/1'}):
+            self.assertEqual('/run/1/void.sock', daemon.default_socket())
+
+    def test_tmp_dir(self):
+        with mock.patch.dict('os.environ', {'XDG_RUNTIME_DIR': ''}):
+            self.assertTrue(daemon.default_socket().endswith('.sock'))
+
+
+class ClientEnvironTests(unittest.TestCase):
+    def test_client_environ(self):
+        environ = {'VOID_PROFILE': 'a', 'HOME': '/home/a', 'XVOID_A': 'b'}
+        self.assertDictEqual(
+            {'VOID_PROFILE': 'a'}, daemon.client_environ(environ)
+        )
+
+
+class ServerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.socket_path = os.path.join(self.tmp_dir, 'void.sock')
+        server = daemon.Server(self.socket_path, daemon.RunHandler)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+
+    def request(self, command, argv, stdin=b'', environ=None):
+        stdout, stderr = io.BytesIO(), io.BytesIO()
+        status = daemon.request(
+            self.socket_path,
+            command,
+            argv,
+            io.BytesIO(stdin),
+            stdout,
+            stderr,
+            environ,
+        )
+        return status, stdout.getvalue().decode(), stderr.getvalue().decode()
+
+    def test_reducer(self):
+        status, stdout, _ = self.request(
+            'reducer', [], f'{FITS_FNAME}\n'.encode()
+        )
+        self.assertEqual(0, status)
+        self.assertEqual(reducer.reduce_file(FITS_FNAME) + '\n', stdout)
+
+    def test_reducer_log(self):
+        status, stdout, stderr = self.request('reducer', [], b'nope.fit\n')
+        self.assertEqual(0, status)
+        self.assertEqual('', stdout)
+        self.assertIn('FileNotFoundError', stderr)
+
+    def test_sniffer(self):
+        status, stdout, _ = self.request(
+            'sniffer', [DATA_DIR, '--dry-run', '--ordered']
+        )
+        self.assertEqual(0, status)
+        self.assertIn(FITS_FNAME, stdout.splitlines())
+
+    def test_reducer_stats(self):
+        status, _, stderr = self.request(
+            'reducer', ['--stats'], f'{FITS_FNAME}\n'.encode()
+        )
+        self.assertEqual(0, status)
+        summary = json.loads(stderr.splitlines()[-1])
+        self.assertEqual(1, summary['counters']['files_opened'])
+
+    def test_environ(self):
+        client_fname = os.path.join(self.tmp_dir, 'client.prof')
+        server_fname = os.path.join(self.tmp_dir, 'server.prof')
+        environ = {common.PROFILE_ENV: client_fname, 'HOME': '/nope'}
+        with mock.patch.dict('os.environ', {common.PROFILE_ENV: server_fname}):
+            status, _, _ = self.request('reducer', [], environ=environ)
+        self.assertEqual(0, status)
+        self.assertTrue(os.path.exists(client_fname))
+        self.assertFalse(os.path.exists(server_fname))
+        with mock.patch.dict('os.environ', {common.PROFILE_ENV: server_fname}):
+            self.request('reducer', [], environ={})
+        self.assertFalse(os.path.exists(server_fname))
+
+    def test_version(self):
+        status, stdout, _ = self.request('reducer', ['--version'])
+        self.assertEqual(0, status)
+        self.assertEqual('void_reducer 0.1\n', stdout)
+
+    def test_usage_error(self):
+        status, stdout, stderr = self.request('reducer', ['--nope'])
+        self.assertEqual(1, status)
+        self.assertEqual('', stdout)
+        self.assertIn('Usage:', stderr)
@@ -0,0 +1,331 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from void import db, math_utils
+
+RECORD = {
+    'path': '/data/a.fit',
+    'date_obs': '2019-01-09T04:47:09.36',
+    'exposure': 60.0,
+    'focus': 4408,
+    'ra_center': 10.0,
+    'dec_center': 20.0,
+    'x_deg_size': 0.5,
+    'y_deg_size': 0.25,
+    'pos_angle': 30.0,
+    'mag_lim': 24.5,
+}
+
+
+class ConnectTests(unittest.TestCase):
+    def test_backends(self):
+        for name in ('postgresql://void@localhost/void', 'dbname=void'):
+            with mock.patch.object(db, 'PostgresDatabase') as backend:
+                db.connect(name)
+            backend.assert_called_once_with(name)
+        for name, path in (
+            ('void.sqlite', 'void.sqlite'),
+            ('sqlite:////tmp/void.sqlite', '/tmp/void.sqlite'),
+        ):
+            with mock.patch.object(db, 'SQLiteDatabase') as backend:
+                db.connect(name)
+            backend.assert_called_once_with(path)
+
+    def test_postgres_dsn(self):
+        dsn = db.postgres_dsn(
+            dbname='void',
+            user="o'neil",
+            password='a b\\',
+            port=5432,
+            host=None,
+        )
+        expected = "dbname='void' user='o\\'neil' password='a b\\\\' "
+        self.assertEqual(expected + "port='5432'", dsn)
+
+    def test_upsert_clause(self):
+        clause = db.PostgresDatabase.upsert_clause()
+        self.assertIn('footprint = EXCLUDED.footprint', clause)
+        self.assertIn(
+            'observations.mag_lim) IS DISTINCT FROM (EXCLUDED.date_obs', clause
+        )
+        self.assertIn(') IS NOT (', db.SQLiteDatabase.upsert_clause())
+
+    def test_copy_text(self):
+        rows = [('a\tb', None, 1.5), ('c\\d\ne', 'f', 2)]
+        expected = 'a\\tb\t\\N\t1.5\nc\\\\d\\ne\tf\t2\n'
+        self.assertEqual(expected, db.copy_text(rows))
+
+
+class PostgresQueryTests(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.dict('sys.modules', psycopg2=mock.Mock()):
+            self.database = db.PostgresDatabase('dbname=void')
+        self.cursor = self.database.conn.cursor.return_value
+        self.cursor.fetchmany.return_value = []
+
+    def query_cone(self, ra, dec, radius):
+        list(self.database.query_cone(ra, dec, radius))
+        return self.cursor.execute.call_args[0]
+
+    def test_cone(self):
+        sql, params = self.query_cone(10.0, 60.0, 1.0)
+        self.assertIn('ST_DWithin', sql)
+        self.assertTrue(params[0].startswith('MULTIPOINT(10.0 60.0,370.0'))
+        ra_min, ra_max, _, _ = math_utils.circle_bbox(10.0, 60.0, 1.0)
+        self.assertAlmostEqual(
+            0.5 * (ra_max - ra_min) + db.PREFILTER_SLACK, params[1]
+        )
+
+    def test_cone_polar(self):
+        for dec, band in ((89.5, (87.0, 90)), (-89.9, (-90, -87.4))):
+            sql, params = self.query_cone(247.2, dec, 2.5)
+            self.assertIn('ST_MakeEnvelope', sql)
+            self.assertEqual(db.POLAR_RA_BAND[0], params[0])
+            self.assertEqual(db.POLAR_RA_BAND[1], params[2])
+            self.assertAlmostEqual(band[0] - db.PREFILTER_SLACK, params[1])
+            self.assertAlmostEqual(band[1] + db.PREFILTER_SLACK, params[3])
+
+
+class ObservationRowsTests(unittest.TestCase):
+    def test_observation_rows(self):
+        (row,) = db.observation_rows([RECORD])
+        self.assertEqual(len(db.OBSERVATION_COLUMNS), len(row))
+        values = dict(zip(db.OBSERVATION_COLUMNS, row))
+        self.assertEqual('2019-01-09T04:47:09.360000', values['date_obs'])
+        self.assertEqual(4408, values['focus'])
+        self.assertEqual(24.5, values['mag_lim'])
+
+    def test_footprint(self):
+        (row,) = db.observation_rows([RECORD])
+        wkt = row[-1]
+        self.assertTrue(wkt.startswith('POLYGON(('))
+        ring = np.array(
+            [
+                [float(value) for value in vertex.split()]
+                for vertex in wkt[len('POLYGON(('):-2].split(',')
+            ]
+        )
+        np.testing.assert_array_equal(ring[0], ring[-1])
+        # Corners of the footprint, in the tangent plane a closed ring
+        # around the rectangle, not across it
+        xi, eta = math_utils.gnomonic(10, 20, ring[:, 0], ring[:, 1])
+        u, v = math_utils.footprint_coords(xi, eta, 30)
+        np.testing.assert_allclose(0.25, np.abs(u))
+        np.testing.assert_allclose(0.125, np.abs(v))
+        sides = np.hypot(np.diff(u), np.diff(v))
+        np.testing.assert_allclose([0.25, 0.25, 0.5, 0.5], sorted(sides))
+
+    def test_missing_values(self):
+        record = dict(RECORD, mag_lim=float('nan'), date_obs=None)
+        del record['pos_angle']
+        (row,) = db.observation_rows([record])
+        values = dict(zip(db.OBSERVATION_COLUMNS, row))
+        self.assertIsNone(values['date_obs'])
+        self.assertIsNone(values['mag_lim'])
+        self.assertIsNone(values['pos_angle'])
+        self.assertIsNone(values['footprint'])
+
+    def test_empty(self):
+        self.assertListEqual([], db.observation_rows([]))
+
+
+class SQLiteDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fname = os.path.join(self.tmp_dir, 'void.sqlite')
+        self.database = db.connect(self.fname)
+        self.addCleanup(self.database.close)
+        self.database.create_schema()
+
+    def paths(self):
+        cursor = self.database.conn.execute(
+            'SELECT path FROM observations ORDER BY id'
+        )
+        return [path for (path,) in cursor]
+
+    def test_insert_paths(self):
+        self.assertEqual(2, self.database.insert_paths(['/a', '/b']))
+        self.assertEqual(1, self.database.insert_paths(['/b', '/c']))
+        self.database.commit()
+        self.assertListEqual(['/a', '/b', '/c'], self.paths())
+
+    def test_uncommitted(self):
+        self.database.insert_paths(['/a'])
+        self.database.close()
+        self.database = db.connect(self.fname)
+        self.assertListEqual([], self.paths())
+
+    def test_upsert_observations(self):
+        other = dict(RECORD, path='/data/b.fit')
+        rows = db.observation_rows([RECORD, other])
+        self.assertEqual(2, self.database.upsert_observations(rows))
+        self.assertEqual(0, self.database.upsert_observations(rows))
+        changed = dict(RECORD, mag_lim=25.0)
+        rows = db.observation_rows([RECORD, changed, other])
+        self.assertEqual(1, self.database.upsert_observations(rows))
+        self.database.commit()
+        self.assertListEqual(['/data/a.fit', '/data/b.fit'], self.paths())
+        (mag_lim,) = self.database.conn.execute(
+            'SELECT mag_lim FROM observations WHERE id = 1'
+        ).fetchone()
+        self.assertEqual(25.0, mag_lim)
+
+    @mock.patch.object(db.SQLiteDatabase, 'HAS_UPSERT', False)
+    def test_upsert_observations_insert_update(self):
+        self.test_upsert_observations()
+
+    def test_time_index(self):
+        (plan,) = self.database.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT path FROM observations '
+            "WHERE date_obs BETWEEN '2019-01-01' AND '2019-01-02'"
+        ).fetchall()
+        self.assertIn('observations_date_obs_idx', plan[-1])
+
+
+class SQLiteQueryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.database = db.connect(os.path.join(self.tmp_dir, 'void.sqlite'))
+        self.addCleanup(self.database.close)
+        self.database.create_schema()
+        rng = np.random.RandomState(0)
+        n = 500
+        self.records = [
+            dict(
+                RECORD,
+                path=f'/data/{i}.fit',
+                date_obs=f'2019-01-{1 + i % 28:02d}T{i % 24:02d}:00:00',
+                ra_center=ra,
+                dec_center=dec,
+                pos_angle=pa,
+                x_deg_size=5.0,
+                y_deg_size=3.0,
+            )
+            for i, (ra, dec, pa) in enumerate(
+                zip(
+                    rng.uniform(0, 360, n),
+                    np.rad2deg(np.arcsin(rng.uniform(-1, 1, n))),
+                    rng.uniform(0, 360, n),
+                )
+            )
+        ]
+        # Across RA 0 and around the pole
+        self.records[0].update(ra_center=359.9, dec_center=0.0)
+        self.records[1].update(ra_center=30.0, dec_center=89.0)
+        # Near the poles, with RA ranges beyond 360 and below 0
+        self.records[3].update(ra_center=359.5, dec_center=86.5, pos_angle=0)
+        self.records[4].update(ra_center=0.5, dec_center=-86.5, pos_angle=0)
+        self.database.upsert_observations(db.observation_rows(self.records))
+        self.database.commit()
+
+    def expected(self, ra, dec, radius, start='2000', end='2100'):
+        distance = math_utils.footprint_distance(
+            ra,
+            dec,
+            [(r['ra_center'], r['dec_center']) for r in self.records],
+            5.0,
+            3.0,
+            np.array([r['pos_angle'] for r in self.records]),
+        )
+        return sorted(
+            record['path']
+            for record, near in zip(self.records, distance <= radius)
+            if near and start <= record['date_obs'] <= end
+        )
+
+    def test_wal(self):
+        (mode,) = self.database.conn.execute('PRAGMA journal_mode').fetchone()
+        self.assertEqual('wal', mode)
+
+    def test_query_covers(self):
+        rng = np.random.RandomState(1)
+        positions = [(0.1, 0.5), (359.0, -0.5), (200.0, 89.5)] + list(
+            zip(rng.uniform(0, 360, 100), rng.uniform(-90, 90, 100))
+        )
+        found = 0
+        for ra, dec in positions:
+            paths = sorted(
+                row[0] for row in self.database.query_covers(ra, dec)
+            )
+            self.assertListEqual(self.expected(ra, dec, 0), paths)
+            found += len(paths)
+        self.assertGreater(found, 3)
+        self.assertIn('/data/0.fit', self.expected(0.1, 0.5, 0))
+        self.assertIn('/data/1.fit', self.expected(200.0, 89.5, 0))
+
+    def test_query_cone(self):
+        rng = np.random.RandomState(2)
+        for ra, dec in zip(rng.uniform(0, 360, 50), rng.uniform(-90, 90, 50)):
+            rows = list(self.database.query_cone(ra, dec, 3))
+            self.assertListEqual(
+                self.expected(ra, dec, 3), sorted(row[0] for row in rows)
+            )
+            for row in rows:
+                self.assertEqual(len(db.RESULT_COLUMNS), len(row))
+
+    def test_query_cone_polar(self):
+        for ra, dec, radius, path in (
+            (0.0, 89.5, 2.0, '/data/3.fit'),
+            (247.2, -89.9, 2.5, '/data/4.fit'),
+        ):
+            expected = self.expected(ra, dec, radius)
+            self.assertIn(path, expected)
+            rows = self.database.query_cone(ra, dec, radius)
+            self.assertListEqual(expected, sorted(row[0] for row in rows))
+        rng = np.random.RandomState(3)
+        for ra, dec, radius in zip(
+            rng.uniform(0, 360, 100),
+            rng.choice([-1, 1], 100) * rng.uniform(85, 90, 100),
+            rng.uniform(0, 5, 100),
+        ):
+            rows = self.database.query_cone(ra, dec, radius)
+            self.assertListEqual(
+                self.expected(ra, dec, radius),
+                sorted(row[0] for row in rows),
+            )
+
+    def test_query_time(self):
+        rows = list(
+            self.database.query_time('2019-01-03', '2019-01-04T12:00:00')
+        )
+        self.assertGreater(len(rows), 0)
+        dates = [row[1] for row in rows]
+        self.assertListEqual(sorted(dates), dates)
+        for date in dates:
+            self.assertTrue('2019-01-03' <= date <= '2019-01-04T12')
+        expected = sorted(
+            record['path']
+            for record in self.records
+            if '2019-01-03' <= record['date_obs'] <= '2019-01-04T12:00:00'
+        )
+        self.assertListEqual(expected, sorted(row[0] for row in rows))
+
+    def test_query_cone_time(self):
+        start, end = '2019-01-10', '2019-01-20'
+        rows = self.database.query_cone(100, 10, 30, start, end)
+        expected = self.expected(100, 10, 30, start, end)
+        self.assertGreater(len(expected), 0)
+        self.assertListEqual(expected, sorted(row[0] for row in rows))
+
+    def test_update_moves_footprint(self):
+        self.assertNotIn('/data/2.fit', self.expected(100.0, 10.0, 0))
+        self.records[2].update(ra_center=100.0, dec_center=10.0)
+        rows = db.observation_rows(self.records)
+        self.assertEqual(1, self.database.upsert_observations(rows))
+        paths = [row[0] for row in self.database.query_covers(100.0, 10.0)]
+        self.assertIn('/data/2.fit', paths)
+        (count,) = self.database.conn.execute(
+            'SELECT COUNT(*) FROM observations_rtree'
+        ).fetchone()
+        self.assertEqual(len(self.records), count)
+
+    @mock.patch.object(db.SQLiteDatabase, 'HAS_UPSERT', False)
+    def test_update_moves_footprint_insert_update(self):
+        self.test_update_moves_footprint()
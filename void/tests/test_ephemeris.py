@@ -0,0 +1,118 @@
+import unittest
+
+import numpy as np
+
+from void import crossmatch, ephemeris, reducer
+
+EPHEMERIS_FNAME = 'setup/dataset/2018-08-18.txt'
+
+
+class EphemerisTests(unittest.TestCase):
+    def setUp(self):
+        self.objects = list(ephemeris.read_ephemeris_file(EPHEMERIS_FNAME))
+
+    def test_objects(self):
+        self.assertEqual(21, len(self.objects))
+        self.assertEqual(24, sum(len(obj.rows) for obj in self.objects))
+        first = self.objects[0]
+        self.assertEqual('P10IZ9s', first.designation)
+        self.assertEqual(20.8, first.mag)
+        self.assertIsNone(first.exposures)
+        self.assertEqual('A10828M', self.objects[-1].designation)
+        self.assertIsNone(self.objects[-1].mag)
+
+    def test_headers(self):
+        by_name = {obj.designation: obj for obj in self.objects}
+        self.assertEqual((24, 30.0), by_name['P10Jcm8'][3:5])
+        # Trailing spaces and measurement annotations
+        self.assertEqual('', by_name['P10Jcmt'].note)
+        annotated = by_name['A1083fA']
+        self.assertEqual(3, annotated.observations)
+        self.assertEqual(18.8, annotated.mag)
+        self.assertEqual((18, 15.0), annotated[3:5])
+        self.assertEqual(3, len(annotated.rows))
+        unplanned = by_name['P10JeFH']
+        self.assertEqual(3, unplanned.observations)
+        self.assertIsNone(unplanned.mag)
+        self.assertIsNone(unplanned.exposures)
+        self.assertEqual(2, by_name['P10Jg34'].observations)
+        self.assertEqual('+VSA819 820 821', by_name['VSA818'].note)
+
+    def test_rows(self):
+        rows = self.objects[0].rows
+        # 2018 08 18 2000   15 05 16.8 +56 25 38  72.8  20.8    0.18  040.5
+        np.testing.assert_allclose(58348 + 20 / 24, rows['mjd'])
+        np.testing.assert_allclose(
+            15 * (15 + 5 / 60 + 16.8 / 3600), rows['ra']
+        )
+        np.testing.assert_allclose(56 + 25 / 60 + 38 / 3600, rows['dec'])
+        np.testing.assert_allclose(
+            [72.8, 20.8, 0.18, 40.5],
+            [rows[0][name] for name in ('elongation', 'mag', 'motion', 'pa')],
+        )
+
+    def test_row_variations(self):
+        by_name = {obj.designation: obj for obj in self.objects}
+        # Negative declination, RA without decimal seconds
+        rows = by_name['VSA816'].rows
+        np.testing.assert_allclose(
+            15 * (22 + 36 / 60 + 12 / 3600), rows['ra']
+        )
+        np.testing.assert_allclose(-(8 + 1 / 60 + 52 / 3600), rows['dec'])
+        # Columns after the declination shifted by a character
+        row = by_name['VSA818'].rows[0]
+        self.assertEqual(58349.0, row['mjd'])
+        np.testing.assert_allclose(
+            [153.8, 21.8, 0.53, 268.7],
+            [row[name] for name in ('elongation', 'mag', 'motion', 'pa')],
+        )
+
+    def test_batches(self):
+        for batch_lines in (1, 2, 5):
+            objects = list(
+                ephemeris.read_ephemeris_file(EPHEMERIS_FNAME, batch_lines)
+            )
+            self.assertListEqual(
+                [obj.designation for obj in self.objects],
+                [obj.designation for obj in objects],
+            )
+            np.testing.assert_array_equal(
+                np.concatenate([obj.rows for obj in self.objects]),
+                np.concatenate([obj.rows for obj in objects]),
+            )
+
+    def test_short_rows(self):
+        lines = [
+            '* K18P00A',
+            '2018 08 18 2000   15 05 16.8 +56 25 38',
+            '2018 08 18 2100   15 05 17.8 -00 25 38  72.8  20.8',
+            '* K18P00B 2 mea',
+        ]
+        objects = list(ephemeris.read_ephemerides(lines))
+        self.assertListEqual(['K18P00A', 'K18P00B'], [o[0] for o in objects])
+        rows = objects[0].rows
+        self.assertTrue(np.all(np.isnan(rows['motion'])))
+        np.testing.assert_array_equal([np.nan, 20.8], rows['mag'])
+        np.testing.assert_allclose(-(25 / 60 + 38 / 3600), rows['dec'][1])
+        self.assertEqual(0, len(objects[1].rows))
+
+    def test_invalid_values(self):
+        lines = ['* K18P00A', '2018 08 18 2000   15 05 16.8 +56 25 38  x.8']
+        with self.assertLogs('void.ephemeris', 'WARNING'):
+            (obj,) = ephemeris.read_ephemerides(lines)
+        self.assertTrue(np.isnan(obj.rows['elongation'][0]))
+        with self.assertRaises(ValueError):
+            ephemeris.parse_header('*')
+
+    def test_crossmatch(self):
+        ephemerides = ephemeris.by_designation(self.objects)
+        self.assertEqual(3, len(ephemerides['A1083fA']))
+        rows = ephemerides['P10Jcm8']
+        frames = np.zeros(1, dtype=reducer.HEADER_DTYPE)
+        frames['date_obs'] = np.datetime64('2018-08-18T19:55', 'ns')
+        frames['ra_center'] = rows['ra'].mean()
+        frames['dec_center'] = rows['dec'].mean()
+        frames['x_deg_size'] = 0.1
+        frames['y_deg_size'] = 0.1
+        matches = crossmatch.crossmatch(ephemerides, frames)
+        self.assertListEqual(['P10Jcm8'], list(matches['designation']))
@@ -0,0 +1,180 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from astropy.io import fits
+
+from void import common, fitsheader
+
+
+class ReadHeaderTests(unittest.TestCase):
+    def test_read_header(self):
+        record = fitsheader.read_header('void/tests/data/test_unflagged.fit')
+        self.assertEqual('void/tests/data/test_unflagged.fit', record.fname)
+        self.assertEqual('2019-01-09T04:47:09.360', record.header['DATE-OBS'])
+        self.assertEqual(11520, record.size)
+
+    def test_read_header_file_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            fitsheader.read_header('void/tests/data/nope.fit')
+
+    def test_read_header_stats(self):
+        stats = common.Stats()
+        stats.enabled = True
+        with mock.patch.object(common, 'STATS', stats):
+            fitsheader.read_header('void/tests/data/test_unflagged.fit')
+        summary = stats.summary()
+        self.assertDictEqual(
+            {'bytes_read': 11520, 'files_opened': 1}, summary['counters']
+        )
+        self.assertEqual(1, summary['stages']['read_header']['count'])
+
+
+class WriteHeaderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fname = os.path.join(self.tmp_dir, 'frame.fit')
+        self.data = np.arange(100 * 80, dtype=np.int16).reshape(100, 80)
+
+    def _write_fits(self, n_cards):
+        header = fits.Header()
+        for i in range(n_cards):
+            header[f'KEY{i}'] = i
+        fits.writeto(self.fname, self.data, header)
+
+    def _flag(self, inplace=True):
+        record = fitsheader.read_header(self.fname)
+        record.header['VISNJAN'] = 'True'
+        return fitsheader.write_header(record, inplace=inplace)
+
+    def _assert_flagged(self):
+        with fits.open(self.fname) as hdul:
+            self.assertEqual('True', hdul[0].header['VISNJAN'])
+            np.testing.assert_array_equal(self.data, hdul[0].data)
+        self.assertListEqual(['frame.fit'], os.listdir(self.tmp_dir))
+
+    def test_write_header_inplace(self):
+        self._write_fits(10)
+        size = os.path.getsize(self.fname)
+        inode = os.stat(self.fname).st_ino
+        self.assertTrue(self._flag())
+        self.assertEqual(size, os.path.getsize(self.fname))
+        self.assertEqual(inode, os.stat(self.fname).st_ino)
+        self._assert_flagged()
+
+    def test_write_header_full_block(self):
+        # 5 mandatory cards, 30 extra and END fill a whole 2880 byte block
+        self._write_fits(30)
+        size = os.path.getsize(self.fname)
+        self.assertFalse(self._flag())
+        self.assertEqual(size + 2880, os.path.getsize(self.fname))
+        self._assert_flagged()
+
+    def test_write_header_rewrite(self):
+        self._write_fits(10)
+        size = os.path.getsize(self.fname)
+        self.assertFalse(self._flag(inplace=False))
+        self.assertEqual(size, os.path.getsize(self.fname))
+        self._assert_flagged()
+
+    def test_write_header_stats(self):
+        self._write_fits(10)
+        size = os.path.getsize(self.fname)
+        stats = common.Stats()
+        stats.enabled = True
+        with mock.patch.object(common, 'STATS', stats):
+            self._flag()
+            self._flag(inplace=False)
+        summary = stats.summary()
+        self.assertEqual(2880 + size, summary['counters']['bytes_written'])
+        self.assertIn('write_header', summary['stages'])
+        self.assertIn('rewrite_header', summary['stages'])
+
+    @mock.patch('void.fitsheader.shutil.copyfileobj')
+    def test_write_header_rewrite_error(self, p_copyfileobj):
+        p_copyfileobj.side_effect = OSError('disk full')
+        self._write_fits(10)
+        with open(self.fname, 'rb') as fits_file:
+            original = fits_file.read()
+        with self.assertRaises(OSError):
+            self._flag(inplace=False)
+        with open(self.fname, 'rb') as fits_file:
+            self.assertEqual(original, fits_file.read())
+        self.assertListEqual(['frame.fit'], os.listdir(self.tmp_dir))
+
+
+class CompressedHeaderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.source = 'void/tests/data/test_unflagged.fit'
+        self.expected = fitsheader.read_header(self.source)
+        self.data = np.arange(100 * 80, dtype=np.int16).reshape(80, 100)
+
+    def _write_fz(self):
+        fname = os.path.join(self.tmp_dir, 'frame.fits.fz')
+        hdu = fits.CompImageHDU(self.data, header=self.expected.header)
+        fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(fname)
+        return fname
+
+    def _assert_flagged(self, fname):
+        with fits.open(fname) as hdul:
+            self.assertEqual('True', hdul[1].header['VISNJAN'])
+            np.testing.assert_array_equal(self.data, hdul[1].data)
+        record = fitsheader.read_header(fname)
+        self.assertEqual('True', record.header['VISNJAN'])
+
+    def test_read_gzip_header_only(self):
+        fname = os.path.join(self.tmp_dir, 'frame.fits.gz')
+        with open(self.source, 'rb') as src_file:
+            compressed = gzip.compress(src_file.read())
+        # Truncated image data is never decompressed
+        with open(fname, 'wb') as gzip_file:
+            gzip_file.write(compressed[: len(compressed) // 2])
+        record = fitsheader.read_header(fname)
+        self.assertEqual(self.expected.header, record.header)
+        self.assertEqual(self.expected.size, record.size)
+        self.assertFalse(fitsheader.is_writable(fname))
+        with self.assertRaises(ValueError):
+            fitsheader.write_header(record)
+
+    def test_read_tile_compressed(self):
+        fname = self._write_fz()
+        record = fitsheader.read_header(fname)
+        self.assertEqual(16, record.header['BITPIX'])
+        self.assertEqual(100, record.header['NAXIS1'])
+        self.assertEqual(80, record.header['NAXIS2'])
+        self.assertEqual(4408, record.header['FOCUSPOS'])
+        self.assertNotIn('ZIMAGE', record.header)
+        self.assertNotIn('TFIELDS', record.header)
+        self.assertEqual(2880, record.offset)
+        self.assertEqual('BINTABLE', record.stored_header['XTENSION'])
+
+    def test_read_tile_compressed_not_compressed(self):
+        fname = os.path.join(self.tmp_dir, 'frame.fits.fz')
+        shutil.copy(self.source, fname)
+        with self.assertRaises(ValueError):
+            fitsheader.read_header(fname)
+
+    def test_write_tile_compressed_inplace(self):
+        fname = self._write_fz()
+        size = os.path.getsize(fname)
+        record = fitsheader.read_header(fname)
+        record.header['VISNJAN'] = 'True'
+        self.assertTrue(fitsheader.write_header(record))
+        self.assertEqual(size, os.path.getsize(fname))
+        self._assert_flagged(fname)
+
+    def test_write_tile_compressed_rewrite(self):
+        fname = self._write_fz()
+        size = os.path.getsize(fname)
+        record = fitsheader.read_header(fname)
+        record.header['VISNJAN'] = 'True'
+        self.assertFalse(fitsheader.write_header(record, inplace=False))
+        self.assertEqual(size, os.path.getsize(fname))
+        self._assert_flagged(fname)
@@ -0,0 +1,110 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from void import ingest, reducer
+
+DATA_DIR = 'void/tests/data'
+EXPECTED = [
+    os.path.abspath(os.path.join(DATA_DIR, name))
+    for name in (
+        'sub/test_in_sub_unflagged.fit',
+        'test2_flagged.fit',
+        'test_unflagged.fit',
+    )
+]
+# Only these have all header keys read by void_reducer
+REDUCED = EXPECTED[1:]
+
+ARGUMENTS = {
+    'DATABASE': None,
+    '--src': DATA_DIR,
+    '--batch-size': '2',
+    '--verbosity': '2',
+}
+
+
+class IngestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fname = os.path.join(self.tmp_dir, 'void.sqlite')
+
+    def paths(self):
+        with contextlib.closing(sqlite3.connect(self.fname)) as conn:
+            cursor = conn.execute('SELECT path FROM observations')
+            return sorted(path for (path,) in cursor)
+
+    def test_find_paths(self):
+        self.assertListEqual(
+            EXPECTED, sorted(ingest.find_paths(os.path.abspath(DATA_DIR)))
+        )
+
+    def test_batches(self):
+        batches = list(ingest.batches(range(5), 2))
+        self.assertListEqual([[0, 1], [2, 3], [4]], batches)
+
+    def test_ingest_dir(self):
+        self.assertEqual(3, ingest.ingest_dir(self.fname, DATA_DIR, 2))
+        self.assertListEqual(EXPECTED, self.paths())
+        self.assertEqual(0, ingest.ingest_dir(self.fname, DATA_DIR, 2))
+        self.assertListEqual(EXPECTED, self.paths())
+
+    def test_resume(self):
+        def interrupted(_):
+            yield from EXPECTED[:2]
+            raise KeyboardInterrupt
+
+        with mock.patch.object(ingest, 'find_paths', interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                ingest.ingest_dir(self.fname, DATA_DIR, 1)
+        self.assertListEqual(EXPECTED[:2], self.paths())
+        self.assertEqual(1, ingest.ingest_dir(self.fname, DATA_DIR, 2))
+        self.assertListEqual(EXPECTED, self.paths())
+
+    def test_read_records(self):
+        lines = ['{"path": "/a"}', '', 'nope', '{"focus": 1}', '[]']
+        with self.assertLogs('void.ingest', 'WARNING') as logs:
+            records = list(ingest.read_records(lines))
+        self.assertListEqual([{'path': '/a'}], records)
+        self.assertEqual(3, len(logs.records))
+
+    def test_ingest_stream(self):
+        lines = [reducer.reduce_file_with_path(path) for path in REDUCED]
+        self.assertEqual(2, ingest.ingest_stream(self.fname, lines, 1))
+        self.assertEqual(0, ingest.ingest_stream(self.fname, lines, 1))
+        self.assertListEqual(REDUCED, self.paths())
+
+    def test_ingest_stream_after_dir(self):
+        ingest.ingest_dir(self.fname, DATA_DIR)
+        lines = [reducer.reduce_file_with_path(path) for path in REDUCED]
+        self.assertEqual(2, ingest.ingest_stream(self.fname, lines))
+        with contextlib.closing(sqlite3.connect(self.fname)) as conn:
+            cursor = conn.execute('SELECT focus FROM observations')
+            focus = sorted(focus for (focus,) in cursor if focus)
+        self.assertListEqual([4408, 4883], focus)
+
+    @mock.patch('void.ingest.sys')
+    def test_main_stdin(self, p_sys):
+        record = json.loads(reducer.reduce_file_with_path(REDUCED[0]))
+        p_sys.stdin = io.StringIO(json.dumps(record) + '\n')
+        arguments = dict(ARGUMENTS, DATABASE=self.fname, **{'--src': None})
+        with mock.patch(
+            'void.ingest.docopt.docopt', return_value=arguments
+        ):
+            ingest.main()
+        self.assertListEqual(REDUCED[:1], self.paths())
+
+    def test_main(self):
+        arguments = dict(ARGUMENTS, DATABASE=self.fname)
+        with mock.patch(
+            'void.ingest.docopt.docopt', return_value=arguments
+        ):
+            ingest.main()
+        self.assertListEqual(EXPECTED, self.paths())
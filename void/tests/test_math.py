@@ -41,3 +41,113 @@ class CalculatePolyTest(unittest.TestCase):
         expected = np.asarray(expected)
         expected = math_utils.sort_ndarray(expected)
         np.testing.assert_almost_equal(values, expected, decimal=4)
+
+
+class CalculatePolysTest(unittest.TestCase):
+    def test_calculate_polys_like_calculate_poly(self):
+        rng = np.random.RandomState(42)
+        n = 1000
+        centers = rng.uniform(-90, 360, (n, 2))
+        images_x = rng.uniform(0.1, 2, n)
+        images_y = rng.uniform(0.1, 2, n)
+        pos_angles = rng.uniform(0, 360, n)
+        # Squares at right angles have vertices with equal sums
+        images_y[:30] = images_x[:30]
+        pos_angles[:30] = np.repeat([0, 90, 315], 10)
+        polys = math_utils.calculate_polys(
+            centers, images_x, images_y, pos_angles
+        )
+        self.assertTupleEqual((n, 4, 2), polys.shape)
+        for i in range(n):
+            expected = math_utils.calculate_poly(
+                centers[i], images_x[i], images_y[i], pos_angles[i]
+            )
+            np.testing.assert_allclose(expected, polys[i], atol=1e-12)
+
+    def test_calculate_polys_rectangle(self):
+        polys = math_utils.calculate_polys([(0, 0)], [4], [2], [90])
+        expected = math_utils.calculate_poly((0, 0), 4, 2, 90)
+        np.testing.assert_almost_equal(expected, polys[0])
+
+    def test_calculate_polys_empty(self):
+        polys = math_utils.calculate_polys(np.empty((0, 2)), [], [], [])
+        self.assertTupleEqual((0, 4, 2), polys.shape)
+
+
+class SkyGeometryTest(unittest.TestCase):
+    def test_angular_separation(self):
+        self.assertAlmostEqual(
+            1.0, math_utils.angular_separation(359.5, 0, 0.5, 0)
+        )
+        self.assertAlmostEqual(
+            1.0, math_utils.angular_separation(0, 89.5, 180, 89.5)
+        )
+
+    def test_gnomonic(self):
+        xi, eta = math_utils.gnomonic(0, 0, [0, 1, 359, 0], [0, 0, 0, 1])
+        np.testing.assert_allclose([0, 1, -1, 0], xi, atol=1e-3)
+        np.testing.assert_allclose([0, 0, 0, 1], eta, atol=1e-3)
+        xi, eta = math_utils.gnomonic(0, 0, 180, 0)
+        self.assertTrue(np.isnan(xi))
+
+    def test_in_footprint_vertices(self):
+        # Just inside of the vertices of `calculate_poly`, which takes RA
+        # as a plane coordinate, so only agrees near the equator
+        center = np.array((100.0, 0.0))
+        vertices = math_utils.calculate_poly(center, 0.4, 0.2, 30)
+        inside = center + 0.99 * (np.asarray(vertices) - center)
+        outside = center + 1.1 * (np.asarray(vertices) - center)
+        for points, expected in ((inside, True), (outside, False)):
+            values = math_utils.in_footprint(
+                points[:, 0], points[:, 1], center, 0.4, 0.2, 30
+            )
+            self.assertTrue(np.all(values == expected))
+
+    def test_in_footprint_pole(self):
+        for ra in (0, 90, 180, 270):
+            self.assertTrue(
+                math_utils.in_footprint(ra, 89.9, (45, 89.9), 1, 1, 30)
+            )
+
+    def test_gnomonic_inverse(self):
+        ra = np.array([359.5, 0.2, 10.0, 200.0])
+        dec = np.array([60.0, 61.0, 75.0, -30.0])
+        xi, eta = math_utils.gnomonic(0.0, 62.0, ra[:3], dec[:3])
+        ra_back, dec_back = math_utils.gnomonic_inverse(0.0, 62.0, xi, eta)
+        np.testing.assert_allclose([-0.5, 0.2, 10.0], ra_back)
+        np.testing.assert_allclose(dec[:3], dec_back)
+
+    def test_footprint_vertices(self):
+        centers = [(359.9, 70.0), (10.0, -20.0)]
+        vertices = math_utils.footprint_vertices(centers, 1, 0.5, [0, 30])
+        self.assertTupleEqual((2, 4, 2), vertices.shape)
+        # Continuous around RA 0, and wider in RA at high declination
+        self.assertGreater(vertices[0, :, 0].max(), 360)
+        np.testing.assert_allclose(
+            2 * 0.5 / np.cos(np.deg2rad(70)),
+            np.ptp(vertices[0, :, 0]),
+            rtol=0.05,
+        )
+        for center, frame_vertices, pa in zip(centers, vertices, [0, 30]):
+            distance = math_utils.footprint_distance(
+                frame_vertices[:, 0], frame_vertices[:, 1], center, 1, 0.5, pa
+            )
+            np.testing.assert_allclose(0, distance, atol=1e-9)
+
+    def test_footprint_distance(self):
+        distance = math_utils.footprint_distance(
+            [0, 0.7, 359.3, 0, 180], [0, 0, 0, 0.65, 0], (0, 0), 1, 1, 0
+        )
+        np.testing.assert_allclose(
+            [0, 0.2, 0.2, 0.15], distance[:4], atol=1e-3
+        )
+        self.assertTrue(np.isnan(distance[4]))
+
+    def test_circle_bbox(self):
+        ra_min, ra_max, dec_min, dec_max = math_utils.circle_bbox(
+            [359.5, 10, 10], [0, 60, 89.5], 1
+        )
+        np.testing.assert_allclose([358.5, 8, -170], ra_min, rtol=1e-3)
+        np.testing.assert_allclose([360.5, 12, 190], ra_max, rtol=1e-3)
+        np.testing.assert_allclose([-1, 59, 88.5], dec_min)
+        np.testing.assert_allclose([1, 61, 90], dec_max)
@@ -0,0 +1,284 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+import numpy as np
+from astropy.io import fits
+
+from void import preview
+
+ARGUMENTS = {
+    'OUT_DIR': None,
+    '--size': '16',
+    '--format': 'png',
+    '--method': 'mean',
+    '--percentiles': '0.5,99.5',
+    '--jobs': '1',
+    '--force': False,
+    '--stats': False,
+    '--verbosity': '2',
+}
+
+
+def read_png(data):
+    """ Width, height and rows of an 8 bit grayscale PNG. """
+    assert data.startswith(preview.PNG_SIGNATURE)
+    pos = len(preview.PNG_SIGNATURE)
+    chunks = {}
+    while pos < len(data):
+        (length,) = struct.unpack('>I', data[pos:pos + 4])
+        kind = data[pos + 4:pos + 8]
+        chunk = data[pos + 8:pos + 8 + length]
+        (crc,) = struct.unpack('>I', data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(kind + chunk)
+        chunks[kind] = chunk
+        pos += length + 12
+    width, height = struct.unpack('>II', chunks[b'IHDR'][:8])
+    rows = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype='u1')
+    rows = rows.reshape(height, width + 1)
+    assert not rows[:, 0].any()
+    return width, height, rows[:, 1:]
+
+
+class PreviewTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.out_dir = os.path.join(self.tmp_dir, 'previews')
+
+    def write_fits(self, data, name='frame.fits', **header):
+        fname = os.path.join(self.tmp_dir, name)
+        hdu = fits.PrimaryHDU(data)
+        hdu.header.update(header)
+        hdu.writeto(fname)
+        return fname
+
+
+class MapImageTests(PreviewTestCase):
+    def test_map_image_bzero(self):
+        data = np.arange(40 * 30, dtype='u2').reshape(40, 30) + 30000
+        fname = self.write_fits(data)
+        image, bscale, bzero = preview.map_image(fname)
+        self.assertIsInstance(image, np.memmap)
+        self.assertEqual((40, 30), image.shape)
+        self.assertEqual(32768, bzero)
+        np.testing.assert_array_equal(data, image.astype('i4') + bzero)
+
+    def test_map_image_float(self):
+        data = np.linspace(-1, 1, 20 * 10, dtype='f4').reshape(20, 10)
+        image, bscale, bzero = preview.map_image(self.write_fits(data))
+        self.assertEqual((1.0, 0.0), (bscale, bzero))
+        np.testing.assert_array_equal(data, image)
+
+    def test_map_image_cube(self):
+        data = np.arange(2 * 4 * 3, dtype='i4').reshape(2, 4, 3)
+        image, _, _ = preview.map_image(self.write_fits(data))
+        np.testing.assert_array_equal(data[0], image)
+
+    def test_map_image_test_data(self):
+        image, _, bzero = preview.map_image(
+            'void/tests/data/test_unflagged.fit'
+        )
+        with fits.open('void/tests/data/test_unflagged.fit') as hdul:
+            expected = hdul[0].data
+        self.assertEqual((382, 382), image.shape)
+        np.testing.assert_array_equal(expected, image + bzero)
+
+    def test_map_image_compressed(self):
+        with self.assertRaises(ValueError):
+            preview.map_image('night/frame.fits.gz')
+        with self.assertRaises(ValueError):
+            preview.map_image('night.tar::frame.fits')
+
+    def test_map_image_no_image(self):
+        fname = self.write_fits(None)
+        with self.assertRaises(ValueError):
+            preview.map_image(fname)
+
+
+class ReduceImageTests(unittest.TestCase):
+    def test_reduction_factor(self):
+        self.assertEqual(1, preview.reduction_factor((100, 80), 256))
+        self.assertEqual(2, preview.reduction_factor((100, 80), 50))
+        self.assertEqual(3, preview.reduction_factor((80, 101), 50))
+
+    def test_block_mean(self):
+        data = np.arange(7 * 9, dtype='>i2').reshape(7, 9)
+        expected = data[:6, :9].reshape(2, 3, 3, 3).mean(axis=(1, 3))
+        np.testing.assert_allclose(expected, preview.block_mean(data, 3))
+
+    def test_block_mean_chunks(self):
+        data = np.random.RandomState(0).normal(size=(64, 48)).astype('>f4')
+        expected = preview.block_mean(data, 4)
+        np.testing.assert_allclose(
+            expected, preview.block_mean(data, 4, chunk_bytes=1), rtol=1e-6
+        )
+        self.assertEqual((16, 12), expected.shape)
+
+    def test_reduce_image_stride(self):
+        data = np.arange(10 * 10).reshape(10, 10)
+        image = preview.reduce_image(data, 4, method='stride')
+        np.testing.assert_array_equal(data[::3, ::3], image)
+        self.assertEqual(np.float32, image.dtype)
+
+    def test_reduce_image_small(self):
+        data = np.arange(6).reshape(2, 3)
+        np.testing.assert_array_equal(data, preview.reduce_image(data, 4))
+
+
+class StretchTests(unittest.TestCase):
+    def test_stretch(self):
+        image = np.linspace(0, 100, 101, dtype='f4').reshape(1, 101)
+        stretched = preview.stretch(image, 10, 90)
+        self.assertEqual(np.uint8, stretched.dtype)
+        self.assertEqual(0, stretched[0, 10])
+        self.assertEqual(255, stretched[0, 90])
+        self.assertEqual(0, stretched[0, 0])
+        self.assertEqual(255, stretched[0, 100])
+
+    def test_stretch_nan(self):
+        image = np.array([[np.nan, 1.0, 2.0]], dtype='f4')
+        self.assertEqual(0, preview.stretch(image, 0, 100)[0, 0])
+        image[:] = np.nan
+        np.testing.assert_array_equal([[0, 0, 0]], preview.stretch(image))
+
+    def test_stretch_inf(self):
+        image = np.array([[-np.inf, 1.0, 2.0, np.inf, np.nan]], dtype='f4')
+        np.testing.assert_array_equal(
+            [[0, 0, 255, 255, 0]], preview.stretch(image, 0, 100)
+        )
+
+    def test_stretch_flat(self):
+        image = np.full((3, 3), 5.0, dtype='f4')
+        np.testing.assert_array_equal(
+            np.zeros((3, 3)), preview.stretch(image)
+        )
+
+
+class PngBytesTests(unittest.TestCase):
+    def test_png_bytes(self):
+        image = np.arange(12, dtype='u1').reshape(3, 4)
+        width, height, rows = read_png(preview.png_bytes(image))
+        self.assertEqual((4, 3), (width, height))
+        np.testing.assert_array_equal(image, rows)
+
+
+class MakePreviewTests(PreviewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = np.zeros((64, 32), dtype='f4')
+        # Bright bottom row, the top row of the PNG
+        self.data[:2] = 100
+        self.fname = self.write_fits(self.data)
+
+    def test_make_preview_png(self):
+        path = preview.make_preview(self.fname, self.out_dir, size=16)
+        self.assertEqual(
+            preview.preview_path(self.out_dir, self.fname, 'png'), path
+        )
+        self.assertTrue(path.startswith(self.out_dir))
+        with open(path, 'rb') as f:
+            width, height, rows = read_png(f.read())
+        self.assertEqual((8, 16), (width, height))
+        self.assertTrue((rows[-1] == 255).all())
+        self.assertTrue((rows[:-1] == 0).all())
+        self.assertListEqual(
+            ['frame.fits.png'], os.listdir(os.path.dirname(path))
+        )
+
+    def test_make_preview_npy(self):
+        path = preview.make_preview(
+            self.fname, self.out_dir, size=16, fmt='npy', method='stride'
+        )
+        np.testing.assert_array_equal(self.data[::4, ::4], np.load(path))
+
+    def test_make_preview_up_to_date(self):
+        path = preview.make_preview(self.fname, self.out_dir, size=16)
+        with mock.patch('void.preview.map_image') as p_map_image:
+            self.assertEqual(
+                path, preview.make_preview(self.fname, self.out_dir)
+            )
+            p_map_image.assert_not_called()
+            os.utime(path, (0, 0))
+            p_map_image.side_effect = ValueError
+            with self.assertRaises(ValueError):
+                preview.make_preview(self.fname, self.out_dir)
+
+    def test_make_preview_force(self):
+        path = preview.make_preview(self.fname, self.out_dir, size=16)
+        with mock.patch('void.preview.map_image') as p_map_image:
+            p_map_image.side_effect = ValueError
+            with self.assertRaises(ValueError):
+                preview.make_preview(self.fname, self.out_dir, force=True)
+        self.assertTrue(os.path.exists(path))
+
+    def test_make_preview_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            preview.make_preview(
+                os.path.join(self.tmp_dir, 'nope.fits'), self.out_dir
+            )
+
+
+class MainTests(PreviewTestCase):
+    def run_main(self, arguments, fnames):
+        arguments = dict(ARGUMENTS, OUT_DIR=self.out_dir, **arguments)
+        stdout = io.StringIO()
+        with mock.patch('void.preview.common.configure_log'), mock.patch(
+            'void.preview.docopt.docopt', return_value=arguments
+        ), mock.patch('void.preview.sys') as p_sys:
+            p_sys.stdin = [f'{fname}\n' for fname in fnames]
+            p_sys.stdout = stdout
+            preview.main()
+        return stdout.getvalue().splitlines()
+
+    def test_main(self):
+        fnames = [
+            self.write_fits(np.ones((32, 32), dtype='i2'), f'{i}.fits')
+            for i in range(3)
+        ]
+        paths = self.run_main({}, fnames)
+        self.assertListEqual(
+            [preview.preview_path(self.out_dir, f, 'png') for f in fnames],
+            paths,
+        )
+        for path in paths:
+            self.assertTrue(os.path.exists(path))
+
+    def test_main_jobs(self):
+        fnames = [
+            self.write_fits(np.ones((32, 32), dtype='i2'), f'{i}.fits')
+            for i in range(3)
+        ]
+        paths = self.run_main({'--jobs': '2', '--format': 'npy'}, fnames)
+        self.assertListEqual(
+            [preview.preview_path(self.out_dir, f, 'npy') for f in fnames],
+            paths,
+        )
+        for path in paths:
+            self.assertEqual((16, 16), np.load(path).shape)
+
+    @mock.patch('void.reducer.log')
+    def test_main_exception(self, p_log):
+        fname = self.write_fits(np.ones((4, 4), dtype='i2'))
+        nope = os.path.join(self.tmp_dir, 'nope.fits')
+        paths = self.run_main({}, [nope, fname])
+        self.assertEqual(1, len(paths))
+        p_log.warning.assert_called_once_with(
+            f'FileNotFoundError: "{nope}"'
+        )
+
+    def test_main_bad_arguments(self):
+        for arguments in (
+            {'--format': 'jpeg'},
+            {'--method': 'median'},
+            {'--size': '0'},
+            {'--percentiles': '99,1'},
+            {'--percentiles': '1'},
+        ):
+            with self.assertRaises(SystemExit):
+                self.run_main(arguments, [])
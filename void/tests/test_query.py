@@ -0,0 +1,201 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from void import catalog, db, query
+
+RECORDS = [
+    {
+        'path': '/data/a.fit',
+        'date_obs': '2019-01-09T04:47:09.36',
+        'exposure': 60.0,
+        'focus': 4408,
+        'ra_center': 10.0,
+        'dec_center': 20.0,
+        'x_deg_size': 0.5,
+        'y_deg_size': 0.25,
+        'pos_angle': 30.0,
+        'mag_lim': 24.5,
+    },
+    {
+        'path': '/data/b.fit',
+        'date_obs': '2019-02-01T00:00:00',
+        'exposure': 30.0,
+        'focus': None,
+        'ra_center': 11.0,
+        'dec_center': 20.0,
+        'x_deg_size': 0.5,
+        'y_deg_size': 0.25,
+        'pos_angle': 0.0,
+        'mag_lim': None,
+    },
+]
+
+ARGUMENTS = {
+    'DATABASE': None,
+    'time': False,
+    'covers': False,
+    'cone': False,
+    'TMIN': None,
+    'TMAX': None,
+    'RA': None,
+    'DEC': None,
+    'RADIUS': None,
+    '--batch': False,
+    '--output-format': 'json',
+    '--output': None,
+    '--append': False,
+    '--verbosity': '2',
+}
+
+
+class ParseQueryTests(unittest.TestCase):
+    def test_time(self):
+        self.assertTupleEqual(
+            ('time', ('2019-01-01', '2019-02-01')),
+            query.parse_query(['time', '2019-01-01', '2019-02-01']),
+        )
+
+    def test_cone(self):
+        self.assertTupleEqual(
+            ('cone', (10.0, 20.0, 0.5, None, None)),
+            query.parse_query(['cone', '10', '20', '0.5']),
+        )
+
+    def test_covers_time(self):
+        self.assertTupleEqual(
+            ('covers', (10.0, 20.0, '2019-01-01', '2019-02-01')),
+            query.parse_query(
+                ['covers', '10', '20', '2019-01-01', '2019-02-01']
+            ),
+        )
+
+    def test_invalid(self):
+        for words in (
+            [],
+            ['square', '1'],
+            ['time', '2019-01-01'],
+            ['cone', '10', '20'],
+            ['covers', 'a', '20'],
+            ['covers', '10', '20', '2019-01-01', 'tomorrow'],
+        ):
+            with self.subTest(words=words):
+                with self.assertRaises(ValueError):
+                    query.parse_query(words)
+
+    def test_read_queries(self):
+        lines = [
+            'cone 10 20 0.5\n',
+            '\n',
+            'nope\n',
+            'time 2019 2020\n',
+            'time 2019-01-01 2020-01-01\n',
+        ]
+        with self.assertLogs('void.query', 'WARNING') as logs:
+            queries = list(query.read_queries(lines))
+        self.assertListEqual(
+            [
+                (0, ('cone', (10.0, 20.0, 0.5, None, None))),
+                (4, ('time', ('2019-01-01', '2020-01-01'))),
+            ],
+            queries,
+        )
+        self.assertEqual(2, len(logs.records))
+
+
+class QueryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fname = os.path.join(self.tmp_dir, 'void.sqlite')
+        with db.connect(self.fname) as database:
+            database.create_schema()
+            database.upsert_observations(db.observation_rows(RECORDS))
+            database.commit()
+
+    def run_main(self, stdin='', **arguments):
+        arguments = dict(ARGUMENTS, DATABASE=self.fname, **arguments)
+        with mock.patch('void.query.sys') as p_sys:
+            p_sys.stdin = io.StringIO(stdin)
+            p_sys.stdout = io.StringIO()
+            with mock.patch(
+                'void.query.docopt.docopt', return_value=arguments
+            ):
+                query.main()
+        lines = p_sys.stdout.getvalue().splitlines()
+        return [json.loads(line) for line in lines]
+
+    def test_json_row(self):
+        with db.connect(self.fname) as database:
+            row = next(database.query_time('2019-01-01', '2019-01-31'))
+        data = json.loads(query.json_row(row, 3))
+        self.assertEqual('/data/a.fit', data['path'])
+        self.assertEqual('2019-01-09T04:47:09.360000', data['date_obs'])
+        self.assertEqual(3, data['query'])
+
+    def test_catalog_row(self):
+        with db.connect(self.fname) as database:
+            rows = list(database.query_time('2019-01-01', '2019-03-01'))
+        catalog_rows = [query.catalog_row(row) for row in rows]
+        self.assertListEqual(
+            [b'/data/a.fit', b'/data/b.fit'],
+            [row[0] for row in catalog_rows],
+        )
+        array = np.array(
+            [row[1:] + (0, 0) for row in catalog_rows],
+            dtype=catalog.CATALOG_DTYPE,
+        )
+        self.assertEqual(
+            np.datetime64('2019-01-09T04:47:09.36'), array['date_obs'][0]
+        )
+        self.assertTrue(np.isnan(array['focus'][1]))
+        self.assertTrue(np.isnan(array['mag_lim'][1]))
+
+    def test_main_covers(self):
+        rows = self.run_main(covers=True, RA='10', DEC='20')
+        self.assertListEqual(['/data/a.fit'], [row['path'] for row in rows])
+        self.assertNotIn('query', rows[0])
+
+    def test_main_cone_time(self):
+        rows = self.run_main(
+            cone=True,
+            RA='10',
+            DEC='20',
+            RADIUS='1',
+            TMIN='2019-01-15',
+            TMAX='2019-03-01',
+        )
+        self.assertListEqual(['/data/b.fit'], [row['path'] for row in rows])
+
+    def test_main_batch(self):
+        stdin = 'time 2019-01-01 2019-03-01\ncovers 11 20\ncone 50 20 1\n'
+        rows = self.run_main(stdin, **{'--batch': True})
+        self.assertListEqual(
+            [(0, '/data/a.fit'), (0, '/data/b.fit'), (1, '/data/b.fit')],
+            [(row['query'], row['path']) for row in rows],
+        )
+
+    def test_main_catalog(self):
+        output = os.path.join(self.tmp_dir, 'void.cat')
+        arguments = {'--output-format': 'catalog', '--output': output}
+        self.run_main(
+            time=True, TMIN='2019-01-01', TMAX='2020-01-01', **arguments
+        )
+        self.run_main(
+            covers=True, RA='10', DEC='20', **arguments, **{'--append': True}
+        )
+        array = catalog.read_catalog(output)
+        self.assertListEqual(
+            [b'/data/a.fit', b'/data/b.fit', b'/data/a.fit'],
+            catalog.read_paths(output, array),
+        )
+
+    def test_main_catalog_without_output(self):
+        with self.assertRaises(SystemExit):
+            self.run_main(**{'--output-format': 'catalog'})
@@ -1,12 +1,27 @@
+import json
+import os
 import unittest
 from unittest import mock
 
-from void import reducer
+import numpy as np
+
+from void import fitsheader, reducer
+
+ARGUMENTS = {
+    '--verbosity': '2',
+    '--jobs': '1',
+    '--unordered': False,
+    '--output-format': 'json',
+    '--output': None,
+    '--append': False,
+    '--with-path': False,
+    '--stats': False,
+}
 
 
 class MainTests(unittest.TestCase):
     @mock.patch('void.reducer.common')
-    @mock.patch('void.reducer.docopt')
+    @mock.patch('void.reducer.docopt.docopt', return_value=ARGUMENTS)
     @mock.patch('void.reducer.log')
     @mock.patch('void.reducer.sys')
     def test_main_empty(self, p_sys, p_log, *_):
@@ -16,7 +31,7 @@ class MainTests(unittest.TestCase):
         self.assertListEqual(expected_calls, p_log.debug.mock_calls)
 
     @mock.patch('void.reducer.common')
-    @mock.patch('void.reducer.docopt')
+    @mock.patch('void.reducer.docopt.docopt', return_value=ARGUMENTS)
     @mock.patch('void.reducer.log')
     @mock.patch('void.reducer.sys')
     @mock.patch('void.reducer.read_header_data')
@@ -28,7 +43,7 @@ class MainTests(unittest.TestCase):
         self.assertListEqual(expected_calls, p_log.debug.mock_calls)
 
     @mock.patch('void.reducer.common')
-    @mock.patch('void.reducer.docopt')
+    @mock.patch('void.reducer.docopt.docopt', return_value=ARGUMENTS)
     @mock.patch('void.reducer.log')
     @mock.patch('void.reducer.sys')
     @mock.patch('void.reducer.read_header_data')
@@ -40,7 +55,7 @@ class MainTests(unittest.TestCase):
         self.assertListEqual(expected_calls, p_log.warning.mock_calls)
 
     @mock.patch('void.reducer.common')
-    @mock.patch('void.reducer.docopt')
+    @mock.patch('void.reducer.docopt.docopt', return_value=ARGUMENTS)
     @mock.patch('void.reducer.log')
     @mock.patch('void.reducer.sys')
     @mock.patch('void.reducer.read_header_data')
@@ -55,7 +70,7 @@ class MainTests(unittest.TestCase):
         self.assertListEqual(expected_calls, p_read_header_data.mock_calls)
 
     @mock.patch('void.reducer.common')
-    @mock.patch('void.reducer.docopt')
+    @mock.patch('void.reducer.docopt.docopt', return_value=ARGUMENTS)
     @mock.patch('void.reducer.log')
     @mock.patch('void.reducer.sys')
     def test_main_file_not_found(self, p_sys, p_log, *_):
@@ -70,7 +85,7 @@ class MainTests(unittest.TestCase):
 
     @staticmethod
     @mock.patch('void.reducer.common')
-    @mock.patch('void.reducer.docopt')
+    @mock.patch('void.reducer.docopt.docopt', return_value=ARGUMENTS)
     @mock.patch('void.reducer.log')
     @mock.patch('void.reducer.sys')
     def test_main(p_sys, *_):
@@ -87,7 +102,54 @@ class MainTests(unittest.TestCase):
         p_sys.stdout.write.assert_called_with(expected_output)
 
 
+class ParallelMainTests(unittest.TestCase):
+    def setUp(self):
+        self.fnames = [
+            'void/tests/data/test_unflagged.fit',
+            'void/tests/data/nope.fit',
+            '',
+            'void/tests/data/test2_flagged.fit',
+            'void/tests/data/sub/test_in_sub_unflagged.fit',
+        ]
+        self.expected_calls = [
+            mock.call(reducer.reduce_file(self.fnames[0]) + '\n'),
+            mock.call(reducer.reduce_file(self.fnames[3]) + '\n'),
+        ]
+
+    @mock.patch('void.reducer.common.configure_log')
+    @mock.patch('void.reducer.sys')
+    @mock.patch('docopt.sys')
+    def test_main_jobs(self, p_docopt_sys, p_sys, _):
+        p_docopt_sys.argv = ['void_reducer', '--jobs=2']
+        p_sys.stdin = self.fnames
+        with self.assertLogs('void.reducer', 'WARNING') as logs:
+            reducer.main()
+        written = p_sys.stdout.write.mock_calls
+        self.assertListEqual(self.expected_calls, written)
+        expected_log = 'FileNotFoundError: "void/tests/data/nope.fit"'
+        self.assertIn(expected_log, logs.output[0])
+        self.assertIn("Keyword 'FOCUSPOS' not found.", logs.output[1])
+
+    @mock.patch('void.reducer.common.configure_log')
+    @mock.patch('void.reducer.sys')
+    @mock.patch('docopt.sys')
+    def test_main_jobs_unordered(self, p_docopt_sys, p_sys, _):
+        p_docopt_sys.argv = ['void_reducer', '--jobs=3', '--unordered']
+        p_sys.stdin = self.fnames
+        with self.assertLogs('void.reducer', 'WARNING') as logs:
+            reducer.main()
+        written = p_sys.stdout.write.mock_calls
+        self.assertCountEqual(self.expected_calls, written)
+        self.assertEqual(2, len(logs.output))
+
+
 class ReadHeaderDataTests(unittest.TestCase):
+    def test_reduce_file_with_path(self):
+        fname = 'void/tests/data/test_unflagged.fit'
+        data = json.loads(reducer.reduce_file_with_path(fname))
+        self.assertEqual(os.path.abspath(fname), data.pop('path'))
+        self.assertDictEqual(reducer.read_header_data(fname), data)
+
     def test_read_header_data(self):
         data = reducer.read_header_data('void/tests/data/test_unflagged.fit')
         expected = {
@@ -109,3 +171,81 @@ class EncodeHeaderDataTests(unittest.TestCase):
         encoded = reducer.encode_header_data({'foo': 123})
         expected = '{"foo": 123}'
         self.assertEqual(expected, encoded)
+
+
+class ReadHeaderDataManyTests(unittest.TestCase):
+    def test_read_header_data_many(self):
+        fnames = [
+            'void/tests/data/test_unflagged.fit',
+            'void/tests/data/nope.fit',
+            'void/tests/data/test2_flagged.fit',
+            'void/tests/data/sub/test_in_sub_unflagged.fit',
+        ]
+        with self.assertLogs('void.reducer', 'WARNING') as logs:
+            data = reducer.read_header_data_many(fnames)
+        self.assertEqual(2, len(logs.output))
+        self.assertEqual(reducer.HEADER_DTYPE, data.dtype)
+        expected_valid = [True, False, True, False]
+        np.testing.assert_array_equal(expected_valid, data['valid'])
+        for row, fname in ((0, fnames[0]), (2, fnames[2])):
+            expected = reducer.read_header_data(fname)
+            self.assertEqual(
+                np.datetime64(expected.pop('date_obs')), data['date_obs'][row]
+            )
+            for key, value in expected.items():
+                np.testing.assert_allclose(value, data[key][row])
+        self.assertTrue(np.isnat(data['date_obs'][1]))
+        self.assertTrue(np.isnan(data['mag_lim'][3]))
+        self.assertTrue(np.isnan(data['focus'][3]))
+
+    def test_read_header_data_many_invalid_time(self):
+        good = fitsheader.read_header('void/tests/data/test_unflagged.fit')
+        bad = fitsheader.read_header('void/tests/data/test_unflagged.fit')
+        bad.header['DATE-OBS'] = 'yesterday'
+        tz = fitsheader.read_header('void/tests/data/test_unflagged.fit')
+        tz.header['DATE-OBS'] = '2019-01-09T04:47:09Z'
+        with mock.patch('void.reducer.fitsheader.read_header') as p_read:
+            p_read.side_effect = [good, bad, tz]
+            with self.assertLogs('void.reducer', 'WARNING'):
+                data = reducer.read_header_data_many(['a', 'b', 'c'])
+        np.testing.assert_array_equal([True, False, False], data['valid'])
+        self.assertEqual(
+            np.datetime64('2019-01-09T04:47:09.360'), data['date_obs'][0]
+        )
+        self.assertTrue(np.isnat(data['date_obs'][1]))
+
+    def test_read_header_data_many_invalid_number(self):
+        records = [
+            fitsheader.read_header('void/tests/data/test_unflagged.fit')
+            for _ in range(3)
+        ]
+        records[1].header['EXPTIME'] = 'long'
+        with mock.patch('void.reducer.fitsheader.read_header') as p_read:
+            p_read.side_effect = records
+            with self.assertLogs('void.reducer', 'WARNING') as logs:
+                data = reducer.read_header_data_many(['a', 'b', 'c'])
+        self.assertEqual(1, len(logs.output))
+        np.testing.assert_array_equal([True, False, True], data['valid'])
+        expected = reducer.read_header_data(
+            'void/tests/data/test_unflagged.fit'
+        )
+        for row in (0, 2):
+            np.testing.assert_allclose(
+                expected['mag_lim'], data['mag_lim'][row]
+            )
+            self.assertEqual(expected['focus'], data['focus'][row])
+        self.assertTrue(np.isnan(data['exposure'][1]))
+
+    def test_read_header_data_many_time_scale(self):
+        header = fitsheader.read_header('void/tests/data/test_unflagged.fit')
+        header.header['DATE-OBS'] = '2019-01-09T04:47:09.360(TAI)'
+        with mock.patch('void.reducer.fitsheader.read_header') as p_read:
+            p_read.return_value = header
+            data = reducer.read_header_data_many(['foo.fit'])
+        expected = np.datetime64('2019-01-09T04:46:32.360', 'ns')
+        self.assertEqual(expected, data['date_obs'][0])
+
+    def test_read_header_data_many_empty(self):
+        data = reducer.read_header_data_many([])
+        self.assertEqual(0, len(data))
+        self.assertEqual(reducer.HEADER_DTYPE, data.dtype)
@@ -0,0 +1,98 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from void import scanindex
+
+RACY_NS = scanindex.ScanIndex.RACY_NS
+
+
+@mock.patch.object(scanindex.ScanIndex, 'RACY_NS', 0)
+class ScanIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fname = os.path.join(self.tmp_dir, 'frame.fit')
+        with open(self.fname, 'wb') as fits_file:
+            fits_file.write(b'foo')
+        self.index = scanindex.ScanIndex(os.path.join(self.tmp_dir, 'idx'))
+        self.addCleanup(lambda: self.index.close())
+
+    def _store(self):
+        stat = os.stat(self.fname)
+        self.index.store(self.fname, stat, '2019-01-01', 'VISNJAN', True)
+
+    def test_lookup_missing(self):
+        self.assertIsNone(self.index.lookup(self.fname, os.stat(self.fname)))
+
+    def test_lookup(self):
+        self._store()
+        entry = self.index.lookup(self.fname, os.stat(self.fname))
+        expected = scanindex.IndexEntry('2019-01-01', 'VISNJAN', True)
+        self.assertEqual(expected, entry)
+
+    def test_lookup_persisted(self):
+        self._store()
+        self.index.close()
+        self.index = scanindex.ScanIndex(os.path.join(self.tmp_dir, 'idx'))
+        entry = self.index.lookup(self.fname, os.stat(self.fname))
+        self.assertEqual('2019-01-01', entry.date_obs)
+
+    def test_lookup_changed(self):
+        self._store()
+        with open(self.fname, 'ab') as fits_file:
+            fits_file.write(b'bar')
+        self.assertIsNone(self.index.lookup(self.fname, os.stat(self.fname)))
+
+    def test_lookup_changed_same_size(self):
+        self._store()
+        stat = os.stat(self.fname)
+        os.utime(self.fname, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertIsNone(self.index.lookup(self.fname, os.stat(self.fname)))
+
+    def test_lookup_replaced(self):
+        self._store()
+        stat = os.stat(self.fname)
+        replaced = mock.Mock(
+            st_size=stat.st_size,
+            st_mtime_ns=stat.st_mtime_ns,
+            st_ctime_ns=stat.st_ctime_ns,
+            st_ino=stat.st_ino + 1,
+        )
+        self.assertIsNone(self.index.lookup(self.fname, replaced))
+
+    def test_lookup_racy(self):
+        self._store()
+        with mock.patch.object(scanindex.ScanIndex, 'RACY_NS', 10 ** 12):
+            entry = self.index.lookup(self.fname, os.stat(self.fname))
+        self.assertIsNone(entry)
+
+    def test_lookup_racy_written(self):
+        stat = os.stat(self.fname)
+        self.index.store(
+            self.fname, stat, '2019-01-01', 'VISNJAN', True, written=True
+        )
+        with mock.patch.object(scanindex.ScanIndex, 'RACY_NS', RACY_NS):
+            entry = self.index.lookup(self.fname, os.stat(self.fname))
+        self.assertEqual('2019-01-01', entry.date_obs)
+
+    def test_add_written_column(self):
+        self.index.close()
+        fname = os.path.join(self.tmp_dir, 'old')
+        conn = sqlite3.connect(fname)
+        conn.execute(
+            self.index.SCHEMA.replace(
+                ', written INTEGER NOT NULL DEFAULT 0', ''
+            )
+        )
+        conn.execute(
+            "INSERT INTO files VALUES ('/a', 1, 2, 3, 4, 5, NULL, NULL, 0)"
+        )
+        conn.commit()
+        conn.close()
+        self.index = scanindex.ScanIndex(fname)
+        stat = mock.Mock(st_size=1, st_mtime_ns=2, st_ctime_ns=3, st_ino=4)
+        self.assertIsNotNone(self.index.lookup('/a', stat))
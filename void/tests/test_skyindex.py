@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from void import math_utils, skyindex
+
+FRAME_DTYPE = [
+    ('ra_center', 'f8'),
+    ('dec_center', 'f8'),
+    ('x_deg_size', 'f8'),
+    ('y_deg_size', 'f8'),
+    ('pos_angle', 'f8'),
+    ('date_obs', 'M8[ns]'),
+]
+
+
+def random_frames(n, seed=0):
+    rng = np.random.RandomState(seed)
+    frames = np.zeros(n, dtype=FRAME_DTYPE)
+    frames['ra_center'] = rng.uniform(0, 360, n)
+    frames['dec_center'] = np.rad2deg(np.arcsin(rng.uniform(-1, 1, n)))
+    # Crowd the north pole and RA 0/360
+    tenth = n // 10
+    frames['dec_center'][:tenth] = rng.uniform(87, 90, tenth)
+    frames['ra_center'][tenth:2 * tenth] = rng.uniform(359, 360, tenth)
+    frames['x_deg_size'] = rng.uniform(0.5, 4, n)
+    frames['y_deg_size'] = rng.uniform(0.5, 4, n)
+    frames['pos_angle'] = rng.uniform(0, 360, n)
+    days = rng.randint(0, 365, n).astype('m8[D]')
+    frames['date_obs'] = np.datetime64('2019-01-01', 'ns') + days
+    return frames
+
+
+class SkyIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.frames = random_frames(5000)
+        self.index = skyindex.SkyIndex.build(self.frames, cell_deg=2.0)
+        self.centers = np.column_stack(
+            (self.frames['ra_center'], self.frames['dec_center'])
+        )
+
+    def _expected_point(self, ra, dec):
+        inside = math_utils.in_footprint(
+            ra,
+            dec,
+            self.centers,
+            self.frames['x_deg_size'],
+            self.frames['y_deg_size'],
+            self.frames['pos_angle'],
+        )
+        return np.flatnonzero(inside)
+
+    def test_point(self):
+        positions = [(0.2, 0.5), (359.8, -0.5), (30, 89.9), (200, -89.9)]
+        positions += list(np.random.RandomState(1).uniform(0, 90, (50, 2)))
+        for ra, dec in positions:
+            expected = self._expected_point(ra, dec)
+            np.testing.assert_array_equal(expected, self.index.point(ra, dec))
+
+    def test_point_found(self):
+        for row in (0, 600, 1000, 4999):
+            ra, dec = self.centers[row]
+            self.assertIn(row, self.index.point(ra, dec))
+
+    def test_point_time_range(self):
+        ra, dec = self.centers[0]
+        expected = self._expected_point(ra, dec)
+        date_obs = self.frames['date_obs'][expected]
+        tmin, tmax = np.datetime64('2019-03-01'), np.datetime64('2019-09-01')
+        expected = expected[(date_obs >= tmin) & (date_obs <= tmax)]
+        rows = self.index.point(ra, dec, tmin='2019-03-01', tmax=tmax)
+        np.testing.assert_array_equal(expected, rows)
+
+    def test_cone(self):
+        for ra, dec, radius in ((0, 0, 3), (359.5, 10, 1), (10, 88, 4)):
+            xi, eta = math_utils.gnomonic(
+                self.frames['ra_center'], self.frames['dec_center'], ra, dec
+            )
+            u, v = math_utils.footprint_coords(
+                xi, eta, self.frames['pos_angle']
+            )
+            du = np.maximum(np.abs(u) - 0.5 * self.frames['x_deg_size'], 0)
+            dv = np.maximum(np.abs(v) - 0.5 * self.frames['y_deg_size'], 0)
+            expected = np.flatnonzero(np.hypot(du, dv) <= radius)
+            rows = self.index.cone(ra, dec, radius)
+            np.testing.assert_array_equal(expected, rows)
+
+    def test_save_load(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        fname = os.path.join(tmp_dir, 'sky.npz')
+        self.index.save(fname)
+        loaded = skyindex.SkyIndex.load(fname)
+        self.assertEqual(len(self.index), len(loaded))
+        for ra, dec in self.centers[:20]:
+            np.testing.assert_array_equal(
+                self.index.point(ra, dec), loaded.point(ra, dec)
+            )
+
+    def test_invalid_frames(self):
+        self.frames['ra_center'][:10] = np.nan
+        self.frames['date_obs'][10:20] = np.datetime64('NaT')
+        index = skyindex.SkyIndex.build(self.frames, cell_deg=2.0)
+        self.assertEqual(len(self.frames), len(index))
+        self.assertNotIn(0, index.cone(0, 0, 180))
+        ra, dec = self.centers[10]
+        self.assertIn(10, index.point(ra, dec))
+
+
+class PolygonQueryTests(unittest.TestCase):
+    def setUp(self):
+        # 2 x 1 degrees frames, the second rotated by 90 degrees
+        self.frames = np.zeros(3, dtype=FRAME_DTYPE)
+        self.frames['ra_center'] = [0, 10, 180]
+        self.frames['dec_center'] = [0, 0, 89.5]
+        self.frames['x_deg_size'] = 2
+        self.frames['y_deg_size'] = 1
+        self.frames['pos_angle'] = [0, 90, 0]
+        self.index = skyindex.SkyIndex.build(self.frames)
+
+    def test_overlap(self):
+        polygon = [(0.9, 0.4), (1.5, 0.4), (1.5, 1), (0.9, 1)]
+        np.testing.assert_array_equal([0], self.index.polygon(polygon))
+
+    def test_rotated(self):
+        # Along the y size of the rotated frame, past its x size
+        polygon = [(10.6, -0.2), (11, -0.2), (11, 0.2), (10.6, 0.2)]
+        self.assertEqual(0, len(self.index.polygon(polygon)))
+        polygon = [(9.8, 0.6), (10.2, 0.6), (10.2, 0.9), (9.8, 0.9)]
+        np.testing.assert_array_equal([1], self.index.polygon(polygon))
+
+    def test_wraparound(self):
+        polygon = [(359, -0.2), (359.5, -0.2), (359.5, 0.2), (359, 0.2)]
+        np.testing.assert_array_equal([0], self.index.polygon(polygon))
+
+    def test_separating_edge(self):
+        # Triangle next to a corner, only its hypotenuse separates them
+        polygon = [(0.8, 0.9), (1.4, 0.3), (1.4, 0.9)]
+        self.assertEqual(0, len(self.index.polygon(polygon)))
+
+    def test_enclosing(self):
+        polygon = [(-5, -5), (15, -5), (15, 5), (-5, 5)]
+        np.testing.assert_array_equal([0, 1], self.index.polygon(polygon))
+
+    def test_pole(self):
+        polygon = [(0, 89.8), (90, 89.8), (180, 89.8), (270, 89.8)]
+        np.testing.assert_array_equal([2], self.index.polygon(polygon))
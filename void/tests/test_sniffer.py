@@ -1,10 +1,14 @@
 import os
+import shutil
+import tempfile
+import threading
 import unittest
+from collections import defaultdict
 from unittest import mock
 
 import docopt
 
-from void import sniffer
+from void import fitsheader, reducer, scanindex, sniffer
 
 
 class MainTests(unittest.TestCase):
@@ -19,6 +23,14 @@ class MainTests(unittest.TestCase):
             '--maxn': 'omgwhatcomesafterbaz',
             '--flag': None,
             '--dry-run': False,
+            '--flag-mode': 'inplace',
+            '--jobs': '4',
+            '--ordered': True,
+            '--index': None,
+            '--prune-dirs': '%Y-%m-%d',
+            '--watch': False,
+            '--emit-records': False,
+            '--stats': True,
             '--verbosity': 789,
         }
         expected_call_kwargs = {
@@ -28,18 +40,30 @@ class MainTests(unittest.TestCase):
             'maxn': 'omgwhatcomesafterbaz',
             'flag_name': None,
             'update_flag': True,
+            'flag_mode': 'inplace',
+            'jobs': '4',
+            'ordered': True,
+            'index_path': None,
+            'prune_dirs': '%Y-%m-%d',
+            'extract': None,
         }
         p_docopt.docopt.return_value = mock_args.copy()
         sniffer.main()
         p_sniffer_class.assert_called_once_with(**expected_call_kwargs)
         p_common.configure_log.assert_called_once_with(789)
+        p_common.configure_stats.assert_called_once_with(True)
 
     @mock.patch('void.sniffer.common')
     @mock.patch('void.sniffer.docopt')
     @mock.patch('void.sniffer.Sniffer')
     @mock.patch('void.sniffer.sys')
-    def test_main_init_writes_files(self, p_sys, p_sniffer_class, *_):
-        mock_fits = (item for item in (11, 22, 33, 44))
+    def test_main_init_writes_files(
+        self, p_sys, p_sniffer_class, p_docopt, _
+    ):
+        p_docopt.docopt.return_value = defaultdict(
+            mock.MagicMock, {'--watch': False, '--emit-records': False}
+        )
+        mock_fits = (mock.Mock(fname=item) for item in (11, 22, 33, 44))
         expected_calls = [
             mock.call('11\n'),
             mock.call('22\n'),
@@ -47,9 +71,75 @@ class MainTests(unittest.TestCase):
             mock.call('44\n'),
         ]
         p_sniffer = p_sniffer_class.return_value
-        p_sniffer.find_fits.return_value = mock_fits
+        p_sniffer.find_records.return_value = mock_fits
         sniffer.main()
         self.assertEqual(expected_calls, p_sys.stdout.write.mock_calls)
+        p_sys.stdout.flush.assert_not_called()
+
+    @mock.patch('void.sniffer.common')
+    @mock.patch('void.sniffer.docopt')
+    @mock.patch('void.sniffer.Sniffer')
+    @mock.patch('void.sniffer.sys')
+    def test_main_watch(self, p_sys, p_sniffer_class, p_docopt, _):
+        p_docopt.docopt.return_value = defaultdict(
+            mock.MagicMock,
+            {
+                '--watch': True,
+                '--settle': '0.5',
+                '--poll': '10',
+                '--emit-records': False,
+            },
+        )
+        p_sniffer = p_sniffer_class.return_value
+        p_sniffer.watch_records.return_value = iter(
+            [mock.Mock(fname=11), mock.Mock(fname=22)]
+        )
+        sniffer.main()
+        p_sniffer.watch_records.assert_called_once_with(settle=0.5, poll=10.0)
+        expected_calls = [mock.call('11\n'), mock.call('22\n')]
+        self.assertEqual(expected_calls, p_sys.stdout.write.mock_calls)
+        self.assertEqual(2, p_sys.stdout.flush.call_count)
+
+    @mock.patch('void.sniffer.common')
+    @mock.patch('void.sniffer.docopt')
+    @mock.patch('void.sniffer.Sniffer')
+    @mock.patch('void.sniffer.log')
+    def test_main_sigint(self, p_log, p_sniffer_class, p_docopt, _):
+        p_docopt.docopt.return_value = defaultdict(
+            mock.MagicMock, {'--watch': False}
+        )
+        p_sniffer = p_sniffer_class.return_value
+        p_sniffer.find_records.side_effect = KeyboardInterrupt
+        sniffer.main()
+        p_log.debug.assert_called_with('SIGINT')
+
+    @mock.patch('void.sniffer.common')
+    @mock.patch('void.sniffer.sys')
+    @mock.patch('docopt.sys')
+    def test_main_emit_records(self, p_docopt_sys, p_sys, _):
+        p_docopt_sys.argv = [
+            'void_sniffer',
+            'void/tests/data',
+            '--flag=0',
+            '--ordered',
+            '--emit-records',
+        ]
+        with self.assertLogs('void.sniffer', 'WARNING') as logs:
+            sniffer.main()
+        # the file in sub has no FOCUSPOS, so void_reducer skips it as well
+        fnames = [
+            'void/tests/data/test2_flagged.fit',
+            'void/tests/data/test_unflagged.fit',
+        ]
+        expected_calls = [
+            mock.call(
+                reducer.encode_header_data(reducer.read_header_data(fname))
+                + '\n'
+            )
+            for fname in fnames
+        ]
+        self.assertEqual(1, len(logs.output))
+        self.assertEqual(expected_calls, p_sys.stdout.write.mock_calls)
 
     @mock.patch('docopt.sys')
     def test_unknown_cli_arg(self, p_sys):
@@ -58,13 +148,13 @@ class MainTests(unittest.TestCase):
             sniffer.main()
 
 
-@mock.patch('void.sniffer.fits.writeto')
+@mock.patch('void.sniffer.fitsheader.write_header')
 class SnifferTests(unittest.TestCase):
     def setUp(self):
         base_dir = os.path.dirname(__file__)
         self.kwargs = {'search_dir': base_dir, 'maxn': None, 'tmin': None}
 
-    def test_all_files_no_flag(self, p_writeto):
+    def test_all_files_no_flag(self, p_write):
         self.kwargs['flag_name'] = None
         instance = sniffer.Sniffer(**self.kwargs)
         value = list(instance.find_fits())
@@ -74,9 +164,9 @@ class SnifferTests(unittest.TestCase):
             'void/tests/data/sub/test_in_sub_unflagged.fit',
         ]
         self.assertListEqual(expected, value)
-        p_writeto.assert_not_called()
+        p_write.assert_not_called()
 
-    def test_all_files_disabled_flag(self, p_writeto):
+    def test_all_files_disabled_flag(self, p_write):
         self.kwargs['flag_name'] = '0'
         instance = sniffer.Sniffer(**self.kwargs)
         value = list(instance.find_fits())
@@ -86,9 +176,9 @@ class SnifferTests(unittest.TestCase):
             'void/tests/data/sub/test_in_sub_unflagged.fit',
         ]
         self.assertListEqual(expected, value)
-        p_writeto.assert_not_called()
+        p_write.assert_not_called()
 
-    def test_all_files_new_flag(self, p_writeto):
+    def test_all_files_new_flag(self, p_write):
         self.kwargs['flag_name'] = 'foo'
         instance = sniffer.Sniffer(**self.kwargs)
         value = list(instance.find_fits())
@@ -98,11 +188,11 @@ class SnifferTests(unittest.TestCase):
             'void/tests/data/sub/test_in_sub_unflagged.fit',
         ]
         self.assertListEqual(expected, value)
-        self.assertEqual(expected[0], p_writeto.mock_calls[0][1][0])
-        self.assertEqual(expected[1], p_writeto.mock_calls[1][1][0])
-        self.assertEqual(expected[2], p_writeto.mock_calls[2][1][0])
+        self.assertEqual(expected[0], p_write.call_args_list[0][0][0].fname)
+        self.assertEqual(expected[1], p_write.call_args_list[1][0][0].fname)
+        self.assertEqual(expected[2], p_write.call_args_list[2][0][0].fname)
 
-    def test_all_files_known_flag(self, p_writeto):
+    def test_all_files_known_flag(self, p_write):
         self.kwargs['flag_name'] = 'VISNJAN'
         instance = sniffer.Sniffer(**self.kwargs)
         value = list(instance.find_fits())
@@ -111,10 +201,10 @@ class SnifferTests(unittest.TestCase):
             'void/tests/data/sub/test_in_sub_unflagged.fit',
         ]
         self.assertListEqual(expected, value)
-        self.assertEqual(expected[0], p_writeto.mock_calls[0][1][0])
-        self.assertEqual(expected[1], p_writeto.mock_calls[1][1][0])
+        self.assertEqual(expected[0], p_write.call_args_list[0][0][0].fname)
+        self.assertEqual(expected[1], p_write.call_args_list[1][0][0].fname)
 
-    def test_maxn(self, p_writeto):
+    def test_maxn(self, p_write):
         self.kwargs['flag_name'] = '0'
         self.kwargs['maxn'] = 2
         instance = sniffer.Sniffer(**self.kwargs)
@@ -124,18 +214,18 @@ class SnifferTests(unittest.TestCase):
             'void/tests/data/test_unflagged.fit',
         ]
         self.assertListEqual(expected, value)
-        p_writeto.assert_not_called()
+        p_write.assert_not_called()
 
-    def test_min_time(self, p_writeto):
+    def test_min_time(self, p_write):
         self.kwargs['flag_name'] = '0'
         self.kwargs['tmin'] = '2019-01-01T00:00:00'
         instance = sniffer.Sniffer(**self.kwargs)
         value = list(instance.find_fits())
         expected = ['void/tests/data/test_unflagged.fit']
         self.assertListEqual(expected, value)
-        p_writeto.assert_not_called()
+        p_write.assert_not_called()
 
-    def test_max_time(self, p_writeto):
+    def test_max_time(self, p_write):
         self.kwargs['flag_name'] = '0'
         self.kwargs['tmax'] = '2019-01-01T00:00:00'
         instance = sniffer.Sniffer(**self.kwargs)
@@ -145,9 +235,9 @@ class SnifferTests(unittest.TestCase):
             'void/tests/data/sub/test_in_sub_unflagged.fit',
         ]
         self.assertListEqual(expected, value)
-        p_writeto.assert_not_called()
+        p_write.assert_not_called()
 
-    def test_max_time_only_date(self, p_writeto):
+    def test_max_time_only_date(self, p_write):
         self.kwargs['flag_name'] = '0'
         self.kwargs['tmax'] = '2019-01-01'
         instance = sniffer.Sniffer(**self.kwargs)
@@ -157,9 +247,9 @@ class SnifferTests(unittest.TestCase):
             'void/tests/data/sub/test_in_sub_unflagged.fit',
         ]
         self.assertListEqual(expected, value)
-        p_writeto.assert_not_called()
+        p_write.assert_not_called()
 
-    def test_time_range(self, p_writeto):
+    def test_time_range(self, p_write):
         self.kwargs['flag_name'] = '0'
         self.kwargs['tmax'] = '2017-12-01T00:00:00'
         self.kwargs['tmin'] = '2017-01-01T00:00:00'
@@ -167,4 +257,347 @@ class SnifferTests(unittest.TestCase):
         value = list(instance.find_fits())
         expected = ['void/tests/data/sub/test_in_sub_unflagged.fit']
         self.assertListEqual(expected, value)
-        p_writeto.assert_not_called()
+        p_write.assert_not_called()
+
+    def test_one_open_per_file(self, p_write):
+        self.kwargs['flag_name'] = 'VISNJAN'
+        self.kwargs['update_flag'] = False
+        instance = sniffer.Sniffer(**self.kwargs)
+        with mock.patch('void.fitsheader.open', create=True, wraps=open) as p:
+            value = list(instance.find_fits())
+        self.assertEqual(2, len(value))
+        self.assertEqual(3, instance.opened)
+        opened = sorted(call[1][0] for call in p.mock_calls if call[1])
+        expected = [
+            'void/tests/data/sub/test_in_sub_unflagged.fit',
+            'void/tests/data/test2_flagged.fit',
+            'void/tests/data/test_unflagged.fit',
+        ]
+        self.assertListEqual(expected, opened)
+
+    def test_unknown_flag_mode(self, _):
+        self.kwargs['flag_mode'] = 'foo'
+        with self.assertRaises(ValueError):
+            sniffer.Sniffer(**self.kwargs)
+
+    def test_jobs_ordered(self, p_write):
+        self.kwargs['flag_name'] = 'VISNJAN'
+        self.kwargs['jobs'] = 3
+        self.kwargs['ordered'] = True
+        instance = sniffer.Sniffer(**self.kwargs)
+        value = list(instance.find_fits())
+        expected = [
+            'void/tests/data/test_unflagged.fit',
+            'void/tests/data/sub/test_in_sub_unflagged.fit',
+        ]
+        self.assertListEqual(expected, value)
+        flagged = [call[0][0].fname for call in p_write.call_args_list]
+        self.assertListEqual(expected, sorted(flagged, key=expected.index))
+
+    def test_jobs_flag_when_output(self, p_write):
+        self.kwargs['flag_name'] = 'VISNJAN'
+        self.kwargs['jobs'] = 3
+        self.kwargs['ordered'] = True
+        instance = sniffer.Sniffer(**self.kwargs)
+        records = instance.find_fits()
+        self.assertEqual('void/tests/data/test_unflagged.fit', next(records))
+        records.close()
+        flagged = [call[0][0].fname for call in p_write.call_args_list]
+        self.assertListEqual(['void/tests/data/test_unflagged.fit'], flagged)
+
+    def test_jobs_unordered(self, p_write):
+        self.kwargs['flag_name'] = '0'
+        self.kwargs['jobs'] = 2
+        instance = sniffer.Sniffer(**self.kwargs)
+        value = list(instance.find_fits())
+        expected = [
+            'void/tests/data/sub/test_in_sub_unflagged.fit',
+            'void/tests/data/test2_flagged.fit',
+            'void/tests/data/test_unflagged.fit',
+        ]
+        self.assertListEqual(expected, sorted(value))
+        p_write.assert_not_called()
+
+    def test_jobs_maxn(self, p_write):
+        self.kwargs['flag_name'] = 'foo'
+        self.kwargs['maxn'] = 2
+        self.kwargs['jobs'] = 3
+        self.kwargs['ordered'] = True
+        instance = sniffer.Sniffer(**self.kwargs)
+        value = list(instance.find_fits())
+        expected = [
+            'void/tests/data/test2_flagged.fit',
+            'void/tests/data/test_unflagged.fit',
+        ]
+        self.assertListEqual(expected, value)
+        flagged = [call[0][0].fname for call in p_write.call_args_list]
+        self.assertListEqual(expected, sorted(flagged))
+        self.assertEqual(2, instance.count)
+
+    def test_jobs_maxn_zero(self, p_write):
+        self.kwargs['flag_name'] = 'foo'
+        self.kwargs['maxn'] = '0'
+        self.kwargs['jobs'] = 2
+        instance = sniffer.Sniffer(**self.kwargs)
+        self.assertListEqual([], list(instance.find_fits()))
+        p_write.assert_not_called()
+
+    def test_invalid_jobs(self, _):
+        self.kwargs['jobs'] = 0
+        with self.assertRaises(ValueError):
+            sniffer.Sniffer(**self.kwargs)
+
+
+@mock.patch.object(scanindex.ScanIndex, 'RACY_NS', 0)
+class IndexedSnifferTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.search_dir = os.path.join(self.tmp_dir, 'data')
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        shutil.copytree(data_dir, self.search_dir)
+        self.kwargs = {
+            'search_dir': self.search_dir,
+            'flag_name': 'VISNJAN',
+            'ordered': True,
+            'index_path': os.path.join(self.tmp_dir, 'index.sqlite'),
+        }
+
+    def _find_fits(self, **kwargs):
+        instance = sniffer.Sniffer(**dict(self.kwargs, **kwargs))
+        value = [os.path.basename(fname) for fname in instance.find_fits()]
+        instance.index.close()
+        return value, instance.opened
+
+    def test_unchanged_files_not_opened(self):
+        expected = ['test_unflagged.fit', 'test_in_sub_unflagged.fit']
+        self.assertEqual((expected, 3), self._find_fits(update_flag=False))
+        self.assertEqual((expected, 0), self._find_fits(update_flag=False))
+
+    def test_flagged_files_not_opened(self):
+        expected = ['test_unflagged.fit', 'test_in_sub_unflagged.fit']
+        self.assertEqual((expected, 3), self._find_fits())
+        self.assertEqual(([], 0), self._find_fits())
+
+    def test_flagged_files_not_opened_racy(self):
+        racy_ns = 2 * 10 ** 9
+        expected = ['test_unflagged.fit', 'test_in_sub_unflagged.fit']
+        with mock.patch.object(scanindex.ScanIndex, 'RACY_NS', racy_ns):
+            self.assertEqual((expected, 3), self._find_fits())
+            # Only the flagged file read without a write is opened again
+            self.assertEqual(([], 1), self._find_fits())
+
+    def test_time_filter_from_index(self):
+        self._find_fits(update_flag=False)
+        value = self._find_fits(update_flag=False, tmin='2019-01-01')
+        self.assertEqual((['test_unflagged.fit'], 0), value)
+
+    def test_changed_file_opened(self):
+        self._find_fits(update_flag=False)
+        fname = os.path.join(self.search_dir, 'test_unflagged.fit')
+        record = fitsheader.read_header(fname)
+        record.header['VISNJAN'] = 'True'
+        fitsheader.write_header(record)
+        expected = ['test_in_sub_unflagged.fit']
+        self.assertEqual((expected, 1), self._find_fits(update_flag=False))
+
+    def test_other_flag_opened(self):
+        self._find_fits(update_flag=False)
+        value = self._find_fits(update_flag=False, flag_name='FOO')
+        self.assertEqual(3, value[1])
+        self.assertEqual(3, len(value[0]))
+
+
+class WalkTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        for path in (
+            '2018-08-18/a.fit',
+            '2018-12-31/b.fits',
+            '2019-01-09/sub/c.fit',
+            'misc/d.fit',
+            'misc/notes.txt',
+            'e.fit',
+        ):
+            path = os.path.join(self.tmp_dir, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        os.makedirs(os.path.join(self.tmp_dir, 'dir.fit'))
+        self.kwargs = {'search_dir': self.tmp_dir, 'ordered': True}
+
+    def _walk(self, **kwargs):
+        instance = sniffer.Sniffer(**dict(self.kwargs, **kwargs))
+        return [
+            os.path.relpath(fname, self.tmp_dir) for fname in instance.walk()
+        ]
+
+    def test_walk(self):
+        expected = [
+            'e.fit',
+            '2018-08-18/a.fit',
+            '2018-12-31/b.fits',
+            '2019-01-09/sub/c.fit',
+            'misc/d.fit',
+        ]
+        self.assertListEqual(expected, self._walk())
+
+    def test_walk_relative(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.tmp_dir)
+        instance = sniffer.Sniffer(search_dir='.', ordered=True)
+        self.assertEqual('e.fit', next(instance.walk()))
+
+    def test_prune_tmin(self):
+        with self.assertLogs('void.sniffer', 'DEBUG') as logs:
+            value = self._walk(prune_dirs='%Y-%m-%d', tmin='2019-01-01')
+        expected = ['e.fit', '2018-12-31/b.fits', '2019-01-09/sub/c.fit']
+        self.assertListEqual(expected + ['misc/d.fit'], value)
+        self.assertIn('pruning 2018-08-18, before --tmin', logs.output[-1])
+
+    def test_prune_tmax(self):
+        value = self._walk(prune_dirs='%Y-%m-%d', tmax='2018-12-29')
+        expected = ['e.fit', '2018-08-18/a.fit', 'misc/d.fit']
+        self.assertListEqual(expected, value)
+
+    def test_prune_no_thresholds(self):
+        self.assertEqual(5, len(self._walk(prune_dirs='%Y-%m-%d')))
+
+    def test_no_prune(self):
+        self.assertEqual(5, len(self._walk(tmin='2019-01-01')))
+
+    def test_date_dir_range_month(self):
+        start, end = sniffer.Sniffer.date_dir_range('2018-12', '%Y-%m')
+        self.assertEqual(sniffer.Sniffer.parse_time('2018-11-30'), start)
+        self.assertEqual(sniffer.Sniffer.parse_time('2019-01-02'), end)
+
+    def test_date_dir_range_year(self):
+        start, end = sniffer.Sniffer.date_dir_range('2018', '%Y')
+        self.assertEqual(sniffer.Sniffer.parse_time('2017-12-31'), start)
+        self.assertEqual(sniffer.Sniffer.parse_time('2019-01-02'), end)
+
+
+class WatchTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        self.search_dir = os.path.join(self.tmp_dir, 'data')
+        shutil.copytree(self.data_dir, self.search_dir)
+
+    def _copy_later(self, name, target):
+        target = os.path.join(self.search_dir, target)
+
+        def copy():
+            os.makedirs(os.path.dirname(target))
+            shutil.copy(os.path.join(self.data_dir, name), target)
+
+        timer = threading.Timer(0.1, copy)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_watch(self):
+        instance = sniffer.Sniffer(
+            search_dir=self.search_dir, flag_name='VISNJAN', maxn=3
+        )
+        self._copy_later('test_unflagged.fit', 'new/new.fit')
+        value = [
+            os.path.basename(fname)
+            for fname in instance.watch(settle=0.05, poll=0.01)
+        ]
+        expected = ['test_unflagged.fit', 'test_in_sub_unflagged.fit']
+        self.assertListEqual(expected, sorted(value[:2], key=expected.index))
+        self.assertEqual('new.fit', value[2])
+        record = fitsheader.read_header(
+            os.path.join(self.search_dir, 'new', 'new.fit')
+        )
+        self.assertEqual('True', record.header['VISNJAN'])
+
+    def test_watch_maxn_in_scan(self):
+        instance = sniffer.Sniffer(
+            search_dir=self.search_dir, flag_name='0', maxn=2
+        )
+        self.assertEqual(2, len(list(instance.watch(poll=0.01))))
+
+    def _watch_twice(self, **kwargs):
+        fname = os.path.relpath(
+            os.path.join(self.search_dir, 'test_unflagged.fit')
+        )
+        instance = sniffer.Sniffer(search_dir=self.search_dir, **kwargs)
+        with mock.patch(
+            'void.sniffer.watch.watcher', return_value=iter([fname, fname])
+        ):
+            return [
+                os.path.basename(fname)
+                for fname in instance.watch(poll=0.01)
+            ]
+
+    def test_watch_seen(self):
+        value = self._watch_twice(flag_name='VISNJAN', update_flag=False)
+        self.assertEqual(2, len(value))
+
+    @mock.patch.object(sniffer.Sniffer, 'WATCH_SEEN_MAX', 1)
+    def test_watch_seen_bounded(self):
+        value = self._watch_twice(flag_name='VISNJAN', update_flag=False)
+        # Forgotten once the other file from the scan was output
+        self.assertEqual(['test_unflagged.fit'], value[2:])
+
+    @mock.patch.object(sniffer.Sniffer, 'WATCH_SEEN_MAX', 0)
+    def test_watch_flagged_not_remembered(self):
+        value = self._watch_twice(flag_name='VISNJAN')
+        self.assertEqual(2, len(value))
+
+    def test_is_marked(self):
+        record = fitsheader.HeaderRecord('frame.fit', None, None)
+        gzip_record = fitsheader.HeaderRecord('frame.fits.gz', None, None)
+        instance = sniffer.Sniffer(
+            search_dir=self.search_dir, flag_name='VISNJAN'
+        )
+        self.assertTrue(instance.is_marked(record))
+        self.assertFalse(instance.is_marked(gzip_record))
+        instance.index = mock.Mock()
+        self.assertTrue(instance.is_marked(gzip_record))
+        instance.update_flag = False
+        self.assertFalse(instance.is_marked(record))
+
+
+@mock.patch('void.sniffer.fitsheader.write_header')
+class ExtractTests(unittest.TestCase):
+    def setUp(self):
+        base_dir = os.path.dirname(__file__)
+        self.kwargs = {
+            'search_dir': base_dir,
+            'flag_name': 'foo',
+            'ordered': True,
+        }
+
+    def test_extract(self, p_write):
+        self.kwargs['extract'] = lambda header: header['DATE-OBS']
+        instance = sniffer.Sniffer(**self.kwargs)
+        value = [record.data for record in instance.find_records()]
+        expected = [
+            '2018-12-26T18:41:49.300',
+            '2019-01-09T04:47:09.360',
+            '2017-06-18T23:00:54',
+        ]
+        self.assertListEqual(expected, value)
+        self.assertEqual(3, instance.opened)
+
+    def test_extract_error(self, p_write):
+        def extract(header):
+            if header['DATE-OBS'].startswith('2019'):
+                raise KeyError('ZMAG')
+            return header['DATE-OBS']
+
+        self.kwargs['extract'] = extract
+        instance = sniffer.Sniffer(**self.kwargs)
+        with self.assertLogs('void.sniffer', 'WARNING'):
+            value = list(instance.find_fits())
+        expected = [
+            'void/tests/data/test2_flagged.fit',
+            'void/tests/data/sub/test_in_sub_unflagged.fit',
+        ]
+        self.assertListEqual(expected, value)
+        flagged = [call[0][0].fname for call in p_write.call_args_list]
+        self.assertListEqual(expected, flagged)
@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from void import time_utils
+
+
+class ParseFitsTimeTests(unittest.TestCase):
+    def test_datetime(self):
+        value = time_utils.parse_fits_time('2019-01-09T04:47:09.360')
+        expected = np.datetime64('2019-01-09T04:47:09.360000000')
+        self.assertEqual(expected, value)
+        self.assertEqual(np.dtype('datetime64[ns]'), value.dtype)
+
+    def test_no_fraction(self):
+        value = time_utils.parse_fits_time('2017-06-18T23:00:54')
+        self.assertEqual(np.datetime64('2017-06-18T23:00:54', 'ns'), value)
+
+    def test_date_only(self):
+        value = time_utils.parse_fits_time('2019-01-01')
+        self.assertEqual(np.datetime64('2019-01-01T00:00:00', 'ns'), value)
+
+    def test_time_scale(self):
+        value = time_utils.parse_fits_time('2019-01-09T04:47:09.360(TAI)')
+        expected = np.datetime64('2019-01-09T04:46:32.360', 'ns')
+        self.assertEqual(expected, value)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            time_utils.parse_fits_time('foo')
+
+
+class DatetimeToMjdTests(unittest.TestCase):
+    def test_datetime64_to_mjd(self):
+        times = ['2018-08-18T20:00', '1858-11-17', 'NaT']
+        mjd = time_utils.datetime64_to_mjd(np.array(times, 'datetime64[s]'))
+        np.testing.assert_allclose([58348 + 20 / 24, 0, np.nan], mjd)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from void import watch
+
+
+class WatcherTestMixin:
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self._write('old.fit')
+        os.makedirs(os.path.join(self.tmp_dir, 'skip'))
+
+    def _write(self, path):
+        path = os.path.join(self.tmp_dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as out:
+            out.write('foo')
+        return path
+
+    def _next(self, iterator, timeout=5):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(next(iterator)))
+        thread.daemon = True
+        thread.start()
+        thread.join(timeout)
+        self.assertTrue(result, 'watcher timed out')
+        return result[0]
+
+    def test_new_file(self):
+        iterator = iter(self._watcher())
+        self._write('notes.txt')
+        path = self._write('new.fit')
+        self.assertEqual(path, self._next(iterator))
+
+    def test_new_dir(self):
+        iterator = iter(self._watcher())
+        path = self._write('2019-01-09/sub/new.fits')
+        self.assertEqual(path, self._next(iterator))
+
+    def test_moved_file(self):
+        iterator = iter(self._watcher())
+        src = tempfile.mktemp(dir=os.path.dirname(self.tmp_dir))
+        with open(src, 'w') as out:
+            out.write('foo')
+        path = os.path.join(self.tmp_dir, 'moved.fit')
+        os.rename(src, path)
+        self.assertEqual(path, self._next(iterator))
+
+    def test_skip_dir(self):
+        iterator = iter(self._watcher())
+        self._write('skip/new.fit')
+        path = self._write('new.fit')
+        self.assertEqual(path, self._next(iterator))
+
+
+class PollWatcherTests(WatcherTestMixin, unittest.TestCase):
+    def _watcher(self):
+        return watch.PollWatcher(
+            self.tmp_dir,
+            ('.fit', '.fits'),
+            settle=0.05,
+            interval=0.01,
+            skip_dir=lambda name: name == 'skip',
+        )
+
+    def test_settle(self):
+        watcher = self._watcher()
+        path = self._write('new.fit')
+        watcher.touch(path)
+        now = time.monotonic()
+        self.assertListEqual([], list(watcher._settled(now)))
+        self.assertListEqual([], list(watcher._settled(now + 0.01)))
+        with open(path, 'a') as out:
+            out.write('bar')
+        self.assertListEqual([], list(watcher._settled(now + 0.06)))
+        self.assertListEqual([], list(watcher._settled(now + 0.1)))
+        self.assertListEqual([path], list(watcher._settled(now + 0.12)))
+        self.assertDictEqual({}, watcher.pending)
+
+    def test_settle_deleted(self):
+        watcher = self._watcher()
+        path = self._write('new.fit')
+        watcher.touch(path)
+        os.unlink(path)
+        self.assertListEqual([], list(watcher._settled(time.monotonic())))
+        self.assertDictEqual({}, watcher.pending)
+
+
+@unittest.skipUnless(watch.InotifyWatcher.available(), 'no inotify')
+class InotifyWatcherTests(WatcherTestMixin, unittest.TestCase):
+    def _watcher(self):
+        watcher = watch.InotifyWatcher(
+            self.tmp_dir,
+            ('.fit', '.fits'),
+            settle=0.05,
+            skip_dir=lambda name: name == 'skip',
+        )
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def test_factory(self):
+        watcher = watch.watcher(self.tmp_dir, ('.fit',))
+        self.addCleanup(watcher.close)
+        self.assertIsInstance(watcher, watch.InotifyWatcher)
+
+    def test_factory_poll(self):
+        watcher = watch.watcher(self.tmp_dir, ('.fit',), poll=1)
+        self.assertIsInstance(watcher, watch.PollWatcher)
+        self.assertEqual(1, watcher.interval)
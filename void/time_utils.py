@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Time parsing functions
+"""
+
+import re
+
+import numpy as np
+from astropy.time import Time
+
+from void import common
+
+FITS_DATE_RE = re.compile(r'\d{4}-\d\d-\d\d(T\d\d:\d\d:\d\d(\.\d+)?)?')
+
+
+def parse_fits_time(time_str):
+    """
+    Parse a FITS date string into a UTC `numpy.datetime64` in nanoseconds.
+
+    Plain ISO dates and times are converted by numpy directly, date-only
+    strings are taken at midnight. Anything else, e.g. a string with an
+    embedded time scale like `2019-01-09T04:47:09(TAI)`, goes through
+    astropy and is converted to UTC.
+    """
+    with common.STATS.timer('parse_time'):
+        return _parse_fits_time(time_str)
+
+
+def _parse_fits_time(time_str):
+    if FITS_DATE_RE.fullmatch(time_str):
+        return np.datetime64(time_str, 'ns')
+    if 'T' not in time_str:
+        time_str += 'T00:00:00.00'
+    return np.datetime64(Time(time_str, format='fits').utc.datetime64, 'ns')
+
+
+MJD_EPOCH = np.datetime64('1858-11-17T00:00:00', 'ns')
+NS_PER_DAY = 86400 * 10 ** 9
+
+
+def datetime64_to_mjd(times):
+    """
+    Convert `numpy.datetime64` values to Modified Julian Dates, NaT to NaN.
+    """
+    times = np.asarray(times).astype('datetime64[ns]')
+    mjd = (times - MJD_EPOCH).astype(np.int64) / NS_PER_DAY
+    return np.where(np.isnat(times), np.nan, mjd)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+"""
+Watching a directory tree for newly written files.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+
+log = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class Watcher:
+    """
+    Base for watchers, iterating yields paths of new or rewritten files.
+
+    A file is only yielded once its size and mtime stayed unchanged for
+    `settle` seconds, so files still being written are held back.
+    Directories for which `skip_dir(name)` is true are not watched.
+    """
+
+    def __init__(self, search_dir, extensions, settle=2.0, skip_dir=None):
+        self.search_dir = search_dir
+        self.extensions = extensions
+        self.settle = settle
+        self.skip_dir = skip_dir or (lambda name: False)
+        self.pending = {}
+
+    def __iter__(self):
+        try:
+            while True:
+                now = time.monotonic()
+                yield from self._settled(now)
+                self.wait(self._timeout(now))
+        finally:
+            self.close()
+
+    def wait(self, timeout):
+        """ Wait up to `timeout` seconds for changes and `touch` them. """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def touch(self, path):
+        if path.endswith(self.extensions):
+            log.debug('touched %s', path)
+            self.pending[path] = (None, time.monotonic())
+
+    def scan(self, dir_path, touch=True):
+        """
+        Yield subdirectories under `dir_path`, including itself, and with
+        `touch`, touch all files in them.
+        """
+        stack = [dir_path]
+        while stack:
+            dir_path = stack.pop()
+            yield dir_path
+            try:
+                with os.scandir(dir_path) as dir_entries:
+                    entries = list(dir_entries)
+            except OSError as e:
+                log.debug('skipping %s: %s', dir_path, e)
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.skip_dir(entry.name):
+                        log.debug('not watching %s', entry.path)
+                    else:
+                        stack.append(entry.path)
+                elif touch:
+                    self.touch(entry.path)
+
+    def _settled(self, now):
+        for path, (stat_key, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            new_key = (stat.st_size, stat.st_mtime_ns)
+            if new_key != stat_key:
+                self.pending[path] = (new_key, now)
+            elif now - since >= self.settle:
+                del self.pending[path]
+                yield path
+
+    def _timeout(self, now):
+        if not self.pending:
+            return None
+        since = min(since for _, since in self.pending.values())
+        return max(0.0, min(self.settle, since + self.settle - now))
+
+
+class PollWatcher(Watcher):
+    """
+    Watcher comparing directory mtimes every `interval` seconds.
+
+    Only directories whose mtime changed are listed again, files already
+    known when the watcher started are ignored.
+    """
+
+    def __init__(self, *args, interval=5.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self.dirs = {}
+        for dir_path in self.scan(self.search_dir, touch=False):
+            self._list_dir(dir_path)
+
+    def _list_dir(self, dir_path):
+        """ Update known names of `dir_path`, returning the new ones. """
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+            names = set(os.listdir(dir_path))
+        except OSError:
+            self.dirs.pop(dir_path, None)
+            return set()
+        known = self.dirs.get(dir_path, (None, set()))[1]
+        self.dirs[dir_path] = (mtime_ns, names)
+        return names - known
+
+    def wait(self, timeout):
+        if timeout is None or timeout > self.interval:
+            timeout = self.interval
+        time.sleep(timeout)
+        for dir_path, (mtime_ns, _) in list(self.dirs.items()):
+            try:
+                changed = os.stat(dir_path).st_mtime_ns != mtime_ns
+            except OSError:
+                changed = True
+            if not changed:
+                continue
+            for name in self._list_dir(dir_path):
+                path = os.path.join(dir_path, name)
+                if not os.path.isdir(path):
+                    self.touch(path)
+                elif not self.skip_dir(name):
+                    for sub_path in self.scan(path):
+                        self._list_dir(sub_path)
+
+
+class InotifyWatcher(Watcher):
+    """
+    Watcher using Linux inotify, through ctypes.
+
+    Files are touched when they are closed after writing or moved into a
+    watched directory. New subdirectories are watched as they appear.
+    """
+
+    DIR_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+    BUFSIZE = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.libc = self.load_libc()
+        if self.libc is None:
+            raise OSError('inotify not available')
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.started = time.time()
+        self.wds = {}
+        for dir_path in self.scan(self.search_dir, touch=False):
+            self._add_watch(dir_path)
+
+    @staticmethod
+    def load_libc():
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            return None
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            libc.inotify_init1
+            libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+        return libc
+
+    @classmethod
+    def available(cls):
+        return cls.load_libc() is not None
+
+    def _add_watch(self, dir_path):
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(dir_path), self.DIR_MASK
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            log.warning('cannot watch %s: errno %d', dir_path, errno)
+            return
+        self.wds[wd] = dir_path
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            buffer = os.read(self.fd, self.BUFSIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            self._handle(wd, mask, name)
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            log.warning('inotify queue overflow, rescanning')
+            self._rescan()
+            return
+        if mask & (IN_IGNORED | IN_DELETE_SELF):
+            self.wds.pop(wd, None)
+            return
+        dir_path = self.wds.get(wd)
+        if dir_path is None:
+            return
+        path = os.path.join(dir_path, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO) and not self.skip_dir(name):
+                for sub_path in self.scan(path):
+                    self._add_watch(sub_path)
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self.touch(path)
+
+    def _rescan(self):
+        for dir_path in self.scan(self.search_dir, touch=False):
+            if dir_path not in self.wds.values():
+                self._add_watch(dir_path)
+            try:
+                with os.scandir(dir_path) as dir_entries:
+                    for entry in dir_entries:
+                        if (
+                            entry.is_file()
+                            and entry.stat().st_mtime >= self.started
+                        ):
+                            self.touch(entry.path)
+            except OSError:
+                continue
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def watcher(search_dir, extensions, settle=2.0, poll=None, skip_dir=None):
+    """
+    Watcher for `search_dir`, using inotify if available and `poll` is
+    not given, otherwise polling every `poll` seconds.
+    """
+    kwargs = {'settle': settle, 'skip_dir': skip_dir}
+    if poll is None and InotifyWatcher.available():
+        log.debug('watching %s with inotify', search_dir)
+        return InotifyWatcher(search_dir, extensions, **kwargs)
+    log.debug('polling %s', search_dir)
+    return PollWatcher(
+        search_dir, extensions, interval=poll or 5.0, **kwargs
+    )